@@ -1,6 +1,38 @@
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def build_session(pool_size=10, retries=3, backoff_factor=0.5):
+    """
+    Session HTTP keep-alive partagée par tous les threads d'un scraper
+    :param pool_size: nombre de connexions gardées ouvertes (= nombre de workers)
+    :param retries: nombre de nouvelles tentatives sur erreur réseau, 429 et 5xx
+    :param backoff_factor: attente exponentielle entre tentatives (0.5s, 1s, 2s...), Retry-After respecté
+    :return:
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 class allocineAPI:
@@ -8,86 +40,133 @@ class allocineAPI:
     DEPARTEMENTS_TITLE = "Départements"
     CIRCUIT_TITLE = "Les cinémas par circuit"
 
-    def _get_json_request(self, path, url_params: dict = None) -> dict:
-        req = requests.get(path, params=url_params)
+    def __init__(self, session=None, pool_size=10, timeout=(5, 20), retries=3, backoff_factor=0.5, base_url=None):
+        """
+        :param session: requests.Session à utiliser (par défaut une session construite par build_session)
+        :param pool_size: taille du pool de connexions keep-alive, et nombre maximum de requêtes en cours
+        :param timeout: secondes, ou tuple (connexion, lecture), appliqué à chaque requête
+        :param retries: nouvelles tentatives sur erreur réseau, 429 et 5xx
+        :param backoff_factor: base de l'attente exponentielle entre tentatives
+        :param base_url: racine du site (par défaut URLs.BASE_URL)
+        """
+        self.base_url = base_url or URLs.BASE_URL
+        self.session = session if session is not None else build_session(pool_size, retries, backoff_factor)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        # Budget global : jamais plus de requêtes en cours que de connexions dans le pool.
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._page_executor = None
+        self._executor_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._retries = 0
+        self._errors = 0
+        self._bytes = 0
+
+    def close(self):
+        if self._page_executor is not None:
+            self._page_executor.shutdown(wait=False)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        """
+        Compteurs depuis la création du client
+        :return: {"requests", "retries", "errors", "bytes"}
+        """
+        with self._stats_lock:
+            return {"requests": self._requests, "retries": self._retries, "errors": self._errors, "bytes": self._bytes}
+
+    def _get(self, path, params=None):
+        try:
+            with self._slots:
+                req = self.session.get(path, params=params, timeout=self.timeout)
+        except requests.RequestException:
+            with self._stats_lock:
+                self._requests += 1
+                self._errors += 1
+            raise
+        retry = getattr(req.raw, "retries", None)
+        with self._stats_lock:
+            self._requests += 1
+            self._retries += len(retry.history) if retry is not None else 0
+            self._bytes += len(req.content)
+            if req.status_code != 200:
+                self._errors += 1
         if req.status_code != 200:
             raise Exception("Error " + str(req.status_code))
+        return req
+
+    def _get_json_request(self, path, url_params: dict = None) -> dict:
+        req = self._get(path, params=url_params)
         try:
-            return json.loads(req.text)
+            return json.loads(req.content)
         except ValueError:
             raise
 
     def _get_request(self, path, params=None):
-        req = requests.get(path, params=params)
-        if req.status_code != 200:
-            raise Exception("Error " + str(req.status_code))
-        return req.text
+        return self._get(path, params=params).text
+
+    def _get_showtime_pages(self, id_cinema, date_str, verbose_url=False):
+        """
+        Pages JSON de séances d'un cinéma pour un jour, dans l'ordre des pages.
+        La page 1 donne totalPages, les suivantes sont téléchargées en parallèle.
+        """
+        urls = [URLs.showtime_url(id_cinema, date_str, 1, self.base_url)]
+        if verbose_url:
+            print(urls[0])
+        first = self._get_json_request(urls[0])
+        _, totalPages = parse_pagination(first)
+        urls = [URLs.showtime_url(id_cinema, date_str, page, self.base_url) for page in range(2, totalPages + 1)]
+        if verbose_url:
+            for url in urls:
+                print(url)
+        if len(urls) <= 1:
+            return [first] + [self._get_json_request(url) for url in urls]
+        return [first] + list(self._pages_executor().map(self._get_json_request, urls))
+
+    def _pages_executor(self):
+        # Les threads du scraper attendent ici leurs pages : ce pool ne fait que des _get.
+        with self._executor_lock:
+            if self._page_executor is None:
+                self._page_executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="allocine-pages")
+            return self._page_executor
 
     def _scrap_sceances(self):
-        webpage = self._get_request(URLs.seance_url())
-        soup = BeautifulSoup(webpage, 'html.parser')
-        sections = soup.find_all('section')
-        return sections
+        return self._get_request(URLs.seance_url(self.base_url))
 
     def _scrap_cinemas(self, id_location, page=1):
-        webpage = self._get_request(URLs.cinemas_url(id_location), params={"page": page})
-        soup = BeautifulSoup(webpage, 'html.parser')
-        cinemas = soup.select('*[class*="theater-card"]')
-        buttons = soup.select('*[class*="button-right"]')
-        next_page = None
-        if len(buttons) and "button-disabled" not in buttons[-1]["class"]:
-            next_page = page + 1
-        return cinemas, next_page
+        webpage = self._get_request(URLs.cinemas_url(id_location, self.base_url), params={"page": page})
+        return parse_cinemas_page(webpage, page)
 
     def _get_section(self, title):
-        sections = self._scrap_sceances()
-        for section in sections:
-            h2 = section.find("h2")
-            if h2 is None:
-                continue
-            title_text = h2.text
-            if title_text == title:
-                return section
+        return find_section(self._scrap_sceances(), title)
 
     def get_top_villes(self):
         """
         Liste des id de villes
         :return:
         """
-        section = self._get_section(allocineAPI.TOP_VILLE_TITLE)
-        links = section.find_all("a")
-        result = list()
-        for link in links:
-            ville_id = link['href'].split("/")[-2]
-            result.append({"id": ville_id, "name": link["title"]})
-        return result
+        return parse_location_links(self._get_section(allocineAPI.TOP_VILLE_TITLE))
 
     def get_departements(self):
         """
         Liste des id de départements
         :return:
         """
-        section = self._get_section(allocineAPI.DEPARTEMENTS_TITLE)
-        links = section.find_all("a")
-        result = list()
-        for link in links:
-            departement_id = link['href'].split("/")[-2]
-            result.append({"id": departement_id, "name": link["title"]})
-        return result
+        return parse_location_links(self._get_section(allocineAPI.DEPARTEMENTS_TITLE))
 
     def get_circuit(self):
         """
         Liste des id de circuit
         :return:
         """
-        section = self._get_section(allocineAPI.CIRCUIT_TITLE)
-        links = section.find_all("a")
-        result = list()
-        for link in links:
-            circuit_id = link['href'].split("/")[-2]
-            circuit_name = link.find("span").text
-            result.append({"id": circuit_id, "name": circuit_name})
-        return result
+        return parse_circuit_links(self._get_section(allocineAPI.CIRCUIT_TITLE))
 
     def get_cinema(self, id_location):
         """
@@ -99,79 +178,21 @@ class allocineAPI:
         next_page = 1
         while next_page is not None:
             cinemas, next_page = self._scrap_cinemas(id_location, page=next_page)
-            for cinema in cinemas:
-                data = cinema.select('*[class*="add-theater-anchor"]')
-                if len(data) == 0:
-                    continue
-                data = data[0]
-                cinema_data = json.loads(data["data-theater"])
-                address = cinema.find("address").text
-                result.append({
-                    "id": cinema_data["id"],
-                    "name": cinema_data["name"],
-                    "address": address
-                })
-
+            result.extend(cinemas)
         return result
 
     def get_showtime(self, id_cinema, date_str: str, verbose_url=False):
-      """
-      Récupération des horaires des séances pour un cinéma, pour un jour donné
-      :param date_str: date
-      :param verbose_url: url de la requête scraptée
-      :param id_cinema: id du cinéma
-      :return:
-      """
-      formated_data = list()
-      page, totalPages = 0, 1
-      while page < totalPages:
-          if verbose_url:
-              print(URLs.showtime_url(id_cinema, date_str, page + 1))
-          json_data = self._get_json_request(URLs.showtime_url(id_cinema, date_str, page + 1))
-          page = int(json_data["pagination"]["page"])
-          totalPages = int(json_data["pagination"]["totalPages"])
-          for element in json_data["results"]:
-              movie = element.get("movie", {})
-              movie_id = (
-                  movie.get("internalId")
-                  or movie.get("code")
-                  or movie.get("id")  # fallback if only 'id' exists (e.g. base64)
-                  or None
-              )
-              title = movie.get("title")
-              is_premiere = movie.get("isPremiere", False)
-              showtimes = []
-              lst_internal_ids = []
-              for showtimes_key in element["showtimes"].keys():
-                  for showtime in element["showtimes"][showtimes_key]:
-                      if showtime["internalId"] not in lst_internal_ids:
-                          lst_internal_ids.append(showtime["internalId"])
-                          # --- Début ajout pour l'URL réservation ---
-                          reservation_url = None
-                          ticketing_list = showtime.get("data", {}).get("ticketing", [])
-                          for ticketing in ticketing_list:
-                              if ticketing.get('provider') == 'default' and ticketing.get('urls'):
-                                  reservation_url = ticketing['urls'][0]
-                                  break
-                          # --- Fin ajout URL réservation ---
-                          showtimes.append({
-                              "id_allocine": movie.get("internalId"),
-                              "startsAt": showtime["startsAt"],
-                              "diffusionVersion": showtime["diffusionVersion"],
-                              "reservation_url": reservation_url  # <-- Ajout ici
-                          })
-
-              formated_data.append({
-                  "id_allocine": movie_id,
-                  "title": title,
-                  "isPremiere": is_premiere,
-                  "showtimes": showtimes,
-                  "internalId": movie.get("internalId"),
-                  "code": movie.get("code")
-              })
-
-      return formated_data
-
+        """
+        Récupération des horaires des séances pour un cinéma, pour un jour donné
+        :param date_str: date
+        :param verbose_url: url de la requête scraptée
+        :param id_cinema: id du cinéma
+        :return:
+        """
+        formated_data = list()
+        for json_data in self._get_showtime_pages(id_cinema, date_str, verbose_url):
+            formated_data.extend(parse_showtime_results(json_data["results"]))
+        return formated_data
 
     def get_movies(self, id_cinema, date_str: str, verbose_url=False):
         """
@@ -182,105 +203,259 @@ class allocineAPI:
         :return:
         """
         formated_data = list()
-        lst_internal_ids = list()
-        page, totalPages = 0, 1
-        while page < totalPages:
-            if verbose_url:
-                print(URLs.showtime_url(id_cinema, date_str, page + 1))
-            json_data = self._get_json_request(URLs.showtime_url(id_cinema, date_str, page + 1))
-            page = int(json_data["pagination"]["page"])
-            totalPages = int(json_data["pagination"]["totalPages"])
-
-            for element in json_data["results"]:
-                if element.get("movie") is None:
-                    continue
-                title = element["movie"].get("title")
-                internal_id = (
-                    element["movie"].get("internalId")
-                    or element["movie"].get("code")
-                    or element["movie"].get("id")
-                    or None
-                )
-                if internal_id not in lst_internal_ids:
-                    lst_internal_ids.append(internal_id)
-
-                    if title is None:
-                        title = "Unknown Title"
-
-                    original_title = element["movie"].get("originalTitle")
-                    if original_title is None:
-                        original_title = "Unknown Original Title"
-
-                    director = ""
-                    try:
-                        for credit in element["movie"]["credits"]:
-                            if credit["position"].get("name") == "DIRECTOR":
-                                if director != "":
-                                    director += " | "
-                                director += credit["person"].get("firstName") + " " + credit["person"].get("lastName")
-                    except:
-                        director = "Error"
-
-                    if director == "":
-                        director = "Unknown Director"
-
-                    synopsis_full = element["movie"].get("synopsisFull")
-                    if synopsis_full is None:
-                        synopsis_full = "No Synopsis Available"
-
-                    if element["movie"]["poster"] is None:
-                        url_poster = "No Poster URL Available"
-                    else:
-                        url_poster = element["movie"]["poster"].get("url")
-                        if url_poster is None:
-                            url_poster = "No Poster URL Available"
-
-                    releaseDate = None
-                    releases = element["movie"]["releases"]
-                    result_release = list()
-                    for release in releases:
-                        name = release.get("name")
-                        releaseDate = release.get("releaseDate")
-                        if releaseDate is not None:
-                            releaseDate = release.get("releaseDate").get("date")
-                        result_release.append({'releaseName': name, 'releaseDate': releaseDate})
-
-                    if releaseDate is None:
-                        releaseDate = "No Release Date Available"
-
-                    genres = []
-                    if element["movie"].get("genres", 0):
-                        g = element["movie"].get("genres", 0)
-                        for e in g:
-                            genres.append(e['translate'])
-
-                    runtime = element["movie"].get("runtime", 0)
-                    languages = element["movie"].get("languages", [])  # Return empty list if None
-                    has_dvd_release = element["movie"]["flags"].get("hasDvdRelease", False)
-
-                    custom_flags = element["movie"].get("customFlags", False)
-                    is_premiere, weekly_outing = False, False
-                    if custom_flags:
-                        is_premiere = element["movie"]["customFlags"].get("isPremiere", False)
-                        weekly_outing = element["movie"]["customFlags"].get("weeklyOuting", False)
-
-                    formated_data.append({
-                        "id_allocine": internal_id,  # <-- ajout de l'ID ici,
-                        "title": title,
-                        "originalTitle": original_title,
-                        "director": director,
-                        "synopsisFull": synopsis_full,
-                        "urlPoster": url_poster,
-                        "releases": result_release,
-                        "runtime": runtime,
-                        "genres": genres,
-                        "languages": languages,
-                        "hasDvdRelease": has_dvd_release,
-                        "isPremiere": is_premiere,
-                        "weeklyOuting": weekly_outing
-                    })
+        seen_ids = set()
+        for json_data in self._get_showtime_pages(id_cinema, date_str, verbose_url):
+            formated_data.extend(parse_movie_results(json_data["results"], seen_ids))
         return formated_data
 
+    def get_movies_with_showtimes(self, id_cinema, date_str: str, verbose_url=False):
+        """
+        Films (fiches complètes) et leurs séances pour un cinéma et un jour, en une seule
+        lecture des pages de séances
+        :param date_str: date
+        :param verbose_url: url de la requête scrapter
+        :param id_cinema: id du cinéma
+        :return: fiches de get_movies avec la liste "showtimes" de get_showtime
+        """
+        movies = MoviesShowtimes()
+        for json_data in self._get_showtime_pages(id_cinema, date_str, verbose_url):
+            movies.add_page(json_data["results"])
+        return movies.result()
+
+
+# --- Parsing des pages, partagé par allocineAPI et AsyncAllocineAPI
+
+def find_section(webpage, title):
+    soup = BeautifulSoup(webpage, 'html.parser')
+    for section in soup.find_all('section'):
+        h2 = section.find("h2")
+        if h2 is None:
+            continue
+        if h2.text == title:
+            return section
+
+
+def parse_location_links(section):
+    result = list()
+    for link in section.find_all("a"):
+        location_id = link['href'].split("/")[-2]
+        result.append({"id": location_id, "name": link["title"]})
+    return result
+
+
+def parse_circuit_links(section):
+    result = list()
+    for link in section.find_all("a"):
+        circuit_id = link['href'].split("/")[-2]
+        circuit_name = link.find("span").text
+        result.append({"id": circuit_id, "name": circuit_name})
+    return result
+
+
+def parse_cinemas_page(webpage, page):
+    """
+    Cinémas d'une page de liste et numéro de la page suivante (None sur la dernière page)
+    """
+    soup = BeautifulSoup(webpage, 'html.parser')
+    result = list()
+    for cinema in soup.select('*[class*="theater-card"]'):
+        data = cinema.select('*[class*="add-theater-anchor"]')
+        if len(data) == 0:
+            continue
+        cinema_data = json.loads(data[0]["data-theater"])
+        address = cinema.find("address").text
+        result.append({
+            "id": cinema_data["id"],
+            "name": cinema_data["name"],
+            "address": address
+        })
+    buttons = soup.select('*[class*="button-right"]')
+    next_page = None
+    if len(buttons) and "button-disabled" not in buttons[-1]["class"]:
+        next_page = page + 1
+    return result, next_page
+
+
+def parse_pagination(json_data):
+    return int(json_data["pagination"]["page"]), int(json_data["pagination"]["totalPages"])
+
+
+def movie_id(movie):
+    return (
+        movie.get("internalId")
+        or movie.get("code")
+        or movie.get("id")  # fallback if only 'id' exists (e.g. base64)
+        or None
+    )
+
+
+def parse_movie(movie, internal_id):
+    """
+    Fiche d'un film d'une page de séances
+    """
+    title = movie.get("title")
+    if title is None:
+        title = "Unknown Title"
+
+    original_title = movie.get("originalTitle")
+    if original_title is None:
+        original_title = "Unknown Original Title"
+
+    director = ""
+    try:
+        for credit in movie["credits"]:
+            if credit["position"].get("name") == "DIRECTOR":
+                if director != "":
+                    director += " | "
+                director += credit["person"].get("firstName") + " " + credit["person"].get("lastName")
+    except:
+        director = "Error"
+
+    if director == "":
+        director = "Unknown Director"
+
+    synopsis_full = movie.get("synopsisFull")
+    if synopsis_full is None:
+        synopsis_full = "No Synopsis Available"
+
+    if movie["poster"] is None:
+        url_poster = "No Poster URL Available"
+    else:
+        url_poster = movie["poster"].get("url")
+        if url_poster is None:
+            url_poster = "No Poster URL Available"
+
+    releaseDate = None
+    releases = movie["releases"]
+    result_release = list()
+    for release in releases:
+        name = release.get("name")
+        releaseDate = release.get("releaseDate")
+        if releaseDate is not None:
+            releaseDate = release.get("releaseDate").get("date")
+        result_release.append({'releaseName': name, 'releaseDate': releaseDate})
+
+    if releaseDate is None:
+        releaseDate = "No Release Date Available"
+
+    genres = []
+    if movie.get("genres", 0):
+        g = movie.get("genres", 0)
+        for e in g:
+            genres.append(e['translate'])
+
+    runtime = movie.get("runtime", 0)
+    languages = movie.get("languages", [])  # Return empty list if None
+    has_dvd_release = movie["flags"].get("hasDvdRelease", False)
+
+    custom_flags = movie.get("customFlags", False)
+    is_premiere, weekly_outing = False, False
+    if custom_flags:
+        is_premiere = movie["customFlags"].get("isPremiere", False)
+        weekly_outing = movie["customFlags"].get("weeklyOuting", False)
+
+    return {
+        "id_allocine": internal_id,  # <-- ajout de l'ID ici,
+        "title": title,
+        "originalTitle": original_title,
+        "director": director,
+        "synopsisFull": synopsis_full,
+        "urlPoster": url_poster,
+        "releases": result_release,
+        "runtime": runtime,
+        "genres": genres,
+        "languages": languages,
+        "hasDvdRelease": has_dvd_release,
+        "isPremiere": is_premiere,
+        "weeklyOuting": weekly_outing
+    }
+
+
+def parse_element_showtimes(element, movie, seen_ids):
+    """
+    Séances d'un film d'une page de séances, sauf celles déjà dans seen_ids (mis à jour)
+    """
+    showtimes = []
+    for showtimes_key in element["showtimes"].keys():
+        for showtime in element["showtimes"][showtimes_key]:
+            if showtime["internalId"] not in seen_ids:
+                seen_ids.add(showtime["internalId"])
+                # --- Début ajout pour l'URL réservation ---
+                reservation_url = None
+                ticketing_list = showtime.get("data", {}).get("ticketing", [])
+                for ticketing in ticketing_list:
+                    if ticketing.get('provider') == 'default' and ticketing.get('urls'):
+                        reservation_url = ticketing['urls'][0]
+                        break
+                # --- Fin ajout URL réservation ---
+                showtimes.append({
+                    "id_allocine": movie.get("internalId"),
+                    "startsAt": showtime["startsAt"],
+                    "diffusionVersion": showtime["diffusionVersion"],
+                    "reservation_url": reservation_url  # <-- Ajout ici
+                })
+    return showtimes
+
+
+def parse_showtime_results(results):
+    """
+    Films et horaires d'une page de séances
+    """
+    formated_data = list()
+    for element in results:
+        movie = element.get("movie", {})
+        formated_data.append({
+            "id_allocine": movie_id(movie),
+            "title": movie.get("title"),
+            "isPremiere": movie.get("isPremiere", False),
+            "showtimes": parse_element_showtimes(element, movie, set()),
+            "internalId": movie.get("internalId"),
+            "code": movie.get("code")
+        })
+    return formated_data
+
+
+def parse_movie_results(results, seen_ids):
+    """
+    Fiches des films d'une page de séances, sauf ceux déjà dans seen_ids (mis à jour)
+    """
+    formated_data = list()
+    for element in results:
+        if element.get("movie") is None:
+            continue
+        internal_id = movie_id(element["movie"])
+        if internal_id not in seen_ids:
+            seen_ids.add(internal_id)
+            formated_data.append(parse_movie(element["movie"], internal_id))
+    return formated_data
+
+
+class MoviesShowtimes:
+    """
+    Films d'un cinéma pour un jour, avec leurs séances, construits en une passe sur
+    chaque page : un film par id Allocine, dans l'ordre de première apparition.
+    """
+
+    def __init__(self):
+        self.films = dict()
+        self._showtime_ids = dict()
+
+    def add_page(self, results):
+        for element in results:
+            movie = element.get("movie")
+            if movie is None:
+                continue
+            internal_id = movie_id(movie)
+            film = self.films.get(internal_id)
+            if film is None:
+                film = self.films[internal_id] = parse_movie(movie, internal_id)
+                film["showtimes"] = list()
+                self._showtime_ids[internal_id] = set()
+            film["showtimes"].extend(parse_element_showtimes(element, movie, self._showtime_ids[internal_id]))
+
+    def result(self):
+        return list(self.films.values())
+
 
 class URLs:
     BASE_URL = "https://www.allocine.fr/"
@@ -289,19 +464,19 @@ class URLs:
     SHOWTIMES = "_/showtimes/theater-"
 
     @staticmethod
-    def seance_url():
-        return URLs.BASE_URL + URLs.SEANCES
+    def seance_url(base_url=None):
+        return (base_url or URLs.BASE_URL) + URLs.SEANCES
 
     @staticmethod
-    def cinemas_url(id_location):
+    def cinemas_url(id_location, base_url=None):
         if "circuit" in id_location:
-            return URLs.BASE_URL + URLs.SEANCES + id_location + "/"
+            return (base_url or URLs.BASE_URL) + URLs.SEANCES + id_location + "/"
         else:
-            return URLs.BASE_URL + URLs.SEANCES + URLs.CINEMA + id_location + "/"
+            return (base_url or URLs.BASE_URL) + URLs.SEANCES + URLs.CINEMA + id_location + "/"
 
     @staticmethod
-    def showtime_url(id_cinema, date_str: str, page):
-        return URLs.BASE_URL + URLs.SHOWTIMES + id_cinema + "/d-" + str(date_str) + "/p-" + str(page) + "/"
+    def showtime_url(id_cinema, date_str: str, page, base_url=None):
+        return (base_url or URLs.BASE_URL) + URLs.SHOWTIMES + id_cinema + "/d-" + str(date_str) + "/p-" + str(page) + "/"
 
 
 if __name__ == '__main__':
@@ -0,0 +1,230 @@
+import asyncio
+import json
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+except ImportError:  # pip install allocine-seances[async]
+    aiohttp = None
+
+from .allocineAPI import (
+    RETRY_STATUSES,
+    MoviesShowtimes,
+    URLs,
+    allocineAPI,
+    find_section,
+    parse_cinemas_page,
+    parse_circuit_links,
+    parse_location_links,
+    parse_movie_results,
+    parse_pagination,
+    parse_showtime_results,
+)
+
+
+class HostRateLimiter:
+    """
+    Espace les requêtes vers un même hôte d'au moins 1 / rate secondes
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = {}
+
+    async def wait(self, host):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncAllocineAPI:
+    """
+    Équivalent asyncio d'allocineAPI : mêmes méthodes (à attendre avec await), mêmes résultats.
+
+    Toutes les requêtes passent par un sémaphore global (concurrency) et un limiteur
+    de débit par hôte (rate_limit requêtes par seconde), ce qui permet de lancer des
+    milliers de get_movies_with_showtimes avec asyncio.gather sur un seul thread.
+
+        async with AsyncAllocineAPI(concurrency=32, rate_limit=20) as api:
+            results = await asyncio.gather(*(api.get_showtime(c, d) for c, d in jobs))
+    """
+    TOP_VILLE_TITLE = allocineAPI.TOP_VILLE_TITLE
+    DEPARTEMENTS_TITLE = allocineAPI.DEPARTEMENTS_TITLE
+    CIRCUIT_TITLE = allocineAPI.CIRCUIT_TITLE
+
+    def __init__(self, concurrency=32, rate_limit=None, timeout=(5, 20), retries=3, backoff_factor=0.5, base_url=None, session=None):
+        """
+        :param concurrency: nombre maximum de requêtes en cours, tous hôtes confondus
+        :param rate_limit: requêtes par seconde et par hôte (None : pas de limite)
+        :param timeout: secondes, ou tuple (connexion, lecture), appliqué à chaque requête
+        :param retries: nouvelles tentatives sur erreur réseau, 429 et 5xx
+        :param backoff_factor: attente exponentielle entre tentatives (0.5s, 1s, 2s...), Retry-After respecté
+        :param base_url: racine du site (par défaut URLs.BASE_URL), par exemple un serveur local de test
+        :param session: aiohttp.ClientSession à utiliser (par défaut créée au premier appel)
+        """
+        if aiohttp is None:
+            raise RuntimeError("aiohttp est requis : pip install allocine-seances[async]")
+        self.base_url = base_url or URLs.BASE_URL
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = HostRateLimiter(rate_limit)
+        self.session = session
+        self._owns_session = session is None
+        self._semaphore = None
+        self._requests = 0
+        self._retries = 0
+        self._errors = 0
+        self._bytes = 0
+
+    def _ensure_session(self):
+        # Créés dans la boucle d'événements qui les utilise.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self.session is None:
+            connect, read = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read),
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None and self._owns_session:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def stats(self):
+        """
+        Compteurs depuis la création du client
+        :return: {"requests", "retries", "errors", "bytes"}
+        """
+        return {"requests": self._requests, "retries": self._retries, "errors": self._errors, "bytes": self._bytes}
+
+    def _backoff(self, attempt, retry_after):
+        delay = self.backoff_factor * (2 ** (attempt - 1))
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    async def _get(self, path, params=None):
+        session = self._ensure_session()
+        host = urlsplit(path).netloc
+        self._requests += 1
+        attempt = 0
+        while True:
+            status, retry_after = None, None
+            async with self._semaphore:
+                await self.rate_limiter.wait(host)
+                try:
+                    async with session.get(path, params=params) as resp:
+                        body = await resp.read()
+                        status, retry_after = resp.status, resp.headers.get("Retry-After")
+                        self._bytes += len(body)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if attempt >= self.retries:
+                        self._errors += 1
+                        raise
+            if status == 200:
+                return body
+            if status is not None and (status not in RETRY_STATUSES or attempt >= self.retries):
+                self._errors += 1
+                raise Exception("Error " + str(status))
+            # L'attente se fait hors du sémaphore : elle ne bloque pas les autres requêtes.
+            attempt += 1
+            self._retries += 1
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    async def _get_json_request(self, path, url_params: dict = None) -> dict:
+        return json.loads(await self._get(path, params=url_params))
+
+    async def _get_request(self, path, params=None):
+        return (await self._get(path, params=params)).decode("utf-8")
+
+    async def _get_showtime_pages(self, id_cinema, date_str):
+        """
+        Pages JSON de séances d'un cinéma pour un jour, dans l'ordre des pages.
+        La page 1 donne totalPages, les suivantes sont lancées ensemble dans le budget de concurrence.
+        """
+        first = await self._get_json_request(URLs.showtime_url(id_cinema, date_str, 1, self.base_url))
+        _, totalPages = parse_pagination(first)
+        rest = await asyncio.gather(*(
+            self._get_json_request(URLs.showtime_url(id_cinema, date_str, page, self.base_url))
+            for page in range(2, totalPages + 1)
+        ))
+        return [first] + list(rest)
+
+    async def _get_section(self, title):
+        return find_section(await self._get_request(URLs.seance_url(self.base_url)), title)
+
+    async def get_top_villes(self):
+        return parse_location_links(await self._get_section(AsyncAllocineAPI.TOP_VILLE_TITLE))
+
+    async def get_departements(self):
+        return parse_location_links(await self._get_section(AsyncAllocineAPI.DEPARTEMENTS_TITLE))
+
+    async def get_circuit(self):
+        return parse_circuit_links(await self._get_section(AsyncAllocineAPI.CIRCUIT_TITLE))
+
+    async def get_cinema(self, id_location):
+        """
+        Récupération des id de cinema à partir des id de location
+        :param id_location: id de ville, id de département ou id de circuit
+        :return:
+        """
+        result = list()
+        next_page = 1
+        while next_page is not None:
+            webpage = await self._get_request(URLs.cinemas_url(id_location, self.base_url), params={"page": next_page})
+            cinemas, next_page = parse_cinemas_page(webpage, next_page)
+            result.extend(cinemas)
+        return result
+
+    async def get_showtime(self, id_cinema, date_str: str):
+        """
+        Récupération des horaires des séances pour un cinéma, pour un jour donné
+        :param date_str: date
+        :param id_cinema: id du cinéma
+        :return:
+        """
+        formated_data = list()
+        for json_data in await self._get_showtime_pages(id_cinema, date_str):
+            formated_data.extend(parse_showtime_results(json_data["results"]))
+        return formated_data
+
+    async def get_movies(self, id_cinema, date_str: str):
+        """
+        Récupération des films pour un cinéma et un jour
+        :param date_str: date
+        :param id_cinema: id du cinéma
+        :return:
+        """
+        formated_data = list()
+        seen_ids = set()
+        for json_data in await self._get_showtime_pages(id_cinema, date_str):
+            formated_data.extend(parse_movie_results(json_data["results"], seen_ids))
+        return formated_data
+
+    async def get_movies_with_showtimes(self, id_cinema, date_str: str):
+        """
+        Films (fiches complètes) et leurs séances pour un cinéma et un jour, en une seule
+        lecture des pages de séances
+        :param date_str: date
+        :param id_cinema: id du cinéma
+        :return: fiches de get_movies avec la liste "showtimes" de get_showtime
+        """
+        movies = MoviesShowtimes()
+        for json_data in await self._get_showtime_pages(id_cinema, date_str):
+            movies.add_page(json_data["results"])
+        return movies.result()
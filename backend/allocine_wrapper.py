@@ -1,34 +1,78 @@
 from allocineAPI.allocineAPI import allocineAPI
+from allocineAPI.async_allocineAPI import AsyncAllocineAPI
+import asyncio
 import logging
+import os
+import threading
 
 logging.basicConfig(level=logging.INFO)
 logging.getLogger("urllib3").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
+_api = None
+_api_lock = threading.Lock()
+
+def get_api():
+    """Client Allocine partagé par tous les threads : une seule session keep-alive.
+
+    Créé au premier appel, donc après le load_dotenv() des scrapers.
+    """
+    global _api
+    with _api_lock:
+        if _api is None:
+            _api = allocineAPI(
+                pool_size=int(os.getenv("ALLOCINE_POOL_SIZE", 8)),
+                timeout=(float(os.getenv("ALLOCINE_CONNECT_TIMEOUT", 5)), float(os.getenv("ALLOCINE_READ_TIMEOUT", 10))),
+                retries=int(os.getenv("ALLOCINE_RETRIES", 3)),
+                backoff_factor=float(os.getenv("ALLOCINE_BACKOFF_SECONDS", 0.5)),
+            )
+        return _api
+
+def get_async_api():
+    """Client asyncio, à créer et fermer dans la boucle d'événements qui l'utilise."""
+    rate_limit = float(os.getenv("ALLOCINE_RATE_LIMIT", 20))
+    return AsyncAllocineAPI(
+        concurrency=int(os.getenv("ALLOCINE_CONCURRENCY", 32)),
+        rate_limit=rate_limit or None,
+        timeout=(float(os.getenv("ALLOCINE_CONNECT_TIMEOUT", 5)), float(os.getenv("ALLOCINE_READ_TIMEOUT", 10))),
+        retries=int(os.getenv("ALLOCINE_RETRIES", 3)),
+        backoff_factor=float(os.getenv("ALLOCINE_BACKOFF_SECONDS", 0.5)),
+    )
+
+def log_http_stats(api=None):
+    stats = (api or get_api()).stats()
+    logger.info(
+        "Allocine HTTP : %d requêtes, %d nouvelles tentatives, %d erreurs, %.1f Mo",
+        stats["requests"], stats["retries"], stats["errors"], stats["bytes"] / 1e6,
+    )
+
 def get_movies_with_showtimes(cinemaId, date):
-    api = allocineAPI()
-
-    # 1. Films avec infos complètes
-    movies = api.get_movies(cinemaId, date)
-
-    # 2. Films avec horaires
-    showtimes = api.get_showtime(cinemaId, date)
-
-    # 3. Indexer les horaires par titre
-    showtimes_by_title = {s["title"]: {"id_allocine": s.get("id_allocine") or s.get("internalId"), "showtimes": s.get("showtimes", [])} for s in showtimes}
-    # logger.debug(f"Showtimes by title and their id_allocine: { {k: v['id_allocine'] for k,v in showtimes_by_title.items()} }")
-
-    # 4. Fusionner infos du film + horaires correspondants
-    result = []
-    for movie in movies:
-        title = movie.get("title")
-        movie_with_times = dict(movie)  # toutes les infos du film
-        entry = showtimes_by_title.get(title, {})
-        movie_with_times["showtimes"] = entry.get("showtimes", [])
-        if not movie_with_times.get("id_allocine"):
-          movie_with_times["id_allocine"] = entry.get("id_allocine") or movie_with_times.get("id_allocine")
-        if not movie_with_times.get("isPremiere"):
-          movie_with_times["isPremiere"] = entry.get("isPremiere", False)
-        # logger.debug(f"Movie '{title}': assigned id_allocine = {movie_with_times.get('id_allocine')}")
-        result.append(movie_with_times)
-    return result
+    """Films du cinéma pour la date, chacun avec ses séances (une seule lecture des pages)."""
+    return get_api().get_movies_with_showtimes(cinemaId, date)
+
+async def get_movies_with_showtimes_async(api, cinemaId, date):
+    return await api.get_movies_with_showtimes(cinemaId, date)
+
+def fetch_movies_with_showtimes(tasks, on_result=None):
+    """Récupère get_movies_with_showtimes pour des milliers de (cinemaId, date) sur un seul thread.
+
+    La concurrence est bornée par ALLOCINE_CONCURRENCY et le débit par ALLOCINE_RATE_LIMIT.
+    on_result(cinemaId, date, movies, error) est appelé à chaque fin de tâche ; sinon la
+    fonction renvoie {(cinemaId, date): movies ou exception}.
+    """
+    async def run():
+        results = {}
+        async with get_async_api() as api:
+            async def one(cinemaId, date):
+                try:
+                    movies, error = await get_movies_with_showtimes_async(api, cinemaId, date), None
+                except Exception as e:
+                    movies, error = None, e
+                if on_result is not None:
+                    on_result(cinemaId, date, movies, error)
+                else:
+                    results[(cinemaId, date)] = error if error is not None else movies
+            await asyncio.gather(*(one(cinemaId, date) for cinemaId, date in tasks))
+            log_http_stats(api)
+        return results
+    return asyncio.run(run())
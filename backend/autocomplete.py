@@ -0,0 +1,184 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Same order as the SQL search_suggest: films, then cinemas, then cities.
+KIND_ORDER = {"film": 0, "cinema": 1, "city": 2}
+
+# Letters unaccent() expands but Unicode decomposition leaves alone.
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "oe", "æ": "ae", "Æ": "ae", "ß": "ss"})
+_WORD_RE = re.compile(r"\w+")
+_ZIPCODE_RE = re.compile(r"\b(\d{5})\b")
+
+
+def fold(text: Optional[str]) -> str:
+  """Accent- and case-folded text, matching SQL search_normalize()."""
+  if not text:
+    return ""
+  decomposed = unicodedata.normalize("NFKD", text.translate(_LIGATURES))
+  return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def _trigrams(text: str) -> set:
+  return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class AutocompleteIndex:
+  """In-memory search_suggest over films, cinemas and cities.
+
+  Each entry has folded search keys (title and original title, or name) matched by
+  substring, plus prefix-only keys (zipcodes). Queries of three characters or more
+  intersect trigram posting lists and then check the substring; shorter ones only
+  match words starting with the query, found by bisecting a sorted word list.
+  Within a kind, whole-key prefix matches rank first, then word-prefix matches, then
+  the rest, each by popularity (upcoming showtimes, cinemas in the city).
+  """
+
+  def __init__(self, entries: Iterable[dict], generation: Optional[int] = None) -> None:
+    self.generation = generation
+    self._suggestions: List[dict] = []
+    # (kind order, -popularity, label length, label) per entry
+    self._rank: List[Tuple[int, int, int, str]] = []
+    self._keys: List[Tuple[str, ...]] = []
+    grams: Dict[str, List[int]] = {}
+    whole_keys: List[Tuple[str, int]] = []
+    words: List[Tuple[str, int]] = []
+
+    for entry in entries:
+      position = len(self._suggestions)
+      keys = tuple(key for key in (fold(value) for value in entry.get("keys", ())) if key)
+      prefix_keys = tuple(key for key in (fold(value) for value in entry.get("prefix_keys", ())) if key)
+      suggestion = {"type": entry["type"], "id": entry["id"], "label": entry["label"]}
+      if entry.get("sublabel"):
+        suggestion["sublabel"] = entry["sublabel"]
+      if entry.get("lat") is not None and entry.get("lon") is not None:
+        suggestion["lat"] = float(entry["lat"])
+        suggestion["lon"] = float(entry["lon"])
+      self._suggestions.append(suggestion)
+      self._rank.append((KIND_ORDER[entry["type"]], -int(entry.get("popularity") or 0), len(entry["label"]), entry["label"]))
+      self._keys.append(keys)
+
+      for gram in set().union(*(_trigrams(key) for key in keys)):
+        grams.setdefault(gram, []).append(position)
+      whole_keys.extend((key, position) for key in set(keys) | set(prefix_keys))
+      words.extend((word, position) for word in {word for key in keys for word in _WORD_RE.findall(key)})
+
+    self._grams = grams
+    self._whole_keys = _SortedTerms(whole_keys)
+    self._words = _SortedTerms(words)
+
+  @classmethod
+  def load(cls, conn, generation: Optional[int] = None) -> "AutocompleteIndex":
+    with conn.cursor() as cur:
+      cur.execute(
+        """
+        SELECT f.id, f.title, NULLIF(f.original_title, ''), COUNT(s.id)
+        FROM films f
+        LEFT JOIN showtimes s ON s.movie_id = f.id AND s.start_date >= CURRENT_DATE
+        WHERE f.title IS NOT NULL
+        GROUP BY f.id;
+        """
+      )
+      films = cur.fetchall()
+      cur.execute(
+        """
+        SELECT c.id, c.name, c.address, c.latitude, c.longitude, COUNT(s.id)
+        FROM cinemas c
+        LEFT JOIN showtimes s ON s.cinema_id = c.id AND s.start_date >= CURRENT_DATE
+        WHERE c.name IS NOT NULL
+        GROUP BY c.id;
+        """
+      )
+      cinemas = cur.fetchall()
+      cur.execute("SELECT id, name, zipcode, lat, lon FROM geo_cities;")
+      cities = cur.fetchall()
+    conn.rollback()
+    return cls(_entries(films, cinemas, cities), generation=generation)
+
+  def __len__(self) -> int:
+    return len(self._suggestions)
+
+  def _substring_candidates(self, term: str) -> set:
+    postings = sorted((self._grams.get(gram, ()) for gram in _trigrams(term)), key=len)
+    if not postings or not postings[0]:
+      return set()
+    candidates = set(postings[0])
+    for posting in postings[1:]:
+      candidates.intersection_update(posting)
+      if not candidates:
+        return candidates
+    return {position for position in candidates if any(term in key for key in self._keys[position])}
+
+  def search(self, query: str, limit: int) -> List[dict]:
+    term = fold(query).strip()
+    if not term:
+      return []
+    # Match class: 0 = a whole key starts with the term, 1 = one of its words does,
+    # 2 = substring only.
+    classes: Dict[int, int] = {}
+    if len(term) >= 3:
+      classes.update(dict.fromkeys(self._substring_candidates(term), 2))
+    classes.update(dict.fromkeys(self._words.starting_with(term), 1))
+    classes.update(dict.fromkeys(self._whole_keys.starting_with(term), 0))
+
+    ranked = heapq.nsmallest(
+      limit,
+      ((self._rank[position][0], match_class) + self._rank[position][1:] + (position,) for position, match_class in classes.items()),
+    )
+    return [dict(self._suggestions[item[-1]]) for item in ranked]
+
+
+class _SortedTerms:
+  """Sorted (term, position) pairs answering "positions of terms starting with x"."""
+
+  def __init__(self, pairs: List[Tuple[str, int]]) -> None:
+    pairs.sort()
+    self.terms = [term for term, _ in pairs]
+    self.positions = [position for _, position in pairs]
+
+  def starting_with(self, prefix: str) -> List[int]:
+    start = bisect_left(self.terms, prefix)
+    end = bisect_left(self.terms, prefix + "\uffff", start)
+    return self.positions[start:end]
+
+
+def _entries(films: Sequence[tuple], cinemas: Sequence[tuple], cities: Sequence[tuple]) -> Iterable[dict]:
+  for film_id, title, original_title, showtimes in films:
+    sublabel = original_title if original_title and original_title.lower() != title.lower() else None
+    yield {
+      "type": "film",
+      "id": film_id,
+      "label": title,
+      "sublabel": sublabel,
+      "keys": (title, original_title),
+      "popularity": showtimes,
+    }
+
+  cinemas_per_zipcode: Counter = Counter()
+  for cinema_id, name, address, lat, lon, showtimes in cinemas:
+    cinemas_per_zipcode.update(set(_ZIPCODE_RE.findall(address or "")))
+    yield {
+      "type": "cinema",
+      "id": cinema_id,
+      "label": name,
+      "lat": lat,
+      "lon": lon,
+      "keys": (name,),
+      "popularity": showtimes,
+    }
+
+  for city_id, name, zipcode, lat, lon in cities:
+    yield {
+      "type": "city",
+      "id": city_id,
+      "label": name,
+      "sublabel": zipcode or None,
+      "lat": lat,
+      "lon": lon,
+      "keys": (name,),
+      "prefix_keys": (zipcode,) if zipcode else (),
+      "popularity": cinemas_per_zipcode.get(zipcode, 0),
+    }
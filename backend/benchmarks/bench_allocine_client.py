@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+bench_allocine_client.py
+Scrape synthetic cinema-days from a local stand-in for the Allocine showtime pages:
+the threaded allocineAPI (one shared keep-alive session, as the scrapers use it)
+against AsyncAllocineAPI on one event loop. Both must return the same films and
+showtimes; the server adds a fixed latency per page to mimic the real round trip.
+
+    python benchmarks/bench_allocine_client.py --cinemas 200 --days 2 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from allocineAPI.allocineAPI import allocineAPI  # noqa: E402
+from allocineAPI.async_allocineAPI import AsyncAllocineAPI  # noqa: E402
+
+SHOWTIME_PATH = re.compile(r"^/_/showtimes/theater-(?P<cinema>[^/]+)/d-(?P<date>[^/]+)/p-(?P<page>\d+)/$")
+
+
+def showtime_page(cinema: str, date: str, page: int, pages: int, films_per_page: int, film_count: int = 400) -> dict:
+  """One page shaped like the Allocine showtimes JSON, deterministic per (cinema, date, page).
+
+  Films are drawn from `film_count` ids; a small count makes films (and showtimes)
+  repeat across pages, as the real pages sometimes do.
+  """
+  results = []
+  for slot in range(films_per_page):
+    film = (sum(map(ord, cinema)) + page * films_per_page + slot) % film_count
+    showtimes = [
+      {
+        "internalId": int(f"{film}{hour:02d}{slot}"),
+        "startsAt": f"{date}T{hour:02d}:{15 * slot % 60:02d}:00",
+        "diffusionVersion": "ORIGINAL" if hour % 2 else "DUBBED",
+        "data": {"ticketing": [{"provider": "default", "urls": [f"https://tickets.example/{cinema}/{film}/{hour}"]}]},
+      }
+      for hour in range(11, 23, 3)
+    ]
+    results.append({
+      "movie": {
+        "internalId": 100000 + film,
+        "title": f"Film {film}",
+        "originalTitle": f"Original {film}",
+        "credits": [{"position": {"name": "DIRECTOR"}, "person": {"firstName": "Jane", "lastName": f"Doe {film}"}}],
+        "synopsisFull": "Lorem ipsum " * 20,
+        "poster": {"url": f"https://img.example/{film}.jpg"},
+        "releases": [{"name": "Released", "releaseDate": {"date": "2025-09-03"}}],
+        "genres": [{"translate": "Drame"}],
+        "runtime": "1h 45min",
+        "languages": ["FRENCH"],
+        "flags": {"hasDvdRelease": False},
+        "customFlags": {"isPremiere": False, "weeklyOuting": film % 7 == 0},
+      },
+      "showtimes": {"original": showtimes},
+    })
+  return {"pagination": {"page": page, "totalPages": pages}, "results": results}
+
+
+def start_server(latency: float, pages_for, films_per_page: int, status_for=None, film_count: int = 400) -> ThreadingHTTPServer:
+  """Serve showtime pages on an ephemeral port until `shutdown()`.
+
+  `status_for(cinema, date, page)`, when given, can answer an error status instead of
+  the page (429 responses carry `Retry-After: 0`), e.g. to exercise client retries.
+  """
+  class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+      match = SHOWTIME_PATH.match(self.path)
+      if match is None:
+        self.send_error(404)
+        return
+      time.sleep(latency)
+      cinema, date, page = match["cinema"], match["date"], int(match["page"])
+      status = status_for(cinema, date, page) if status_for is not None else 200
+      if status != 200:
+        self.send_response(status)
+        if status == 429:
+          self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return
+      body = json.dumps(showtime_page(cinema, date, page, pages_for(cinema), films_per_page, film_count)).encode("utf-8")
+      self.send_response(200)
+      self.send_header("Content-Type", "application/json")
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, *args):
+      pass
+
+  server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+  server.daemon_threads = True
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+
+def run_threads(base_url: str, tasks, workers: int):
+  api = allocineAPI(pool_size=workers, base_url=base_url)
+
+  def one(task):
+    cinema, date = task
+    return api.get_movies_with_showtimes(cinema, date)
+
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    results = dict(zip(tasks, executor.map(one, tasks)))
+  api.close()
+  return results, api.stats()
+
+
+async def run_async(base_url: str, tasks, concurrency: int):
+  async with AsyncAllocineAPI(concurrency=concurrency, base_url=base_url) as api:
+    movies = await asyncio.gather(*(api.get_movies_with_showtimes(cinema, date) for cinema, date in tasks))
+    return dict(zip(tasks, movies)), api.stats()
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--cinemas", type=int, default=200)
+  parser.add_argument("--days", type=int, default=2)
+  parser.add_argument("--max-pages", type=int, default=3, help="cinemas have 1..max-pages showtime pages")
+  parser.add_argument("--films-per-page", type=int, default=10)
+  parser.add_argument("--latency", type=float, default=0.05, help="seconds the server waits per page")
+  parser.add_argument("--workers", type=int, default=8, help="threads of the threaded client (scrapers use 5-8)")
+  parser.add_argument("--concurrency", type=int, default=64, help="in-flight requests of the async client")
+  args = parser.parse_args()
+
+  def pages_for(cinema: str) -> int:
+    return 1 + int(cinema[1:]) % args.max_pages
+
+  server = start_server(args.latency, pages_for, args.films_per_page)
+  base_url = f"http://127.0.0.1:{server.server_port}/"
+  cinemas = [f"P{index:04d}" for index in range(args.cinemas)]
+  dates = [f"2025-09-{day:02d}" for day in range(10, 10 + args.days)]
+  tasks = [(cinema, date) for cinema in cinemas for date in dates]
+  pages = sum(pages_for(cinema) for cinema, _ in tasks)
+  print(f"{len(tasks)} cinema-days, {pages} showtime pages, {args.latency * 1000:.0f} ms per page")
+
+  started = time.perf_counter()
+  threaded, threaded_stats = run_threads(base_url, tasks, args.workers)
+  threaded_s = time.perf_counter() - started
+  started = time.perf_counter()
+  concurrent, async_stats = asyncio.run(run_async(base_url, tasks, args.concurrency))
+  async_s = time.perf_counter() - started
+  server.shutdown()
+
+  for label, elapsed, stats in (
+    (f"threads ({args.workers} workers)", threaded_s, threaded_stats),
+    (f"asyncio (concurrency {args.concurrency})", async_s, async_stats),
+  ):
+    print(f"  {label:<28} {elapsed:7.2f} s  {stats['requests']:>6} requests  {stats['bytes'] / 1e6:7.1f} MB  {stats['errors']} errors")
+  if threaded != concurrent:
+    print("  MISMATCH between threaded and asyncio results", file=sys.stderr)
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+bench_json_payloads.py
+Serialize and compress movies_nearby payloads built from the cinemas, films and
+showtimes of flim_dump.sql: stdlib json (after the ISO string conversion the API used
+to do) against fast_json.dumps, then gzip/brotli sizes and timings.
+
+    python benchmarks/bench_json_payloads.py --lat 48.8566 --lon 2.3522 --radius 30
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import date, datetime, time as dt_time
+from operator import itemgetter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fast_json import ORJSON_AVAILABLE, dumps  # noqa: E402
+from http_compression import BROTLI_AVAILABLE, compress_body  # noqa: E402
+from nearby_aggregate import (  # noqa: E402
+  CINEMA_NAME,
+  NEARBY_COLUMNS,
+  START_DATE,
+  START_TIME,
+  TITLE,
+  MovieAggregator,
+)
+from payload_format import compact_movies  # noqa: E402
+from spatial_index import haversine_km  # noqa: E402
+
+DUMP = Path(__file__).resolve().parents[1] / "flim_dump.sql"
+
+
+def read_copy_blocks(path: Path, tables):
+  """{table: [dict rows]} for the `COPY public.<table> (...) FROM stdin;` blocks."""
+  blocks = {table: [] for table in tables}
+  current = columns = None
+  with path.open(encoding="utf-8") as dump:
+    for line in dump:
+      if current is None:
+        if line.startswith("COPY public."):
+          name = line[len("COPY public."):line.index(" (")]
+          if name in blocks:
+            current = blocks[name]
+            columns = [col.strip() for col in line[line.index("(") + 1:line.index(")")].split(",")]
+        continue
+      if line.startswith("\\."):
+        current = None
+        continue
+      values = [None if value == "\\N" else value for value in line.rstrip("\n").split("\t")]
+      current.append(dict(zip(columns, values)))
+  return blocks
+
+
+def nearby_rows(blocks, lat: float, lon: float, radius_km: float):
+  """Rows shaped like the movies_nearby query, with native date/time values."""
+  cinemas = {}
+  for cinema in blocks["cinemas"]:
+    if cinema["latitude"] is None or cinema["longitude"] is None:
+      continue
+    clat, clon = float(cinema["latitude"]), float(cinema["longitude"])
+    distance = haversine_km(lat, lon, clat, clon)
+    if distance <= radius_km:
+      cinemas[cinema["id"]] = (cinema, clat, clon, distance)
+  films = {film["id"]: film for film in blocks["films"]}
+
+  rows = []
+  for show in blocks["showtimes"]:
+    located = cinemas.get(show["cinema_id"])
+    film = films.get(show["movie_id"])
+    if located is None or film is None or show["start_date"] is None:
+      continue
+    cinema, clat, clon, distance = located
+    row = {
+      "film_id": int(film["id"]),
+      "title": film["title"],
+      "original_title": film["original_title"],
+      "poster_url": film["poster_url"],
+      "duration": int(film["duration"]) if film["duration"] else None,
+      "release_date": date.fromisoformat(film["release_date"]) if film["release_date"] else None,
+      "synopsis": film["synopsis"],
+      "genres": film["genre"],
+      "languages": film["languages"],
+      "cinema_id": int(cinema["id"]),
+      "cinema_name": cinema["name"],
+      "address": cinema["address"],
+      "lat": clat,
+      "lon": clon,
+      "distance_km": distance,
+      "start_date": date.fromisoformat(show["start_date"]),
+      "start_time": dt_time.fromisoformat(show["start_time"]),
+      "diffusion_version": show["diffusion_version"],
+      "format": show["format"],
+      "reservation_url": show["reservation_url"],
+    }
+    rows.append(tuple(row[name] for name in NEARBY_COLUMNS))
+  rows.sort(key=itemgetter(TITLE, CINEMA_NAME, START_DATE, START_TIME))
+  return rows
+
+
+def with_iso_strings(value):
+  """The pre-conversion the payload used to get before reaching jsonable_encoder/json."""
+  if isinstance(value, dict):
+    return {key: with_iso_strings(item) for key, item in value.items()}
+  if isinstance(value, list):
+    return [with_iso_strings(item) for item in value]
+  if isinstance(value, (datetime, date, dt_time)):
+    return value.isoformat()
+  return value
+
+
+def best_of(func, repeat: int):
+  best = float("inf")
+  result = None
+  for _ in range(repeat):
+    started = time.perf_counter()
+    result = func()
+    best = min(best, time.perf_counter() - started)
+  return best * 1000, result
+
+
+def bench_payload(label: str, payload: dict, repeat: int) -> int:
+  print(f"{label}:")
+
+  def stdlib():
+    return json.dumps(with_iso_strings(payload), ensure_ascii=False).encode("utf-8")
+
+  baseline_ms, baseline = best_of(stdlib, repeat)
+  fast_ms, body = best_of(lambda: dumps(payload), repeat)
+  print(f"  {'json (+isoformat)':<22} {baseline_ms:8.2f} ms  {len(baseline):>9} B")
+  print(f"  {'fast_json':<22} {fast_ms:8.2f} ms  {len(body):>9} B  ({'orjson' if ORJSON_AVAILABLE else 'stdlib'})")
+  if json.loads(body) != json.loads(baseline):
+    print("  MISMATCH between json and fast_json output", file=sys.stderr)
+    return 1
+
+  try:
+    from fastapi.encoders import jsonable_encoder
+  except ImportError:
+    pass
+  else:
+    encoder_ms, _ = best_of(lambda: json.dumps(jsonable_encoder(payload), ensure_ascii=False).encode("utf-8"), repeat)
+    print(f"  {'jsonable_encoder+json':<22} {encoder_ms:8.2f} ms")
+
+  codings = [("gzip", {"gzip_level": level}) for level in (1, 6, 9)]
+  if BROTLI_AVAILABLE:
+    codings += [("br", {"brotli_quality": quality}) for quality in (1, 5, 11)]
+  for coding, settings in codings:
+    level = next(iter(settings.values()))
+    elapsed_ms, compressed = best_of(lambda: compress_body(body, coding, **settings), repeat)
+    ratio = len(compressed) / len(body) if body else 0.0
+    print(f"  {coding + ' ' + str(level):<22} {elapsed_ms:8.2f} ms  {len(compressed):>9} B  ({ratio:.1%})")
+  return 0
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--dump", type=Path, default=DUMP)
+  parser.add_argument("--lat", type=float, default=48.8566)
+  parser.add_argument("--lon", type=float, default=2.3522)
+  parser.add_argument("--radius", type=float, default=30.0)
+  parser.add_argument("--repeat", type=int, default=5)
+  args = parser.parse_args()
+
+  blocks = read_copy_blocks(args.dump, ("cinemas", "films", "showtimes"))
+  rows = nearby_rows(blocks, args.lat, args.lon, args.radius)
+  movies = MovieAggregator().extend(rows).result()
+  for movie in movies:
+    movie.pop("_meta", None)
+  print(f"{len(rows)} showtimes, {len(movies)} films within {args.radius:g} km")
+  if not ORJSON_AVAILABLE:
+    print("orjson is not installed: fast_json falls back to the stdlib encoder", file=sys.stderr)
+  if not BROTLI_AVAILABLE:
+    print("Brotli is not installed: only gzip is measured", file=sys.stderr)
+
+  envelope = {"success": True, "center_lat": args.lat, "center_lon": args.lon, "radius_km": args.radius, "next_cursor": None}
+  payloads = {
+    "full": {**envelope, "data": movies},
+    "compact": {**envelope, "format": "compact", **compact_movies(movies)},
+  }
+  status = 0
+  for label, payload in payloads.items():
+    status |= bench_payload(label, payload, args.repeat)
+  return status
+
+
+if __name__ == "__main__":
+  sys.exit(main())
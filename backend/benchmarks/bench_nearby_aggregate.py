@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+bench_nearby_aggregate.py
+Compare the streaming movies_nearby post-processing (MovieAggregator) with the NumPy
+column version on synthetic rows shaped like the showtime_listing query.
+
+    python benchmarks/bench_nearby_aggregate.py --films 300 --cinemas 200 --days 7
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import date, time as dt_time, timedelta
+from operator import itemgetter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from nearby_aggregate import (  # noqa: E402
+  CINEMA_NAME,
+  NEARBY_COLUMNS,
+  NUMPY_AVAILABLE,
+  START_DATE,
+  START_TIME,
+  TITLE,
+  aggregate_movies_loop,
+  aggregate_movies_numpy,
+)
+
+VERSIONS = ["VF", "VOST", "VO", None]
+LANGUAGES = ["Français", "Anglais", "Espagnol", "Italien", "Japonais"]
+GENRES = ["Action", "Comédie", "Drame", "Animation", "Thriller", "Documentaire"]
+
+
+def make_rows(films: int, cinemas: int, days: int, shows_per_day: int, coverage: float, seed: int):
+  rng = random.Random(seed)
+  today = date.today()
+  cinema_rows = [
+    {
+      "cinema_id": 1000 + idx,
+      "cinema_name": f"Cinéma {idx:04d}",
+      "address": f"{idx} rue du Cinéma",
+      "lat": 48.85 + rng.uniform(-0.5, 0.5),
+      "lon": 2.35 + rng.uniform(-0.5, 0.5),
+      "distance_km": rng.uniform(0, 50),
+    }
+    for idx in range(cinemas)
+  ]
+
+  rows = []
+  for film_idx in range(films):
+    film = {
+      "film_id": 500000 + film_idx,
+      "title": f"Film {film_idx:05d}",
+      "original_title": None,
+      "poster_url": None,
+      "duration": rng.randint(70, 200),
+      "release_date": today,
+      "synopsis": "",
+      "genres": rng.sample(GENRES, 2),
+      "languages": rng.sample(LANGUAGES, 1),
+    }
+    for cinema in cinema_rows:
+      if rng.random() > coverage:
+        continue
+      for day in range(days):
+        for _ in range(shows_per_day):
+          row = {
+            **film,
+            **cinema,
+            "start_date": today + timedelta(days=day),
+            "start_time": dt_time(rng.randint(10, 23), rng.choice((0, 15, 30, 45))),
+            "diffusion_version": rng.choice(VERSIONS),
+            "format": "Numérique",
+            "reservation_url": None,
+          }
+          rows.append(tuple(row[name] for name in NEARBY_COLUMNS))
+  rows.sort(key=itemgetter(TITLE, CINEMA_NAME, START_DATE, START_TIME))
+  return rows
+
+
+def timed(label: str, func, rows, repeat: int, **filters):
+  best = float("inf")
+  result = None
+  for _ in range(repeat):
+    started = time.perf_counter()
+    result = func(rows, **filters)
+    best = min(best, time.perf_counter() - started)
+  print(f"  {label:<10} {best * 1000:9.1f} ms  ({len(result)} films)")
+  return result
+
+
+def comparable(movies):
+  return [
+    (m["id"], [(c["id"], c["showtimes"]) for c in m["cinemas"]], m["_meta"]["min_distance"])
+    for m in movies
+  ]
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--films", type=int, default=300)
+  parser.add_argument("--cinemas", type=int, default=200)
+  parser.add_argument("--days", type=int, default=7)
+  parser.add_argument("--shows-per-day", type=int, default=3)
+  parser.add_argument("--coverage", type=float, default=0.15, help="share of cinemas showing each film")
+  parser.add_argument("--repeat", type=int, default=3)
+  parser.add_argument("--seed", type=int, default=42)
+  args = parser.parse_args()
+
+  if not NUMPY_AVAILABLE:
+    print("numpy is not installed: pip install numpy", file=sys.stderr)
+    return 1
+
+  rows = make_rows(args.films, args.cinemas, args.days, args.shows_per_day, args.coverage, args.seed)
+  print(f"{len(rows)} rows")
+  scenarios = {
+    "no filter": {},
+    "date": {"filter_date": date.today() + timedelta(days=1)},
+    "date+vost+duration": {"filter_date": date.today(), "subtitles": ["VOST"], "duration_max": 120},
+    "radius 10 km": {"max_distance_km": 10.0},
+  }
+  for name, filters in scenarios.items():
+    print(f"{name}:")
+    stream_result = timed("streaming", aggregate_movies_loop, rows, args.repeat, **filters)
+    numpy_result = timed("numpy", aggregate_movies_numpy, rows, args.repeat, **filters)
+    if comparable(stream_result) != comparable(numpy_result):
+      print("  MISMATCH between streaming and numpy results", file=sys.stderr)
+      return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
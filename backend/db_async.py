@@ -0,0 +1,146 @@
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+_NAMED_PARAM_RE = re.compile(r"%\((\w+)\)s")
+
+
+def to_positional(query: str, params: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+  """Rewrite a psycopg2 `%(name)s` query into asyncpg's `$n` placeholders.
+
+  Lets both drivers share the exact same SQL text; a name used several times maps
+  to a single positional argument.
+  """
+  params = params or {}
+  names: List[str] = []
+
+  def _replace(match: "re.Match[str]") -> str:
+    name = match.group(1)
+    if name not in names:
+      names.append(name)
+    return f"${names.index(name) + 1}"
+
+  rewritten = _NAMED_PARAM_RE.sub(_replace, query).replace("%%", "%")
+  return rewritten, [params[name] for name in names]
+
+
+class AsyncDatabase:
+  """asyncpg pool used by the `async def` endpoints when DB_DRIVER=async.
+
+  `max_inactive_lifetime` closes connections left idle that long (asyncpg's own
+  setting). `max_lifetime` bounds their age like the sync pool does: once per period,
+  every connection is expired and replaced on its next checkout, busy ones when they
+  are released.
+  """
+
+  def __init__(
+    self,
+    dsn: str,
+    min_size: int = 1,
+    max_size: int = 10,
+    timeout: float = 5.0,
+    max_lifetime: float = 1800.0,
+    max_inactive_lifetime: float = 300.0,
+  ) -> None:
+    self.dsn = dsn
+    self.min_size = min_size
+    self.max_size = max_size
+    self.timeout = timeout
+    self.max_lifetime = max_lifetime
+    self.max_inactive_lifetime = max_inactive_lifetime
+    self._pool: Optional[asyncpg.Pool] = None
+    self._expired_at = 0.0
+    self._in_use = 0
+    self._checkouts = 0
+    self._wait_total = 0.0
+    self._wait_max = 0.0
+
+  async def open(self) -> None:
+    if self._pool is None:
+      self._pool = await asyncpg.create_pool(
+        self.dsn,
+        min_size=self.min_size,
+        max_size=self.max_size,
+        max_inactive_connection_lifetime=self.max_inactive_lifetime,
+      )
+      self._expired_at = time.monotonic()
+
+  async def close(self) -> None:
+    if self._pool is not None:
+      await self._pool.close()
+      self._pool = None
+
+  async def acquire(self) -> asyncpg.Connection:
+    if self._pool is None:
+      await self.open()
+    started = time.monotonic()
+    if self.max_lifetime and started - self._expired_at >= self.max_lifetime:
+      self._expired_at = started
+      await self._pool.expire_connections()
+    conn = await self._pool.acquire(timeout=self.timeout)
+    waited = time.monotonic() - started
+    self._in_use += 1
+    self._checkouts += 1
+    self._wait_total += waited
+    self._wait_max = max(self._wait_max, waited)
+    return conn
+
+  async def release(self, conn: asyncpg.Connection) -> None:
+    self._in_use -= 1
+    await self._pool.release(conn)
+
+  async def fetch_all(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[dict]:
+    sql_text, args = to_positional(query, params)
+    conn = await self.acquire()
+    try:
+      records: Sequence[asyncpg.Record] = await conn.fetch(sql_text, *args)
+    finally:
+      await self.release(conn)
+    return [dict(record) for record in records]
+
+  async def fetch_one(self, query: str, params: Optional[Dict[str, Any]] = None) -> Optional[dict]:
+    sql_text, args = to_positional(query, params)
+    conn = await self.acquire()
+    try:
+      record = await conn.fetchrow(sql_text, *args)
+    finally:
+      await self.release(conn)
+    return dict(record) if record is not None else None
+
+  async def iterate(self, query: str, params: Optional[Dict[str, Any]] = None, prefetch: int = 2000) -> AsyncIterator[asyncpg.Record]:
+    """Stream records through a server-side cursor, `prefetch` rows per round trip."""
+    sql_text, args = to_positional(query, params)
+    conn = await self.acquire()
+    try:
+      async with conn.transaction(readonly=True):
+        async for record in conn.cursor(sql_text, *args, prefetch=prefetch):
+          yield record
+    finally:
+      await self.release(conn)
+
+  def stats(self) -> dict:
+    checkouts = self._checkouts
+    return {
+      "min_size": self.min_size,
+      "max_size": self.max_size,
+      "size": self._pool.get_size() if self._pool is not None else 0,
+      "in_use": self._in_use,
+      "saturation": round(self._in_use / self.max_size, 3) if self.max_size else 0.0,
+      "checkouts": checkouts,
+      "wait_ms_avg": round(self._wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+      "wait_ms_max": round(self._wait_max * 1000, 3),
+    }
+
+
+def async_database_from_env(dsn: str, env) -> AsyncDatabase:
+  """Build the asyncpg pool from the same DB_POOL_* settings as the sync pool."""
+  return AsyncDatabase(
+    dsn,
+    min_size=int(env.get("DB_POOL_MIN_SIZE", 1)),
+    max_size=int(env.get("DB_POOL_MAX_SIZE", 10)),
+    timeout=float(env.get("DB_POOL_TIMEOUT", 5.0)),
+    max_lifetime=float(env.get("DB_POOL_MAX_LIFETIME", 1800.0)),
+    max_inactive_lifetime=float(env.get("DB_POOL_MAX_INACTIVE", 300.0)),
+  )
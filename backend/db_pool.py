@@ -0,0 +1,220 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+  """Raised when no connection could be checked out before the pool timeout."""
+
+
+class ConnectionPool:
+  """Process-wide psycopg2 pool with checkout health checks, max lifetime and metrics.
+
+  A bounded semaphore caps checked-out connections at `max_size` and makes callers
+  wait (up to `timeout` seconds), which is what lets us measure wait time and
+  saturation. Released connections go back to an idle list kept up to `max_size`
+  (psycopg2's own pools close everything above `minconn`, so a burst would pay a
+  new connection per request); `min_size` connections are opened up front.
+  """
+
+  def __init__(
+    self,
+    dsn: str,
+    min_size: int = 1,
+    max_size: int = 10,
+    timeout: float = 5.0,
+    max_lifetime: float = 1800.0,
+    check_idle_after: float = 30.0,
+  ) -> None:
+    self.min_size = min_size
+    self.max_size = max_size
+    self.timeout = timeout
+    self.max_lifetime = max_lifetime
+    self.check_idle_after = check_idle_after
+
+    self._dsn = dsn
+    self._idle: List[extensions.connection] = []
+    self._slots = threading.BoundedSemaphore(max_size)
+    self._lock = threading.Lock()
+    self._created_at: Dict[int, float] = {}
+    self._released_at: Dict[int, float] = {}
+
+    self._in_use = 0
+    self._peak_in_use = 0
+    self._checkouts = 0
+    self._timeouts = 0
+    self._wait_total = 0.0
+    self._wait_max = 0.0
+    self._recycled = 0
+    self._health_check_failures = 0
+
+    for _ in range(min(min_size, max_size)):
+      self._idle.append(self._connect())
+
+  def _connect(self) -> extensions.connection:
+    conn = psycopg2.connect(self._dsn)
+    with self._lock:
+      self._created_at[id(conn)] = time.monotonic()
+    return conn
+
+  def getconn(self) -> extensions.connection:
+    started = time.monotonic()
+    if not self._slots.acquire(timeout=self.timeout):
+      with self._lock:
+        self._timeouts += 1
+      raise PoolTimeout(f"No database connection available after {self.timeout:.1f}s")
+
+    waited = time.monotonic() - started
+    try:
+      conn = self._checkout()
+    except Exception:
+      self._slots.release()
+      raise
+
+    with self._lock:
+      self._checkouts += 1
+      self._wait_total += waited
+      self._wait_max = max(self._wait_max, waited)
+      self._in_use += 1
+      self._peak_in_use = max(self._peak_in_use, self._in_use)
+    return conn
+
+  def putconn(self, conn: extensions.connection, discard: bool = False) -> None:
+    key = id(conn)
+    try:
+      if not discard and not conn.closed:
+        try:
+          if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+          if conn.autocommit:
+            conn.autocommit = False
+        except psycopg2.Error:
+          discard = True
+      if discard or conn.closed:
+        self._close(conn)
+      else:
+        with self._lock:
+          self._released_at[key] = time.monotonic()
+          self._idle.append(conn)
+    finally:
+      with self._lock:
+        self._in_use -= 1
+      self._slots.release()
+
+  @contextmanager
+  def connection(self):
+    conn = self.getconn()
+    discard = False
+    try:
+      yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+      discard = True
+      raise
+    finally:
+      self.putconn(conn, discard=discard)
+
+  def close(self) -> None:
+    with self._lock:
+      idle, self._idle = self._idle, []
+    for conn in idle:
+      self._close(conn)
+    with self._lock:
+      self._created_at.clear()
+      self._released_at.clear()
+
+  def stats(self) -> dict:
+    with self._lock:
+      checkouts = self._checkouts
+      return {
+        "min_size": self.min_size,
+        "max_size": self.max_size,
+        "in_use": self._in_use,
+        "idle": len(self._idle),
+        "peak_in_use": self._peak_in_use,
+        "saturation": round(self._in_use / self.max_size, 3) if self.max_size else 0.0,
+        "checkouts": checkouts,
+        "timeouts": self._timeouts,
+        "wait_ms_total": round(self._wait_total * 1000, 3),
+        "wait_ms_avg": round(self._wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+        "wait_ms_max": round(self._wait_max * 1000, 3),
+        "recycled": self._recycled,
+        "health_check_failures": self._health_check_failures,
+      }
+
+  def _checkout(self) -> extensions.connection:
+    # Stale or broken idle connections are closed until a good one turns up;
+    # with none left, a fresh one is opened.
+    while True:
+      with self._lock:
+        conn = self._idle.pop() if self._idle else None
+      if conn is None:
+        # Holding a slot with no idle connection means fewer than max_size exist.
+        return self._connect()
+      key = id(conn)
+      now = time.monotonic()
+      created = self._created_at.get(key, now)
+
+      if conn.closed:
+        self._recycle(conn)
+        continue
+      if self.max_lifetime and now - created > self.max_lifetime:
+        self._recycle(conn)
+        continue
+
+      last_used = self._released_at.get(key)
+      if last_used is not None and self.check_idle_after is not None and now - last_used > self.check_idle_after:
+        if not self._is_healthy(conn):
+          with self._lock:
+            self._health_check_failures += 1
+          self._recycle(conn)
+          continue
+      return conn
+
+  def _is_healthy(self, conn: extensions.connection) -> bool:
+    try:
+      with conn.cursor() as cur:
+        cur.execute("SELECT 1")
+      conn.rollback()
+      return True
+    except psycopg2.Error as exc:
+      logging.warning("Discarding unhealthy pooled connection: %s", exc)
+      return False
+
+  def _recycle(self, conn: extensions.connection) -> None:
+    with self._lock:
+      self._recycled += 1
+    self._close(conn)
+
+  def _close(self, conn: extensions.connection) -> None:
+    # Forget the ages first: id() of a closed connection can be reused by a new one.
+    with self._lock:
+      self._created_at.pop(id(conn), None)
+      self._released_at.pop(id(conn), None)
+    try:
+      conn.close()
+    except Exception as exc:
+      logging.warning("Error while closing pooled connection: %s", exc)
+
+
+def pool_from_env(dsn: str, env) -> ConnectionPool:
+  """Build a pool from DB_POOL_* settings (`env` is a mapping such as os.environ)."""
+
+  def _float(name: str, default: Optional[float]) -> Optional[float]:
+    value = env.get(name)
+    if value in (None, ""):
+      return default
+    return float(value)
+
+  return ConnectionPool(
+    dsn,
+    min_size=int(env.get("DB_POOL_MIN_SIZE", 1)),
+    max_size=int(env.get("DB_POOL_MAX_SIZE", 10)),
+    timeout=_float("DB_POOL_TIMEOUT", 5.0),
+    max_lifetime=_float("DB_POOL_MAX_LIFETIME", 1800.0),
+    check_idle_after=_float("DB_POOL_CHECK_IDLE_SECONDS", 30.0),
+  )
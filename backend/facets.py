@@ -0,0 +1,66 @@
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Filter dimensions counted for filters_options, each split the way movies_nearby
+# filters on it: films.genre is a comma-separated list, languages come from the
+# language table (or films.languages when a film has none), versions are upper-cased.
+FACET_DIMENSIONS = ("genre", "language", "diffusion_version", "format")
+
+
+def facets_query(where: str, scope: str = "", scoped_from: str = "showtime_listing sl") -> str:
+  """One pass over the showtimes matching `where`: (dimension, value, showtimes, films) rows.
+
+  `scope` is prepended (e.g. a WITH clause) and `scoped_from` replaces the FROM clause,
+  so the location-scoped variant can join the `nearby` cinemas first.
+  """
+  return f"""
+    {scope}
+    SELECT d.dimension, d.value, COUNT(*) AS showtimes, COUNT(DISTINCT sl.film_id) AS films
+    FROM {scoped_from}
+    CROSS JOIN LATERAL (
+      SELECT 'genre', btrim(g) FROM unnest(string_to_array(sl.genre, ',')) AS g
+      UNION ALL
+      SELECT 'language', btrim(l)
+      FROM unnest(CASE WHEN cardinality(sl.language_names) > 0 THEN sl.language_names ELSE string_to_array(sl.languages, ',') END) AS l
+      UNION ALL
+      SELECT 'diffusion_version', UPPER(sl.diffusion_version)
+      UNION ALL
+      SELECT 'format', sl.format
+    ) AS d(dimension, value)
+    WHERE {where} AND d.value <> ''
+    GROUP BY d.dimension, d.value;
+  """
+
+
+def facets_from_rows(rows: Iterable[Tuple[str, str, int, int]]) -> Dict[str, List[dict]]:
+  """dimension -> [{"value", "showtimes", "films"}], most showtimes first."""
+  facets: Dict[str, List[dict]] = {dimension: [] for dimension in FACET_DIMENSIONS}
+  for dimension, value, showtimes, films in rows:
+    facets.setdefault(dimension, []).append({"value": value, "showtimes": int(showtimes), "films": int(films)})
+  for values in facets.values():
+    values.sort(key=lambda item: (-item["showtimes"], item["value"].lower()))
+  return facets
+
+
+class FacetIndex:
+  """Facet counts over every upcoming showtime, computed once per data generation and day."""
+
+  def __init__(self, facets: Dict[str, List[dict]], day: date, generation: Optional[int] = None) -> None:
+    self.facets = facets
+    self.day = day
+    self.generation = generation
+
+  @classmethod
+  def load(cls, conn, day: Optional[date] = None, generation: Optional[int] = None) -> "FacetIndex":
+    day = day or date.today()
+    with conn.cursor() as cur:
+      cur.execute(facets_query("sl.start_date >= %(today)s"), {"today": day})
+      rows = cur.fetchall()
+    conn.rollback()
+    return cls(facets_from_rows(rows), day, generation=generation)
+
+  def is_current(self, generation: Optional[int], day: date) -> bool:
+    return self.generation == generation and self.day == day
+
+  def values(self, dimension: str) -> List[str]:
+    return [item["value"] for item in self.facets.get(dimension, [])]
@@ -0,0 +1,41 @@
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+  import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+  orjson = None
+
+ORJSON_AVAILABLE = orjson is not None
+
+
+def _default(value: Any) -> Any:
+  if isinstance(value, (datetime, date, time)):
+    return value.isoformat()
+  if isinstance(value, Decimal):
+    return float(value)
+  if isinstance(value, (set, frozenset, tuple)):
+    return list(value)
+  raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+  """Serialize to compact UTF-8 JSON; dates, times and datetimes become ISO strings."""
+  if orjson is not None:
+    return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+  return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+  """JSONResponse rendered with `dumps` (orjson when installed).
+
+  Returning it directly from an endpoint also skips FastAPI's jsonable_encoder pass,
+  so payloads can keep native date/time values instead of pre-formatted strings.
+  """
+
+  def render(self, content: Any) -> bytes:
+    return dumps(content)
@@ -0,0 +1,201 @@
+import gzip
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+  import brotli
+except ImportError:  # optional: only gzip is offered
+  brotli = None
+
+BROTLI_AVAILABLE = brotli is not None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def parse_accept_encoding(header: str) -> dict:
+  """Map each coding of an Accept-Encoding header to its q-value."""
+  codings = {}
+  for part in header.split(","):
+    pieces = [piece.strip() for piece in part.split(";")]
+    if not pieces[0]:
+      continue
+    quality = 1.0
+    for param in pieces[1:]:
+      if param.startswith("q="):
+        try:
+          quality = float(param[2:])
+        except ValueError:
+          quality = 0.0
+    codings[pieces[0].lower()] = quality
+  return codings
+
+
+def choose_encoding(header: Optional[str]) -> Optional[str]:
+  """Preferred supported coding: brotli when offered and available, then gzip."""
+  if not header:
+    return None
+  codings = parse_accept_encoding(header)
+  wildcard = codings.get("*", 0.0)
+  candidates: List[Tuple[float, int, str]] = []
+  if BROTLI_AVAILABLE:
+    candidates.append((codings.get("br", wildcard), 1, "br"))
+  candidates.append((codings.get("gzip", wildcard), 0, "gzip"))
+  quality, _, coding = max(candidates)
+  return coding if quality > 0 else None
+
+
+class _Compressor:
+  """Incremental gzip/brotli encoder; `flush` emits everything written so far."""
+
+  def __init__(self, coding: str, gzip_level: int, brotli_quality: int) -> None:
+    self.coding = coding
+    if coding == "br":
+      self._brotli = brotli.Compressor(quality=brotli_quality)
+    else:
+      self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+  def compress(self, data: bytes, final: bool) -> bytes:
+    if self.coding == "br":
+      out = self._brotli.process(data)
+      return out + (self._brotli.finish() if final else self._brotli.flush())
+    out = self._zlib.compress(data)
+    return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def compress_body(body: bytes, coding: str, gzip_level: int = 6, brotli_quality: int = 5) -> bytes:
+  if coding == "br":
+    return brotli.compress(body, quality=brotli_quality)
+  return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+  """ASGI middleware negotiating brotli/gzip from Accept-Encoding.
+
+  Single-body responses are compressed only above `minimum_size` bytes; streamed
+  responses (NDJSON) are compressed chunk by chunk with a flush after each one so
+  lines still reach the client as they are produced. Bodies or chunks of at least
+  `thread_min_size` bytes are compressed in the threadpool rather than on the event
+  loop. Responses that already have a Content-Encoding, or a non-textual content
+  type, pass through untouched; the others always get `Vary: Accept-Encoding`, even
+  when the client accepts no supported coding.
+  """
+
+  def __init__(
+    self,
+    app,
+    minimum_size: int = 1024,
+    gzip_level: int = 6,
+    brotli_quality: int = 5,
+    thread_min_size: int = 65536,
+  ) -> None:
+    self.app = app
+    self.minimum_size = minimum_size
+    self.thread_min_size = thread_min_size
+    self.gzip_level = gzip_level
+    self.brotli_quality = brotli_quality
+
+  async def __call__(self, scope, receive, send) -> None:
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    accept = None
+    for name, value in scope.get("headers", []):
+      if name == b"accept-encoding":
+        accept = value.decode("latin-1")
+        break
+    await self.app(scope, receive, _CompressingSend(send, choose_encoding(accept), self))
+
+
+class _CompressingSend:
+  def __init__(self, send: Callable, coding: Optional[str], settings: CompressionMiddleware) -> None:
+    self.send = send
+    self.coding = coding
+    self.settings = settings
+    self.start_message: Optional[dict] = None
+    self.compressor: Optional[_Compressor] = None
+    self.passthrough = False
+
+  def _eligible(self, headers: List[Tuple[bytes, bytes]]) -> bool:
+    content_type = b""
+    for name, value in headers:
+      if name == b"content-encoding":
+        return False
+      if name == b"content-type":
+        content_type = value
+    return content_type.decode("latin-1").startswith(COMPRESSIBLE_TYPES)
+
+  def _headers(self, drop_length: bool, encoded: bool = True) -> List[Tuple[bytes, bytes]]:
+    headers = [
+      (name, value)
+      for name, value in self.start_message["headers"]
+      if not (drop_length and name == b"content-length") and name != b"vary"
+    ]
+    vary = [value for name, value in self.start_message["headers"] if name == b"vary"]
+    vary_values = {v.strip().lower() for value in vary for v in value.decode("latin-1").split(",") if v.strip()}
+    vary_values.add("accept-encoding")
+    headers.append((b"vary", ", ".join(sorted(vary_values)).encode("latin-1")))
+    if encoded:
+      headers.append((b"content-encoding", self.coding.encode("latin-1")))
+    return headers
+
+  async def __call__(self, message: dict) -> None:
+    if message["type"] == "http.response.start":
+      self.start_message = message
+      status = message.get("status", 200)
+      self.passthrough = status < 200 or status in (204, 304) or not self._eligible(list(message.get("headers", [])))
+      if self.passthrough:
+        await self.send(message)
+      elif self.coding is None:
+        # Nothing to encode for this client, but the response still varies on
+        # Accept-Encoding for shared caches.
+        self.passthrough = True
+        await self.send({**message, "headers": self._headers(drop_length=False, encoded=False)})
+      return
+
+    if message["type"] != "http.response.body" or self.passthrough:
+      await self.send(message)
+      return
+
+    body = message.get("body", b"")
+    more_body = message.get("more_body", False)
+    settings = self.settings
+
+    if self.compressor is None and not more_body:
+      # Whole body in one message: compress it only when it is worth it.
+      if len(body) < settings.minimum_size:
+        # Still varies on Accept-Encoding for shared caches.
+        self.passthrough = True
+        await self.send({**self.start_message, "headers": self._headers(drop_length=False, encoded=False)})
+        await self.send(message)
+        return
+      if len(body) >= settings.thread_min_size:
+        compressed = await run_in_threadpool(compress_body, body, self.coding, settings.gzip_level, settings.brotli_quality)
+      else:
+        compressed = compress_body(body, self.coding, settings.gzip_level, settings.brotli_quality)
+      headers = self._headers(drop_length=True)
+      headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+      await self.send({**self.start_message, "headers": headers})
+      await self.send({"type": "http.response.body", "body": compressed})
+      return
+
+    if self.compressor is None:
+      self.compressor = _Compressor(self.coding, settings.gzip_level, settings.brotli_quality)
+      await self.send({**self.start_message, "headers": self._headers(drop_length=True)})
+    if len(body) >= settings.thread_min_size:
+      chunk = await run_in_threadpool(self.compressor.compress, body, not more_body)
+    else:
+      chunk = self.compressor.compress(body, final=not more_body)
+    await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+
+def compression_settings_from_env(env) -> dict:
+  """Keyword arguments for `app.add_middleware(CompressionMiddleware, ...)`."""
+  return {
+    "minimum_size": int(env.get("COMPRESSION_MIN_BYTES", 1024)),
+    "gzip_level": int(env.get("COMPRESSION_GZIP_LEVEL", 6)),
+    "brotli_quality": int(env.get("COMPRESSION_BROTLI_QUALITY", 5)),
+    "thread_min_size": int(env.get("COMPRESSION_THREAD_MIN_BYTES", 65536)),
+  }
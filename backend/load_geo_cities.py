@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+load_geo_cities.py
+Bulk-load the geo_cities table used by search_suggest from a local CSV of French
+communes (e.g. La Poste's "base officielle des codes postaux").
+
+    python load_geo_cities.py communes.csv
+    python load_geo_cities.py communes.csv --delimiter ';' --name-column nom_commune
+
+Rows are streamed with COPY into a staging table, indexed and analyzed there, then
+swapped in place of geo_cities in one short transaction: searches keep using the old
+table until the commit and never see a partial load. Duplicate (name, zipcode) pairs
+and rows without coordinates are skipped. A new data generation is published at the
+end so the API rebuilds its autocomplete index.
+"""
+
+import argparse
+import csv
+import io
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import psycopg2
+from dotenv import load_dotenv
+
+from schema import publish_data_generation
+
+STAGING_TABLE = "geo_cities_staging"
+COPY_NULL = "\\N"
+
+# Same definitions as migrations 0001/0002/0010, rebuilt on every load.
+GEO_CITIES_INDEXES = (
+  ("idx_cities_name_norm_trgm", "USING gin (search_normalize(name) gin_trgm_ops)"),
+  ("idx_cities_zipcode_trgm", "USING gin (zipcode gin_trgm_ops)"),
+)
+
+# Header aliases accepted for each field (compared case-insensitively).
+COLUMN_ALIASES: Dict[str, Tuple[str, ...]] = {
+  "name": ("name", "nom", "nom_commune", "nom_de_la_commune", "libelle_commune", "libelle_d_acheminement"),
+  "zipcode": ("zipcode", "code_postal", "postal_code", "cp"),
+  "lat": ("lat", "latitude"),
+  "lon": ("lon", "lng", "longitude"),
+  "coordinates": ("coordonnees_gps", "coordonnees_geographiques", "_geopoint", "geopoint"),
+}
+
+logger = logging.getLogger("load_geo_cities")
+
+
+def _resolve_column(header: Sequence[str], field: str, override: Optional[str]) -> Optional[int]:
+  lowered = [column.strip().lower() for column in header]
+  candidates = (override,) if override else COLUMN_ALIASES[field]
+  for candidate in candidates:
+    if candidate and candidate.lower() in lowered:
+      return lowered.index(candidate.lower())
+  if override:
+    raise ValueError(f"Column {override!r} not found in CSV header")
+  return None
+
+
+def read_communes(path: Path, delimiter: Optional[str] = None, columns: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, str, float, float]]:
+  """Yield (name, zipcode, lat, lon) rows, skipping duplicates and rows without coordinates.
+
+  Coordinates come from separate lat/lon columns or from one "lat, lon" column.
+  """
+  columns = columns or {}
+  with path.open(encoding="utf-8-sig", newline="") as handle:
+    if delimiter is None:
+      delimiter = csv.Sniffer().sniff(handle.read(8192), delimiters=",;\t").delimiter
+      handle.seek(0)
+    reader = csv.reader(handle, delimiter=delimiter)
+    header = next(reader)
+    name_at = _resolve_column(header, "name", columns.get("name"))
+    zipcode_at = _resolve_column(header, "zipcode", columns.get("zipcode"))
+    lat_at = _resolve_column(header, "lat", columns.get("lat"))
+    lon_at = _resolve_column(header, "lon", columns.get("lon"))
+    coordinates_at = _resolve_column(header, "coordinates", columns.get("coordinates"))
+    if name_at is None:
+      raise ValueError("No commune name column found in CSV header")
+    if (lat_at is None or lon_at is None) and coordinates_at is None:
+      raise ValueError("No latitude/longitude columns found in CSV header")
+
+    seen = set()
+    for row in reader:
+      try:
+        name = row[name_at].strip()
+        zipcode = row[zipcode_at].strip() if zipcode_at is not None else ""
+        if lat_at is not None and lon_at is not None:
+          lat, lon = float(row[lat_at]), float(row[lon_at])
+        else:
+          lat_text, lon_text = row[coordinates_at].split(",")
+          lat, lon = float(lat_text), float(lon_text)
+      except (IndexError, ValueError):
+        continue
+      key = (name.lower(), zipcode)
+      if not name or key in seen:
+        continue
+      seen.add(key)
+      yield name, zipcode, lat, lon
+
+
+def _copy_buffer(rows: Iterator[Tuple[str, str, float, float]]) -> Tuple[io.StringIO, int]:
+  """Rows in COPY text format (tab-separated, \\N for NULL)."""
+  buffer = io.StringIO()
+  count = 0
+  for name, zipcode, lat, lon in rows:
+    name = name.replace("\\", "\\\\").replace("\t", " ").replace("\n", " ")
+    buffer.write(f"{name}\t{zipcode or COPY_NULL}\t{lat!r}\t{lon!r}\n")
+    count += 1
+  buffer.seek(0)
+  return buffer, count
+
+
+def load(conn, rows: Iterator[Tuple[str, str, float, float]]) -> int:
+  """Replace geo_cities with `rows` atomically and return the number of rows loaded."""
+  buffer, count = _copy_buffer(rows)
+  if count == 0:
+    raise ValueError("No usable rows in the CSV: geo_cities left untouched")
+
+  with conn.cursor() as cur:
+    cur.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE};")
+    cur.execute(
+      f"""
+      CREATE TABLE {STAGING_TABLE} (
+        id SERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        zipcode TEXT,
+        lat DOUBLE PRECISION NOT NULL,
+        lon DOUBLE PRECISION NOT NULL
+      );
+      """
+    )
+    cur.copy_expert(f"COPY {STAGING_TABLE} (name, zipcode, lat, lon) FROM STDIN", buffer)
+    # Indexes are built once on the full table, which is much cheaper than maintaining them per row.
+    for index_name, definition in GEO_CITIES_INDEXES:
+      cur.execute(f"CREATE INDEX {index_name}_staging ON {STAGING_TABLE} {definition};")
+    cur.execute(f"ANALYZE {STAGING_TABLE};")
+
+    # Swap: readers block on the lock only for the renames, then see the new table.
+    cur.execute("LOCK TABLE geo_cities IN ACCESS EXCLUSIVE MODE;")
+    cur.execute("DROP TABLE geo_cities;")
+    cur.execute(f"ALTER TABLE {STAGING_TABLE} RENAME TO geo_cities;")
+    cur.execute(f"ALTER TABLE geo_cities RENAME CONSTRAINT {STAGING_TABLE}_pkey TO geo_cities_pkey;")
+    cur.execute(f"ALTER SEQUENCE {STAGING_TABLE}_id_seq RENAME TO geo_cities_id_seq;")
+    for index_name, _ in GEO_CITIES_INDEXES:
+      cur.execute(f"ALTER INDEX {index_name}_staging RENAME TO {index_name};")
+  conn.commit()
+  return count
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description="Bulk-load geo_cities from a CSV of French communes")
+  parser.add_argument("csv", type=Path, help="CSV file with a header row")
+  parser.add_argument("--delimiter", default=None, help="field separator (sniffed when omitted)")
+  parser.add_argument("--name-column", default=None)
+  parser.add_argument("--zipcode-column", default=None)
+  parser.add_argument("--lat-column", default=None)
+  parser.add_argument("--lon-column", default=None)
+  parser.add_argument("--coordinates-column", default=None, help='single "lat, lon" column')
+  args = parser.parse_args(argv)
+
+  logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+  load_dotenv()
+  database_url = os.getenv("DATABASE_URL")
+  if not database_url:
+    raise RuntimeError("DATABASE_URL is not configured")
+
+  columns = {
+    "name": args.name_column,
+    "zipcode": args.zipcode_column,
+    "lat": args.lat_column,
+    "lon": args.lon_column,
+    "coordinates": args.coordinates_column,
+  }
+  started = time.perf_counter()
+  conn = psycopg2.connect(database_url)
+  try:
+    count = load(conn, read_communes(args.csv, args.delimiter, columns))
+    logger.info("Loaded %d cities into geo_cities in %.1fs", count, time.perf_counter() - started)
+    try:
+      publish_data_generation(conn, "load_geo_cities")
+    except Exception as exc:
+      conn.rollback()
+      logger.warning("Could not publish a new data generation: %s", exc)
+    return 0
+  except Exception:
+    conn.rollback()
+    raise
+  finally:
+    conn.close()
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -1,16 +1,55 @@
+import asyncio
+import hashlib
 import logging
+import math
 import os
-from datetime import date, datetime, timedelta
-from typing import List, Optional, Set
+import signal
+import time
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Annotated, AsyncIterator, Callable, List, Literal, NamedTuple, Optional, Tuple
 
 import psycopg2
-from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
-from fastapi import Body, FastAPI, HTTPException, Query
+from fastapi import Body, FastAPI, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, model_validator
-import unicodedata
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, model_validator
+
+from autocomplete import AutocompleteIndex
+from db_pool import ConnectionPool, PoolTimeout, pool_from_env
+from facets import FacetIndex, facets_from_rows, facets_query
+from fast_json import ORJSON_AVAILABLE, FastJSONResponse, dumps
+from http_compression import CompressionMiddleware, compression_settings_from_env
+from migrate import check_schema
+from payload_format import COMPACT_DEFAULT_FIELDS, compact_movies, parse_fields, select_film_fields
+from response_cache import ResponseCache, quantize, response_cache_from_env
+from schema import current_data_generation
+from single_flight import SingleFlight, request_key
+from nearby_aggregate import (
+  CINEMA_ID,
+  DISTANCE_KM,
+  FILM_ID,
+  LAT,
+  LON,
+  NEARBY_COLUMNS,
+  NEARBY_SORT_KEYS,
+  NUMPY_AVAILABLE,
+  MovieAggregator,
+  aggregate_movies,
+  aggregate_movies_numpy,
+  decode_cursor,
+  encode_cursor,
+  movie_sort_key,
+  showtime_timestamp,
+  split_to_list,
+)
+from snapshot import SnapshotEngine
+from spatial_index import KM_PER_DEGREE_LAT, CinemaSpatialIndex, cinemas_signature, haversine_km
+
+if TYPE_CHECKING:
+  from db_async import AsyncDatabase
 
 load_dotenv()
 
@@ -73,7 +112,41 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
   logging.warning("DATABASE_URL environment variable is not set")
 
-app = FastAPI()
+# "sync" runs queries through psycopg2 in the threadpool, "async" through asyncpg on the event loop.
+DB_DRIVER = os.getenv("DB_DRIVER", "sync").strip().lower()
+
+# Serve movies_nearby / movie_details from an in-process snapshot (reloaded on SIGHUP).
+SNAPSHOT_ENGINE_ENABLED = os.getenv("SNAPSHOT_ENGINE", "0").strip().lower() in ("1", "true", "yes")
+
+# Group and filter movies_nearby rows with NumPy column arrays (needs numpy). Off by
+# default: the streaming aggregator is faster and holds only the accepted showtimes.
+VECTORIZED_AGGREGATION = os.getenv("VECTORIZED_AGGREGATION", "0").strip().lower() in ("1", "true", "yes")
+# Rows fetched per round trip when streaming from a server-side cursor.
+STREAM_FETCH_SIZE = int(os.getenv("DB_STREAM_FETCH_SIZE", "2000"))
+
+# Resolve radius queries to cinema ids in process; the grid is rebuilt when `cinemas` changes.
+SPATIAL_INDEX_ENABLED = os.getenv("SPATIAL_INDEX", "1").strip().lower() in ("1", "true", "yes")
+SPATIAL_INDEX_CHECK_SECONDS = float(os.getenv("SPATIAL_INDEX_CHECK_SECONDS", "300"))
+
+# Answer search_suggest from an in-process index, rebuilt when the data generation changes.
+AUTOCOMPLETE_INDEX_ENABLED = os.getenv("AUTOCOMPLETE_INDEX", "1").strip().lower() in ("1", "true", "yes")
+
+# movies_nearby caches the candidate showtimes of each cell of this grid (degrees) and
+# cuts them to the exact center per request; entries are dropped whenever a scrape
+# publishes a new data generation.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1").strip().lower() in ("1", "true", "yes")
+RESPONSE_CACHE_GRID_DEG = float(os.getenv("RESPONSE_CACHE_GRID_DEG", "0.005"))
+DATA_GENERATION_CHECK_SECONDS = float(os.getenv("DATA_GENERATION_CHECK_SECONDS", "30"))
+# After a failed facet rebuild, filters_options waits this long before trying again.
+FACET_INDEX_RETRY_SECONDS = float(os.getenv("FACET_INDEX_RETRY_SECONDS", "30"))
+
+# Cache-Control max-age of the GET variants; their ETag changes with the data generation.
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "60"))
+
+# Set at startup: radius queries use the GiST index on cinemas.geom when PostGIS is installed.
+POSTGIS_AVAILABLE = False
+
+app = FastAPI(default_response_class=FastJSONResponse)
 
 app.add_middleware(
   CORSMiddleware,
@@ -82,12 +155,180 @@ app.add_middleware(
   allow_methods=["*"],
   allow_headers=["*"],
 )
+# gzip/brotli negotiated from Accept-Encoding, above COMPRESSION_MIN_BYTES.
+app.add_middleware(CompressionMiddleware, **compression_settings_from_env(os.environ))
+
+
+db_pool: Optional[ConnectionPool] = None
+
+
+def init_pool() -> ConnectionPool:
+  global db_pool
+  if db_pool is None:
+    if not DATABASE_URL:
+      raise RuntimeError("DATABASE_URL is not configured")
+    db_pool = pool_from_env(DATABASE_URL, os.environ)
+  return db_pool
+
+
+def close_pool() -> None:
+  global db_pool
+  if db_pool is not None:
+    db_pool.close()
+    db_pool = None
 
 
 def get_connection() -> psycopg2.extensions.connection:
-  if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL is not configured")
-  return psycopg2.connect(DATABASE_URL)
+  return init_pool().getconn()
+
+
+def release_connection(conn: psycopg2.extensions.connection) -> None:
+  if db_pool is None:
+    conn.close()
+    return
+  db_pool.putconn(conn, discard=conn.closed != 0)
+
+
+async_db: Optional["AsyncDatabase"] = None
+snapshot_engine: Optional[SnapshotEngine] = None
+spatial_index: Optional[CinemaSpatialIndex] = None
+autocomplete_index: Optional[AutocompleteIndex] = None
+facet_index: Optional[FacetIndex] = None
+facet_index_failed_at: Optional[float] = None
+response_cache: Optional[ResponseCache] = None
+# Identical concurrent requests share one computation (see single_flight.py).
+flights = SingleFlight()
+data_generation: Optional[int] = None
+background_tasks: List[asyncio.Task] = []
+
+
+async def init_async_db() -> None:
+  global async_db
+  if async_db is None:
+    if not DATABASE_URL:
+      raise RuntimeError("DATABASE_URL is not configured")
+    from db_async import async_database_from_env
+
+    database = async_database_from_env(DATABASE_URL, os.environ)
+    await database.open()
+    async_db = database
+
+
+async def close_async_db() -> None:
+  global async_db
+  if async_db is not None:
+    await async_db.close()
+    async_db = None
+
+
+def _run_query(query: str, params: dict, context: str, one: bool = False):
+  try:
+    conn = get_connection()
+  except PoolTimeout as exc:
+    logging.warning("Connection pool exhausted during %s: %s", context, exc)
+    raise HTTPException(status_code=503, detail="Database busy")
+  except Exception as exc:
+    logging.error("Database connection error during %s: %s", context, exc)
+    raise HTTPException(status_code=500, detail="Database connection error")
+
+  try:
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+      cur.execute(query, params)
+      return cur.fetchone() if one else cur.fetchall()
+  finally:
+    release_connection(conn)
+
+
+async def fetch_all(query: str, params: dict, context: str) -> List[dict]:
+  if async_db is None:
+    return await run_in_threadpool(_run_query, query, params, context)
+  try:
+    return await async_db.fetch_all(query, params)
+  except asyncio.TimeoutError:
+    logging.warning("Async connection pool exhausted during %s", context)
+    raise HTTPException(status_code=503, detail="Database busy")
+
+
+async def fetch_one(query: str, params: dict, context: str) -> Optional[dict]:
+  if async_db is None:
+    return await run_in_threadpool(_run_query, query, params, context, True)
+  try:
+    return await async_db.fetch_one(query, params)
+  except asyncio.TimeoutError:
+    logging.warning("Async connection pool exhausted during %s", context)
+    raise HTTPException(status_code=503, detail="Database busy")
+
+
+def _checkout(context: str):
+  try:
+    return get_connection()
+  except PoolTimeout as exc:
+    logging.warning("Connection pool exhausted during %s: %s", context, exc)
+    raise HTTPException(status_code=503, detail="Database busy")
+  except Exception as exc:
+    logging.error("Database connection error during %s: %s", context, exc)
+    raise HTTPException(status_code=500, detail="Database connection error")
+
+
+def _stream_query(query: str, params: dict, context: str, sink: Callable[[tuple], None]) -> None:
+  conn = _checkout(context)
+  try:
+    # Named cursor: rows stay on the server and arrive as tuples, itersize at a time.
+    with conn.cursor(name=f"{context}_stream") as cur:
+      cur.itersize = STREAM_FETCH_SIZE
+      cur.execute(query, params)
+      for row in cur:
+        sink(row)
+  finally:
+    release_connection(conn)
+
+
+async def stream_rows(query: str, params: dict, context: str, sink: Callable[[tuple], None]) -> None:
+  """Feed every row of `query` to `sink` without materialising the result set."""
+  if async_db is None:
+    await run_in_threadpool(_stream_query, query, params, context, sink)
+    return
+  try:
+    async for record in async_db.iterate(query, params, prefetch=STREAM_FETCH_SIZE):
+      sink(record)
+  except asyncio.TimeoutError:
+    logging.warning("Async connection pool exhausted during %s", context)
+    raise HTTPException(status_code=503, detail="Database busy")
+
+
+async def iterate_rows(query: str, params: dict, context: str) -> AsyncIterator[tuple]:
+  """Yield the rows of `query` as they arrive, STREAM_FETCH_SIZE per round trip.
+
+  Unlike `stream_rows`, the consumer runs on the event loop between batches, so it can
+  forward results (e.g. to an HTTP response) while the cursor is still open.
+  """
+  if async_db is not None:
+    try:
+      async for record in async_db.iterate(query, params, prefetch=STREAM_FETCH_SIZE):
+        yield record
+    except asyncio.TimeoutError:
+      logging.warning("Async connection pool exhausted during %s", context)
+      raise HTTPException(status_code=503, detail="Database busy")
+    return
+
+  conn = await run_in_threadpool(_checkout, context)
+  try:
+    cur = conn.cursor(name=f"{context}_stream")
+    await run_in_threadpool(cur.execute, query, params)
+    while True:
+      rows = await run_in_threadpool(cur.fetchmany, STREAM_FETCH_SIZE)
+      if not rows:
+        break
+      for row in rows:
+        yield row
+  finally:
+    # Returning the connection rolls the transaction back, which also closes the cursor;
+    # both block, so keep them off the event loop.
+    await run_in_threadpool(release_connection, conn)
+
+
+# PostGIS mean Earth radius over the haversine one, with a small margin.
+POSTGIS_SPHERE_RATIO = 6371.0088 / 6371 * 1.0001
 
 
 def distance_sql(lat_expr: str, lon_expr: str) -> str:
@@ -104,62 +345,66 @@ def distance_sql(lat_expr: str, lon_expr: str) -> str:
     )
   """
 
-# --- Accent-stripping helper for fallback LIKE matching ---
-def _strip_accents(text: str) -> str:
-  """Return a lowercase, accent-stripped version of text (for fallback LIKE)."""
-  if not isinstance(text, str):
-    return text
-  # Normalize then remove combining marks
-  normalized = unicodedata.normalize("NFD", text)
-  no_accents = "".join(ch for ch in normalized if unicodedata.category(ch) != "Mn")
-  return no_accents.lower()
-
-
-def split_to_list(value) -> List[str]:
-  if value is None:
-    return []
-  if isinstance(value, list):
-    result: List[str] = []
-    for item in value:
-      if item is None:
-        continue
-      text = str(item).strip()
-      if text:
-        result.append(text)
-    return result
-  if isinstance(value, str):
-    return [segment.strip() for segment in value.split(",") if segment.strip()]
-  return []
-
 
-def showtime_timestamp(start_date_value, start_time_value) -> Optional[float]:
-  try:
-    if isinstance(start_date_value, date):
-      day = start_date_value
-    elif isinstance(start_date_value, str):
-      day = date.fromisoformat(start_date_value)
-    else:
-      return None
-
-    if hasattr(start_time_value, "hour") and hasattr(start_time_value, "minute"):
-      hour = int(start_time_value.hour)
-      minute = int(start_time_value.minute)
-      second = int(getattr(start_time_value, "second", 0))
-    elif isinstance(start_time_value, str):
-      parts = start_time_value.split(":")
-      if len(parts) < 2:
-        return None
-      hour = int(parts[0])
-      minute = int(parts[1])
-      second = int(parts[2]) if len(parts) > 2 else 0
-    else:
-      return None
+def nearby_cinemas_cte(params: dict, radius_km: float, cinema_id: Optional[int] = None, nearest: Optional[int] = None) -> str:
+  """Return the `candidates` and `nearby(cinema_id, distance_km)` CTEs around the center.
 
-    dt_value = datetime(day.year, day.month, day.day, hour, minute, second)
-    return dt_value.timestamp()
-  except Exception:
-    return None
+  With the in-process spatial index the cinema set and its distances are resolved
+  before the query and passed as arrays. Otherwise the distance is computed once per
+  candidate cinema rather than once per showtime row: candidates come from ST_DWithin
+  on the geom GiST index when PostGIS is available, or from a lat/lon bounding box,
+  and the exact haversine check is applied to either set so results match `distance_sql()`.
+  """
+  if spatial_index is not None and cinema_id is None:
+    found = spatial_index.within(params["center_lat"], params["center_lon"], radius_km, nearest=nearest)
+    params["nearby_ids"] = list(found.keys())
+    params["nearby_distances"] = list(found.values())
+    return """
+    nearby AS (
+      SELECT cinema_id, distance_km
+      FROM unnest(%(nearby_ids)s::int[], %(nearby_distances)s::float8[]) AS t(cinema_id, distance_km)
+    )
+  """
 
+  lat_expr = "c.latitude"
+  lon_expr = "c.longitude"
+  prefilter = [f"{lat_expr} IS NOT NULL", f"{lon_expr} IS NOT NULL"]
+
+  if cinema_id is not None:
+    prefilter.append("c.id = %(cinema_id)s")
+    params["cinema_id"] = cinema_id
+  elif POSTGIS_AVAILABLE:
+    # PostGIS measures on a 6371008.8 m sphere, larger than the 6371 km of
+    # distance_sql(): widen the radius by that ratio (plus a float margin) so the
+    # candidates are a superset and the haversine filter below has the last word.
+    prefilter.append(
+      "ST_DWithin(c.geom::geography, ST_SetSRID(ST_MakePoint(%(center_lon)s, %(center_lat)s), 4326)::geography, %(radius_m)s, false)"
+    )
+    params["radius_m"] = radius_km * 1000 * POSTGIS_SPHERE_RATIO
+  else:
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    lon_delta = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(params["center_lat"])), 0.01))
+    prefilter.append(f"{lat_expr} BETWEEN %(min_lat)s AND %(max_lat)s")
+    prefilter.append(f"{lon_expr} BETWEEN %(min_lon)s AND %(max_lon)s")
+    params["min_lat"] = params["center_lat"] - lat_delta
+    params["max_lat"] = params["center_lat"] + lat_delta
+    params["min_lon"] = params["center_lon"] - lon_delta
+    params["max_lon"] = params["center_lon"] + lon_delta
+
+  radius_filter = "" if cinema_id is not None else "WHERE distance_km <= %(radius_km)s"
+  if nearest is not None and cinema_id is None:
+    radius_filter += " ORDER BY distance_km LIMIT %(nearest)s"
+    params["nearest"] = nearest
+  return f"""
+    candidates AS (
+      SELECT c.id AS cinema_id, {distance_sql(lat_expr, lon_expr)} AS distance_km
+      FROM cinemas c
+      WHERE {' AND '.join(prefilter)}
+    ),
+    nearby AS (
+      SELECT cinema_id, distance_km FROM candidates {radius_filter}
+    )
+  """
 
 class MoviesNearbyRequest(BaseModel):
   lat: Optional[float] = None
@@ -176,6 +421,11 @@ class MoviesNearbyRequest(BaseModel):
   subtitles: Optional[List[str]] = None
   duration_max_minutes: Optional[int] = None
   sort_by: Optional[str] = None
+  nearest: Optional[int] = Field(None, ge=1, le=500)
+  limit: Optional[int] = Field(None, ge=1, le=200)
+  cursor: Optional[str] = None
+  format: Literal["full", "compact", "ndjson"] = "full"
+  fields: Optional[List[str]] = None
 
   @model_validator(mode="after")
   def ensure_coordinates(self):
@@ -205,6 +455,28 @@ class MoviesNearbyRequest(BaseModel):
     return self
 
 
+class NearbyPlan(NamedTuple):
+  """A validated movies_nearby request: normalized filters and its SQL query."""
+
+  center_lat: float
+  center_lon: float
+  radius: float
+  sort_by: str
+  after_key: Optional[tuple]
+  filter_date: Optional[date]
+  subtitles: List[str]
+  duration_max: Optional[int]
+  languages: List[str]
+  genres: List[str]
+  film_fields: Optional[List[str]]
+  query: str
+  params: dict
+  filters: dict
+
+
+MOVIE_DETAILS_SORTS = {"relevance", "distance", "earliest_showtime", "title_asc", "duration_asc"}
+
+
 class MovieDetailsRequest(BaseModel):
   lat: float
   lon: float
@@ -215,252 +487,586 @@ class MovieDetailsRequest(BaseModel):
   subtitles: Optional[List[str]] = None
   duration_max_minutes: Optional[int] = None
   sort_by: Optional[str] = None
+  nearest: Optional[int] = Field(None, ge=1, le=500)
 
 
-def ensure_search_schema() -> None:
-  """Create the geo_cities table, pg_trgm extension, and required indexes if missing."""
+def check_schema_version() -> None:
+  """Warn when migrations are pending; the API never changes the schema itself."""
   try:
     conn = get_connection()
   except Exception as exc:
-    logging.error("Unable to connect to database while ensuring schema: %s", exc)
+    logging.error("Unable to connect to database while checking schema version: %s", exc)
+    return
+
+  try:
+    check_schema(conn)
+  except Exception as exc:
+    logging.error("Error checking schema version: %s", exc)
+  finally:
+    release_connection(conn)
+
+
+def detect_postgis() -> None:
+  global POSTGIS_AVAILABLE
+  try:
+    conn = get_connection()
+  except Exception as exc:
+    logging.error("Unable to connect to database while detecting PostGIS: %s", exc)
     return
 
   try:
-    conn.autocommit = True
     with conn.cursor() as cur:
-      cur.execute("CREATE EXTENSION IF NOT EXISTS unaccent;")
-      cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
-      cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS geo_cities (
-          id SERIAL PRIMARY KEY,
-          name TEXT NOT NULL,
-          zipcode TEXT,
-          lat DOUBLE PRECISION NOT NULL,
-          lon DOUBLE PRECISION NOT NULL
-        );
-        """
-      )
-      index_commands: List[sql.SQL] = [
-        sql.SQL("CREATE INDEX IF NOT EXISTS idx_films_title_trgm ON films USING gin (title gin_trgm_ops);")
-      ]
-      index_commands.append(
-        sql.SQL("CREATE INDEX IF NOT EXISTS idx_films_original_title_trgm ON films USING gin (original_title gin_trgm_ops);")
-      )
-      index_commands.append(
-        sql.SQL("CREATE INDEX IF NOT EXISTS idx_cinemas_name_trgm ON cinemas USING gin (name gin_trgm_ops);")
-      )
-      index_commands.append(
-        sql.SQL("CREATE INDEX IF NOT EXISTS idx_cities_name_trgm ON geo_cities USING gin (name gin_trgm_ops);")
-      )
-      index_commands.append(
-        sql.SQL("CREATE INDEX IF NOT EXISTS idx_cities_zipcode_trgm ON geo_cities USING gin (zipcode gin_trgm_ops);")
-      )
-      for statement in index_commands:
-        cur.execute(statement)
+      cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'postgis';")
+      POSTGIS_AVAILABLE = cur.fetchone() is not None
+    if not POSTGIS_AVAILABLE:
+      logging.warning("PostGIS not installed, radius queries fall back to a bounding-box scan")
   except Exception as exc:
-    logging.error("Error ensuring search schema: %s", exc)
+    logging.error("Error detecting PostGIS: %s", exc)
   finally:
-    conn.close()
+    release_connection(conn)
 
 
-@app.on_event("startup")
-def on_startup() -> None:
-  ensure_search_schema()
+async def start_snapshot_engine() -> None:
+  global snapshot_engine
+  snapshot_engine = SnapshotEngine(get_connection, release_connection)
+  await run_in_threadpool(snapshot_engine.reload)
 
+  loop = asyncio.get_running_loop()
+  if hasattr(signal, "SIGHUP"):
+    # `kill -HUP <pid>` after a scrape reloads the snapshot in the background.
+    loop.add_signal_handler(signal.SIGHUP, lambda: loop.run_in_executor(None, snapshot_engine.reload))
 
-@app.get("/api/filters_options")
-def filters_options():
-  languages: Set[str] = set()
-  conn = None
 
+def refresh_spatial_index() -> None:
+  """(Re)build the cinema grid when the cinemas table changed since the last build."""
+  global spatial_index
   try:
     conn = get_connection()
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-      cur.execute(
-        """
-        SELECT DISTINCT l.name AS language
-        FROM film_language fl
-        JOIN language l ON fl.language_id = l.id
-        """
-      )
-      rows = cur.fetchall()
-      for row in rows:
-        entry = row.get("language")
-        if entry:
-          languages.add(entry)
   except Exception as exc:
-    logging.error("Error while retrieving filter options: %s", exc)
+    logging.error("Unable to connect to database while refreshing spatial index: %s", exc)
+    return
+
+  try:
+    if spatial_index is not None and cinemas_signature(conn) == spatial_index.signature:
+      return
+    spatial_index = CinemaSpatialIndex.load(conn)
+    logging.info("Built cinema spatial index over %d cinemas", len(spatial_index))
+  except Exception as exc:
+    logging.error("Error building cinema spatial index: %s", exc)
   finally:
-    if conn is not None:
-      conn.close()
+    release_connection(conn)
 
-  normalized_languages = sorted({lang.strip() for lang in languages if isinstance(lang, str) and lang.strip()}, key=lambda s: s.lower())
 
-  return {
-    "genres": GENRE_OPTIONS,
-    "languages": normalized_languages,
-    "subtitles": SUBTITLE_OPTIONS,
-  }
+async def watch_spatial_index() -> None:
+  while True:
+    await asyncio.sleep(SPATIAL_INDEX_CHECK_SECONDS)
+    await run_in_threadpool(refresh_spatial_index)
 
 
-@app.get("/api/search_suggest")
-def search_suggest(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=25)):
-  query_text = q.strip()
-  if not query_text:
-    return {"suggestions": []}
+def refresh_data_generation() -> None:
+  """Read the generation published by the scrapers and invalidate caches built on older data."""
+  global data_generation
+  try:
+    conn = get_connection()
+  except Exception as exc:
+    logging.error("Unable to connect to database while reading data generation: %s", exc)
+    return
+
+  try:
+    generation = current_data_generation(conn)
+  except Exception as exc:
+    logging.error("Error reading data generation: %s", exc)
+    return
+  finally:
+    release_connection(conn)
+
+  # Reload the snapshot before the caches and ETags move to the new generation,
+  # so they are never refilled from the previous data.
+  if snapshot_engine is not None:
+    snapshot_engine.ensure_generation(generation)
+  if generation != data_generation:
+    logging.info("Data generation changed: %s -> %s", data_generation, generation)
+    data_generation = generation
+  if response_cache is not None:
+    response_cache.set_generation(generation)
+  if AUTOCOMPLETE_INDEX_ENABLED and (autocomplete_index is None or autocomplete_index.generation != generation):
+    refresh_autocomplete_index(generation)
+  if facet_index is None or not facet_index.is_current(generation, date.today()):
+    refresh_facet_index(generation)
+
+
+def refresh_autocomplete_index(generation: Optional[int]) -> None:
+  """Rebuild the search_suggest index; the previous one keeps serving until the swap."""
+  global autocomplete_index
+  try:
+    conn = get_connection()
+  except Exception as exc:
+    logging.error("Unable to connect to database while building autocomplete index: %s", exc)
+    return
+
+  try:
+    autocomplete_index = AutocompleteIndex.load(conn, generation=generation)
+    logging.info("Built autocomplete index over %d entries", len(autocomplete_index))
+  except Exception as exc:
+    logging.error("Error building autocomplete index: %s", exc)
+  finally:
+    release_connection(conn)
 
-  # SQL pattern (keeps wildcards) and normalized fallback (accent-stripped, lowercase)
-  pattern = "%" + query_text.replace("%", "\\%").replace("_", "\\_") + "%"
-  pattern_norm = "%" + _strip_accents(query_text).replace("%", "").replace("_", "") + "%"
-  params = {"pattern": pattern, "pattern_norm": pattern_norm, "limit": limit}
 
+def refresh_facet_index(generation: Optional[int]) -> None:
+  """Recount the filters_options facets over upcoming showtimes."""
+  global facet_index, facet_index_failed_at
   try:
     conn = get_connection()
   except Exception as exc:
-    logging.error("Database connection error during search_suggest: %s", exc)
-    raise HTTPException(status_code=500, detail="Database connection error")
+    logging.error("Unable to connect to database while computing facets: %s", exc)
+    facet_index_failed_at = time.monotonic()
+    return
+
+  try:
+    facet_index = FacetIndex.load(conn, date.today(), generation=generation)
+    facet_index_failed_at = None
+  except Exception as exc:
+    logging.error("Error computing filter facets: %s", exc)
+    facet_index_failed_at = time.monotonic()
+  finally:
+    release_connection(conn)
+
+
+def rebuild_facet_index(generation: Optional[int]) -> Optional["asyncio.Future[None]"]:
+  """Start, or join, the facet rebuild for `generation` from the request path.
+
+  Concurrent stale requests share one rebuild through `flights`. Returns None without
+  starting anything for FACET_INDEX_RETRY_SECONDS after a failed rebuild.
+  """
+  failed_at = facet_index_failed_at
+  if failed_at is not None and time.monotonic() - failed_at < FACET_INDEX_RETRY_SECONDS:
+    return None
+  key = ("facet_index", generation, date.today())
+  return asyncio.ensure_future(flights.do(key, lambda: run_in_threadpool(refresh_facet_index, generation)))
+
 
-  films: List[dict] = []
-  cinemas: List[dict] = []
-  cities: List[dict] = []
+async def watch_data_generation() -> None:
+  while True:
+    await asyncio.sleep(DATA_GENERATION_CHECK_SECONDS)
+    await run_in_threadpool(refresh_data_generation)
 
+
+@app.on_event("startup")
+async def on_startup() -> None:
   try:
-    # --- FILMS ---
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-      cur.execute(
-        """
-        SELECT id,
-               title,
-               COALESCE(NULLIF(original_title, ''), '') AS original_title
-        FROM films
-        WHERE
-          -- accent-insensitive match
-          unaccent(lower(title)) LIKE unaccent(lower(%(pattern)s))
-          OR unaccent(lower(COALESCE(original_title, ''))) LIKE unaccent(lower(%(pattern)s))
-          -- fallback: python-normalized text LIKE (for safety if extension unavailable on read replica)
-          OR lower(title) LIKE %(pattern_norm)s
-          OR lower(COALESCE(original_title, '')) LIKE %(pattern_norm)s
-        ORDER BY title ASC
-        LIMIT %(limit)s;
-        """,
-        params,
-      )
-      films = cur.fetchall()
+    init_pool()
+  except Exception as exc:
+    logging.error("Unable to create database connection pool: %s", exc)
+  if DB_DRIVER == "async":
+    try:
+      await init_async_db()
+    except Exception as exc:
+      logging.error("Unable to create async database pool, falling back to sync driver: %s", exc)
+  await run_in_threadpool(check_schema_version)
+  await run_in_threadpool(detect_postgis)
+  global response_cache
+  if RESPONSE_CACHE_ENABLED:
+    response_cache = response_cache_from_env(os.environ)
+  await run_in_threadpool(refresh_data_generation)
+  background_tasks.append(asyncio.create_task(watch_data_generation()))
+  if SPATIAL_INDEX_ENABLED:
+    await run_in_threadpool(refresh_spatial_index)
+    background_tasks.append(asyncio.create_task(watch_spatial_index()))
+  if SNAPSHOT_ENGINE_ENABLED:
+    await start_snapshot_engine()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+  for task in background_tasks:
+    task.cancel()
+  background_tasks.clear()
+  await close_async_db()
+  close_pool()
+
+
+@app.get("/api/metrics")
+def metrics():
+  return {
+    "db_driver": "async" if async_db is not None else "sync",
+    "db_pool": db_pool.stats() if db_pool is not None else None,
+    "async_db_pool": async_db.stats() if async_db is not None else None,
+    "snapshot": snapshot_engine.stats() if snapshot_engine is not None else None,
+    "spatial_index_cinemas": len(spatial_index) if spatial_index is not None else None,
+    "autocomplete_entries": len(autocomplete_index) if autocomplete_index is not None else None,
+    "data_generation": data_generation,
+    "response_cache": response_cache.stats() if response_cache is not None else None,
+    "single_flight": flights.stats(),
+    "json_encoder": "orjson" if ORJSON_AVAILABLE else "json",
+  }
 
-    # --- CINEMAS ---
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-      try:
-        cur.execute(
-          f"""
-          SELECT id,
-                 name,
-                 COALESCE(lat, latitude) AS lat,
-                 COALESCE(lon, longitude) AS lon
-          FROM cinemas
-          WHERE
-            unaccent(lower(name)) LIKE unaccent(lower(%(pattern)s))
-            OR lower(name) LIKE %(pattern_norm)s
-          ORDER BY name ASC
-          LIMIT %(limit)s;
-          """,
-          params,
-        )
-        cinemas = cur.fetchall()
-      except Exception as e:
-        logging.warning("Cinemas query without lat/lon fallback due to schema mismatch: %s", e)
-        cur.execute(
-          """
-          SELECT id, name
-          FROM cinemas
-          WHERE
-            unaccent(lower(name)) LIKE unaccent(lower(%(pattern)s))
-            OR lower(name) LIKE %(pattern_norm)s
-          ORDER BY name ASC
-          LIMIT %(limit)s;
-          """,
-          params,
-        )
-        rows = cur.fetchall()
-        cinemas = [{"id": r["id"], "name": r["name"], "lat": None, "lon": None} for r in rows]
 
-    # --- CITIES ---
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-      cur.execute(
-        """
-        SELECT id,
-               name,
-               COALESCE(zipcode, '') AS zipcode,
-               lat,
-               lon
-        FROM geo_cities
-        WHERE
-          unaccent(lower(name)) LIKE unaccent(lower(%(pattern)s))
-          OR lower(name) LIKE %(pattern_norm)s
-          OR lower(COALESCE(zipcode, '')) LIKE %(pattern_norm)s
-        ORDER BY name ASC
-        LIMIT %(limit)s;
-        """,
-        params,
-      )
-      cities = cur.fetchall()
-  finally:
-    conn.close()
+@app.get("/api/filters_options")
+async def filters_options(
+  lat: Optional[float] = Query(None),
+  lon: Optional[float] = Query(None),
+  radius_km: Optional[float] = Query(None, gt=0, le=500),
+  date_filter: Optional[str] = Query(None, alias="date"),
+):
+  """Filter values with upcoming showtime/film counts per facet.
+
+  Without a location the counts cover every upcoming showtime and come from the facet
+  index. With lat/lon they cover the cinemas within radius_km (and the given date),
+  computed in one query, so filters with no match nearby can be greyed out.
+  """
+  if lat is None or lon is None:
+    index = facet_index
+    if index is None or not index.is_current(data_generation, date.today()):
+      # A stale index keeps serving while it is rebuilt in the background; only the
+      # first requests, with nothing to serve yet, wait for the rebuild.
+      rebuild = rebuild_facet_index(data_generation)
+      if index is None and rebuild is not None:
+        await rebuild
+        index = facet_index
+    if index is None:
+      return filters_payload(None)
+    return filters_payload(index.facets)
+
+  radius = radius_km or 5
+  filter_date = None
+  if date_filter:
+    try:
+      filter_date = date.fromisoformat(date_filter)
+    except ValueError:
+      logging.warning("Invalid date filter received for filters_options: %s", date_filter)
+  if response_cache is not None:
+    lat = quantize(lat, RESPONSE_CACHE_GRID_DEG)
+    lon = quantize(lon, RESPONSE_CACHE_GRID_DEG)
+  day = filter_date or ("from", date.today())
+  key = request_key("filters_options", lat, lon, radius, day)
+  cached = response_cache.get(key) if response_cache is not None else None
+  if cached is not None:
+    return cached
+  generation = data_generation
+  facets = await flights.do(key, lambda: scoped_facets(lat, lon, radius, filter_date))
+  payload = filters_payload(facets, scope={"lat": lat, "lon": lon, "radius_km": radius, "date": date_filter if filter_date else None})
+  if response_cache is not None:
+    response_cache.put(key, payload, generation)
+  return payload
+
+
+async def scoped_facets(lat: float, lon: float, radius: float, filter_date: Optional[date]) -> dict:
+  params = {"center_lat": lat, "center_lon": lon, "radius_km": radius}
+  nearby_cte = nearby_cinemas_cte(params, radius)
+  if filter_date:
+    where = "sl.start_date = %(filter_date)s"
+    params["filter_date"] = filter_date
+  else:
+    where = "sl.start_date >= %(today)s"
+    params["today"] = date.today()
+  query = facets_query(where, scope=f"WITH {nearby_cte}", scoped_from="nearby n JOIN showtime_listing sl ON sl.cinema_id = n.cinema_id")
+  rows = await fetch_all(query, params, "filters_options")
+  return facets_from_rows((row["dimension"], row["value"], row["showtimes"], row["films"]) for row in rows)
 
-  suggestions: List[dict] = []
 
-  for row in films:
-    suggestion = {
-      "type": "film",
-      "id": row["id"],
-      "label": row["title"],
-    }
-    if row.get("original_title") and row["original_title"].lower() != row["title"].lower():
-      suggestion["sublabel"] = row["original_title"]
-    suggestions.append(suggestion)
-    if len(suggestions) >= limit:
-      return {"suggestions": suggestions}
+def filters_payload(facets: Optional[dict], scope: Optional[dict] = None) -> dict:
+  """filters_options body; the genre list falls back to GENRE_OPTIONS when no counts are known."""
+  if facets is None:
+    return {"genres": GENRE_OPTIONS, "languages": [], "subtitles": SUBTITLE_OPTIONS, "facets": None, "scope": scope}
+  genres = sorted({item["value"] for item in facets.get("genre", [])}, key=lambda value: value.lower())
+  languages = sorted({item["value"].strip() for item in facets.get("language", []) if item["value"].strip()}, key=lambda value: value.lower())
+  return {
+    "genres": genres if scope is not None or genres else GENRE_OPTIONS,
+    "languages": languages,
+    "subtitles": SUBTITLE_OPTIONS,
+    "facets": facets,
+    "scope": scope,
+  }
 
-  for row in cinemas:
+
+@app.get("/api/search_suggest")
+async def search_suggest(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=25)):
+  index = autocomplete_index
+  if index is not None:
+    return {"suggestions": index.search(q, limit)}
+  return await flights.do(request_key("search_suggest", q, limit), lambda: _search_suggest(q, limit))
+
+
+async def _search_suggest(q: str, limit: int) -> dict:
+  query_text = q.strip()
+  if not query_text:
+    return {"suggestions": []}
+
+  # LIKE metacharacters typed by the user are matched literally.
+  params = {
+    "q": query_text,
+    "q_like": query_text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"),
+    "limit": limit,
+  }
+
+  # One round trip for the three sources. Each branch filters on the indexed
+  # search_normalize() expressions (the patterns fold to constants at plan time, so
+  # the trigram indexes apply) and ranks prefix matches first, then by similarity.
+  # Films come first, then cinemas, then cities, as before.
+  norm = "search_normalize(%(q)s)"
+  contains = "'%%' || search_normalize(%(q_like)s) || '%%'"
+  prefix = "search_normalize(%(q_like)s) || '%%'"
+  rows = await fetch_all(
+    f"""
+    (
+      SELECT 0 AS kind_order, 'film' AS type, id, title AS label, NULLIF(original_title, '') AS sublabel,
+             NULL::double precision AS lat, NULL::double precision AS lon,
+             COALESCE(search_normalize(title) LIKE {prefix} OR search_normalize(original_title) LIKE {prefix}, false) AS prefix_match,
+             GREATEST(similarity(search_normalize(title), {norm}), similarity(search_normalize(original_title), {norm})) AS score
+      FROM films
+      WHERE search_normalize(title) LIKE {contains}
+         OR search_normalize(original_title) LIKE {contains}
+      ORDER BY prefix_match DESC, score DESC, label
+      LIMIT %(limit)s
+    )
+    UNION ALL
+    (
+      SELECT 1, 'cinema', id, name, NULL, latitude, longitude,
+             search_normalize(name) LIKE {prefix},
+             similarity(search_normalize(name), {norm})
+      FROM cinemas
+      WHERE search_normalize(name) LIKE {contains}
+      ORDER BY 8 DESC, 9 DESC, name
+      LIMIT %(limit)s
+    )
+    UNION ALL
+    (
+      SELECT 2, 'city', id, name, NULLIF(zipcode, ''), lat, lon,
+             COALESCE(search_normalize(name) LIKE {prefix} OR zipcode LIKE %(q_like)s || '%%', false),
+             similarity(search_normalize(name), {norm})
+      FROM geo_cities
+      WHERE search_normalize(name) LIKE {contains}
+         OR zipcode LIKE %(q_like)s || '%%'
+      ORDER BY 8 DESC, 9 DESC, name
+      LIMIT %(limit)s
+    )
+    ORDER BY kind_order, prefix_match DESC, score DESC, label
+    LIMIT %(limit)s;
+    """,
+    params,
+    "search_suggest",
+  )
+
+  suggestions: List[dict] = []
+  for row in rows:
     suggestion = {
-      "type": "cinema",
+      "type": row["type"],
       "id": row["id"],
-      "label": row["name"],
+      "label": row["label"],
     }
+    sublabel = row.get("sublabel")
+    if sublabel and (row["type"] != "film" or sublabel.lower() != row["label"].lower()):
+      suggestion["sublabel"] = sublabel
     if row.get("lat") is not None and row.get("lon") is not None:
       suggestion["lat"] = float(row["lat"])
       suggestion["lon"] = float(row["lon"])
     suggestions.append(suggestion)
-    if len(suggestions) >= limit:
-      return {"suggestions": suggestions}
-
-  for row in cities:
-    suggestion = {
-      "type": "city",
-      "id": row["id"],
-      "label": row["name"],
-      "lat": float(row["lat"]),
-      "lon": float(row["lon"]),
-    }
-    if row.get("zipcode"):
-      suggestion["sublabel"] = row["zipcode"]
-    suggestions.append(suggestion)
-    if len(suggestions) >= limit:
-      return {"suggestions": suggestions}
 
   return {"suggestions": suggestions}
 
 
+def response_etag(*parts) -> Optional[str]:
+  """Weak ETag for a GET response: data generation plus the canonical request parameters.
+
+  Results without a date filter start "today", so the day is part of the tag. No ETag
+  is issued while the data generation is unknown (migration 0008 not applied).
+  """
+  if data_generation is None:
+    return None
+  canonical = repr(request_key(*parts, date.today().isoformat()))
+  digest = hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:20]
+  return f'W/"{data_generation}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+  if not if_none_match or etag is None:
+    return False
+  wanted = etag[2:] if etag.startswith("W/") else etag
+  for candidate in if_none_match.split(","):
+    candidate = candidate.strip()
+    if candidate == "*" or (candidate[2:] if candidate.startswith("W/") else candidate) == wanted:
+      return True
+  return False
+
+
+def cache_headers(etag: Optional[str]) -> dict:
+  if etag is None:
+    return {"Cache-Control": "no-cache"}
+  return {"Cache-Control": f"public, max-age={HTTP_CACHE_MAX_AGE}", "ETag": etag}
+
+
+@app.get("/api/movies_nearby")
+async def movies_nearby_get(
+  req: Annotated[MoviesNearbyRequest, Query()],
+  if_none_match: Optional[str] = Header(None),
+):
+  """Cacheable twin of POST /api/movies_nearby; answers 304 before any DB work when the ETag matches."""
+  etag = response_etag("movies_nearby", req.model_dump())
+  if etag_matches(if_none_match, etag):
+    return Response(status_code=304, headers=cache_headers(etag))
+  if req.format == "ndjson":
+    return await nearby_ndjson(req, headers=cache_headers(etag))
+  payload = await nearby_payload(req)
+  return FastJSONResponse(payload, headers=cache_headers(etag))
+
+
 @app.post("/api/movies_nearby")
-def movies_nearby(req: MoviesNearbyRequest = Body(...)):
+async def movies_nearby(req: MoviesNearbyRequest = Body(...)):
+  if req.format == "ndjson":
+    return await nearby_ndjson(req)
+  # Returning the response directly skips jsonable_encoder: dates and times are
+  # serialized natively by FastJSONResponse.
+  return FastJSONResponse(await nearby_payload(req))
+
+
+async def nearby_payload(req: MoviesNearbyRequest) -> dict:
+  # Coalesce on the normalized plan (sorted filters, defaulted radius and sort), not
+  # the raw request, so equivalent concurrent requests share one computation.
+  plan = nearby_plan(req)
+  return await flights.do(nearby_key(plan, req), lambda: _movies_nearby(req, plan))
+
+
+async def nearby_ndjson(req: MoviesNearbyRequest, headers: Optional[dict] = None) -> StreamingResponse:
+  """movies_nearby as NDJSON: one film (with its cinemas and showtimes) per line.
+
+  Rows come from a server-side cursor in film order and each film is written as soon
+  as its last row is read, so memory stays at one film whatever the radius. Films are
+  ranked and paged like the JSON formats, but there is no envelope and no next_cursor,
+  and the response cache and the snapshot engine are bypassed.
+  """
+  plan = nearby_plan(req)
+  lines = _ndjson_films(plan, iterate_rows(plan.query, plan.params, "movies_nearby"))
+  # Wait for the first film before answering, so pool and query errors still get a
+  # proper status code instead of a truncated 200.
+  first = await anext(lines, b"")
+
+  async def body() -> AsyncIterator[bytes]:
+    try:
+      if first:
+        yield first
+      async for line in lines:
+        yield line
+    except Exception as exc:
+      logging.error("movies_nearby NDJSON stream aborted: %s", exc)
+    finally:
+      await lines.aclose()
+
+  return StreamingResponse(body(), media_type="application/x-ndjson", headers=headers)
+
+
+async def _ndjson_films(plan: NearbyPlan, rows: AsyncIterator[tuple]) -> AsyncIterator[bytes]:
+  aggregator = MovieAggregator()
+  current_film = None
+  try:
+    async for row in rows:
+      if row[FILM_ID] != current_film:
+        for movie in aggregator.take():
+          yield _ndjson_line(movie, plan.film_fields)
+        current_film = row[FILM_ID]
+      aggregator.add(row)
+    for movie in aggregator.take():
+      yield _ndjson_line(movie, plan.film_fields)
+  finally:
+    # Closing the row iterator returns its connection now rather than at garbage collection.
+    await rows.aclose()
+
+
+def _ndjson_line(movie: dict, film_fields: Optional[List[str]]) -> bytes:
+  movie.pop("_meta", None)
+  if film_fields is not None:
+    movie = select_film_fields([movie], film_fields)[0]
+  return dumps(movie) + b"\n"
+
+
+# NEARBY_COLUMNS over showtime_listing `sl` joined to the `nearby` CTE.
+NEARBY_SELECT = """
+        sl.film_id,
+        sl.title,
+        sl.original_title,
+        sl.poster_url,
+        sl.duration,
+        sl.release_date,
+        sl.synopsis,
+        sl.genre_names AS genres,
+        sl.language_names AS languages,
+        sl.cinema_id,
+        sl.cinema_name,
+        sl.address,
+        sl.lat,
+        sl.lon,
+        n.distance_km,
+        sl.start_date,
+        sl.start_time,
+        sl.diffusion_version,
+        sl.format,
+        sl.reservation_url
+"""
+
+
+def showtime_filters(
+  params: dict,
+  filter_date: Optional[date],
+  subtitles_filter: List[str],
+  duration_max: Optional[int],
+  languages_filter: List[str],
+  genres_filter: List[str],
+  movie_id: Optional[int],
+) -> List[str]:
+  """WHERE clauses over showtime_listing `sl` for the movies_nearby filters; fills `params`."""
+  where_clauses = []
+  if filter_date:
+    where_clauses.append("sl.start_date = %(filter_date)s")
+    params["filter_date"] = filter_date
+  else:
+    where_clauses.append("sl.start_date >= %(today)s")
+    params["today"] = date.today()
+
+  if subtitles_filter:
+    where_clauses.append("UPPER(COALESCE(sl.diffusion_version, '')) = ANY(%(subtitles)s)")
+    params["subtitles"] = subtitles_filter
+
+  if duration_max is not None:
+    where_clauses.append("(sl.duration IS NULL OR sl.duration <= %(duration_max)s)")
+    params["duration_max"] = duration_max
+
+  if languages_filter:
+    params["languages_like"] = [f"%{lang}%" for lang in languages_filter]
+    where_clauses.append("(sl.languages IS NULL OR sl.languages = '' OR LOWER(sl.languages) LIKE ANY(%(languages_like)s))")
+    # Films with language names must list one of the requested languages exactly.
+    params["languages"] = languages_filter
+    where_clauses.append(
+      "(COALESCE(cardinality(sl.language_names), 0) = 0"
+      " OR EXISTS (SELECT 1 FROM unnest(sl.language_names) AS ln(name) WHERE LOWER(TRIM(ln.name)) = ANY(%(languages)s)))"
+    )
+
+  if genres_filter:
+    params["genres_like"] = [f"%{genre}%" for genre in genres_filter]
+    where_clauses.append("(sl.genre IS NULL OR LOWER(sl.genre) LIKE ANY(%(genres_like)s))")
+
+  if movie_id is not None:
+    where_clauses.append("sl.film_id = %(movie_id)s")
+    params["movie_id"] = movie_id
+
+  return where_clauses
+
+
+def nearby_plan(req: MoviesNearbyRequest) -> NearbyPlan:
+  """Validate a movies_nearby request and build its ranked, paged SQL query."""
   radius = req.radius_km if req.radius_km and req.radius_km > 0 else 5
   center_lat = req.center_lat if req.override_location else req.lat
   center_lon = req.center_lon if req.override_location else req.lon
-  sort_options = {"relevance", "distance", "earliest_showtime", "title_asc", "duration_asc"}
   sort_by = (req.sort_by or "relevance").lower()
-  if sort_by not in sort_options:
+  if sort_by not in NEARBY_SORT_KEYS:
     sort_by = "relevance"
 
+  after_key = None
+  if req.cursor:
+    try:
+      after_key = decode_cursor(req.cursor, sort_by)
+    except ValueError as exc:
+      raise HTTPException(status_code=400, detail=f"Invalid cursor: {exc}")
+
   filter_date = None
   if req.date:
     try:
@@ -472,9 +1078,6 @@ def movies_nearby(req: MoviesNearbyRequest = Body(...)):
   duration_max = req.duration_max_minutes if req.duration_max_minutes and req.duration_max_minutes > 0 else None
   languages_filter = [str(lang).strip().lower() for lang in (req.languages or []) if isinstance(lang, str) and str(lang).strip()]
   genres_filter = [str(genre).strip().lower() for genre in (req.genres or []) if isinstance(genre, str) and str(genre).strip()]
-  subtitles_set = set(subtitles_filter)
-  languages_filter_set = set(languages_filter)
-  genres_filter_set = set(genres_filter)
 
   # Extra guard in case NaN slips through
   if isinstance(center_lat, float) and center_lat != center_lat:
@@ -485,230 +1088,336 @@ def movies_nearby(req: MoviesNearbyRequest = Body(...)):
   if center_lat is None or center_lon is None:
     raise HTTPException(status_code=400, detail="Missing coordinates")
 
-  cinema_lat_expr = "COALESCE(c.lat, c.latitude)"
-  cinema_lon_expr = "COALESCE(c.lon, c.longitude)"
-  dist_expr = distance_sql(cinema_lat_expr, cinema_lon_expr)
+  film_fields = parse_fields(req.fields)
 
-  where_clauses = [f"{cinema_lat_expr} IS NOT NULL", f"{cinema_lon_expr} IS NOT NULL"]
   params = {
     "center_lat": center_lat,
     "center_lon": center_lon,
     "radius_km": radius,
   }
-
-  if filter_date:
-    where_clauses.append("s.start_date = %(filter_date)s")
-    params["filter_date"] = filter_date
-  else:
-    where_clauses.append("s.start_date >= %(today)s")
-    params["today"] = date.today()
-
-  if subtitles_filter:
-    where_clauses.append("UPPER(COALESCE(s.diffusion_version, '')) = ANY(%(subtitles)s)")
-    params["subtitles"] = subtitles_filter
-
-  if duration_max is not None:
-    where_clauses.append("(m.duration IS NULL OR m.duration <= %(duration_max)s)")
-    params["duration_max"] = duration_max
-
-  if languages_filter:
-    params["languages_like"] = [f"%{lang}%" for lang in languages_filter]
-    where_clauses.append("(m.languages IS NULL OR m.languages = '' OR LOWER(m.languages) LIKE ANY(%(languages_like)s))")
-
-  if genres_filter:
-    params["genres_like"] = [f"%{genre}%" for genre in genres_filter]
-    where_clauses.append("(m.genre IS NULL OR LOWER(m.genre) LIKE ANY(%(genres_like)s))")
-
-  if req.movie_id is not None:
-    where_clauses.append("s.movie_id = %(movie_id)s")
-    params["movie_id"] = req.movie_id
-
-  if req.cinema_id is not None:
-    where_clauses.append("s.cinema_id = %(cinema_id)s")
-    params["cinema_id"] = req.cinema_id
-  else:
-    where_clauses.append(f"{dist_expr} <= %(radius_km)s")
+  nearby_cte = nearby_cinemas_cte(params, radius, cinema_id=req.cinema_id, nearest=req.nearest)
+  where_clauses = showtime_filters(
+    params, filter_date, subtitles_filter, duration_max, languages_filter, genres_filter, req.movie_id
+  )
+
+  # Films are ranked in SQL on their aggregates (min distance, earliest showtime, ...)
+  # and paged with a keyset on the sort key, so only the returned films' showtimes
+  # are fetched. Rows come out as NEARBY_COLUMNS tuples followed by the page size and
+  # the film's sort key, grouped by film in page order.
+  sort_keys = NEARBY_SORT_KEYS[sort_by]
+  sort_columns = ", ".join(f"{expr} AS sort_{i}" for i, (expr, _) in enumerate(sort_keys))
+  sort_refs = ", ".join([f"sort_{i}" for i in range(len(sort_keys))] + ["film_id"])
+  keyset_filter = ""
+  if after_key is not None:
+    for i, value in enumerate(after_key):
+      params[f"after_{i}"] = value
+    keyset_filter = f"WHERE ({sort_refs}) > ({', '.join(f'%(after_{i})s' for i in range(len(after_key)))})"
+  page_limit = ""
+  page_filter = ""
+  if req.limit is not None:
+    # One extra film tells whether there is a next page; its showtimes are not fetched.
+    params["page_limit"] = req.limit + 1
+    params["limit"] = req.limit
+    page_limit = "LIMIT %(page_limit)s"
+    page_filter = "WHERE p.film_rank <= %(limit)s"
 
   query = f"""
+    WITH {nearby_cte},
+    matched AS (
+      SELECT {NEARBY_SELECT}
+      FROM nearby n
+      JOIN showtime_listing sl ON sl.cinema_id = n.cinema_id
+      WHERE {' AND '.join(where_clauses)}
+    ),
+    films AS (
+      SELECT
+        film_id,
+        MIN(COALESCE(title, '')) AS title,
+        MIN(duration) AS duration,
+        MIN(distance_km) AS min_distance,
+        MIN(start_date + start_time) AS earliest_at
+      FROM matched
+      GROUP BY film_id
+    ),
+    ranked AS (
+      SELECT film_id, {sort_columns} FROM films
+    ),
+    page AS (
+      SELECT ranked.*, ROW_NUMBER() OVER (ORDER BY {sort_refs}) AS film_rank
+      FROM ranked
+      {keyset_filter}
+      ORDER BY {sort_refs}
+      {page_limit}
+    )
     SELECT
-      m.id AS film_id,
-      m.title,
-      COALESCE(m.original_title, '') AS original_title,
-      m.poster_url,
-      m.duration,
-      m.release_date,
-      m.synopsis,
-      ARRAY_REMOVE(ARRAY_AGG(DISTINCT g.name), NULL) AS genres,
-      ARRAY_REMOVE(ARRAY_AGG(DISTINCT l.name), NULL) AS languages,
-      c.id AS cinema_id,
-      c.name AS cinema_name,
-      c.address,
-      {cinema_lat_expr} AS lat,
-      {cinema_lon_expr} AS lon,
-      {dist_expr} AS distance_km,
-      s.start_date,
-      s.start_time,
-      s.diffusion_version,
-      s.format,
-      s.reservation_url
-    FROM showtimes s
-    JOIN cinemas c ON c.id = s.cinema_id
-    JOIN films m ON m.id = s.movie_id
-    LEFT JOIN film_genre fg ON fg.film_id = m.id_allocine
-    LEFT JOIN genre g ON g.id = fg.genre_id
-    LEFT JOIN film_language fl ON fl.film_id = m.id_allocine
-    LEFT JOIN language l ON l.id = fl.language_id
-    WHERE {' AND '.join(where_clauses)}
-    GROUP BY m.id, c.id, s.start_date, s.start_time, s.diffusion_version, s.format, s.reservation_url
-    ORDER BY m.title ASC, c.name ASC, s.start_date ASC, s.start_time ASC;
+      {', '.join(f'm.{column}' for column in NEARBY_COLUMNS)},
+      (SELECT COUNT(*) FROM page) AS page_films,
+      {', '.join(f'p.sort_{i}' for i in range(len(sort_keys)))}
+    FROM page p
+    JOIN matched m ON m.film_id = p.film_id
+    {page_filter}
+    ORDER BY p.film_rank, m.cinema_name ASC, m.start_date ASC, m.start_time ASC
   """
+  filters = {
+    "filter_date": filter_date,
+    "subtitles": subtitles_filter,
+    "duration_max": duration_max,
+    "languages": languages_filter,
+    "genres": genres_filter,
+    "max_distance_km": None if req.cinema_id is not None else radius,
+  }
 
-  try:
-    conn = get_connection()
-  except Exception as exc:
-    logging.error("Database connection error during movies_nearby: %s", exc)
-    raise HTTPException(status_code=500, detail="Database connection error")
 
-  movies = {}
-  try:
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-      cur.execute(query, params)
-      rows = cur.fetchall()
-  finally:
-    conn.close()
+  return NearbyPlan(
+    center_lat=center_lat,
+    center_lon=center_lon,
+    radius=radius,
+    sort_by=sort_by,
+    after_key=after_key,
+    filter_date=filter_date,
+    subtitles=subtitles_filter,
+    duration_max=duration_max,
+    languages=languages_filter,
+    genres=genres_filter,
+    film_fields=film_fields,
+    query=query,
+    params=params,
+    filters=filters,
+  )
+
+
+def nearby_key(plan: NearbyPlan, req: MoviesNearbyRequest) -> tuple:
+  """Single-flight key: everything the payload depends on, normalized, exact center included."""
+  return (
+    "movies_nearby",
+    plan.center_lat,
+    plan.center_lon,
+    plan.radius,
+    plan.filter_date or ("from", date.today()),
+    tuple(sorted(plan.genres)),
+    tuple(sorted(plan.languages)),
+    tuple(sorted(plan.subtitles)),
+    plan.duration_max,
+    plan.sort_by,
+    req.cinema_id,
+    req.movie_id,
+    req.nearest,
+    req.limit,
+    req.cursor,
+    req.format,
+    tuple(plan.film_fields) if plan.film_fields is not None else None,
+  )
+
+
+def nearby_cell_key(plan: NearbyPlan, req: MoviesNearbyRequest) -> tuple:
+  """Response-cache key of the candidate rows around the request's grid cell.
+
+  Only this key is snapped to RESPONSE_CACHE_GRID_DEG: distances, the radius cut and
+  the ranking are always computed from the exact center (see `nearby_cell_rows`).
+  """
+  return (
+    "movies_nearby_cell",
+    quantize(plan.center_lat, RESPONSE_CACHE_GRID_DEG),
+    quantize(plan.center_lon, RESPONSE_CACHE_GRID_DEG),
+    plan.radius,
+    plan.filter_date or ("from", date.today()),
+    tuple(sorted(plan.genres)),
+    tuple(sorted(plan.languages)),
+    tuple(sorted(plan.subtitles)),
+    plan.duration_max,
+    req.cinema_id,
+    req.movie_id,
+  )
+
+
+def cell_reach_km() -> float:
+  """Upper bound of the distance between a point and its grid node (half a cell diagonal), padded."""
+  return RESPONSE_CACHE_GRID_DEG / 2 * math.sqrt(2) * KM_PER_DEGREE_LAT * 1.01 + 0.001
+
+
+async def _fetch_cell_rows(plan: NearbyPlan, req: MoviesNearbyRequest, key: tuple) -> List[tuple]:
+  cell_lat, cell_lon = key[1], key[2]
+  reach = plan.radius + cell_reach_km()
+  params = {"center_lat": cell_lat, "center_lon": cell_lon, "radius_km": reach}
+  nearby_cte = nearby_cinemas_cte(params, reach, cinema_id=req.cinema_id)
+  where_clauses = showtime_filters(
+    params, plan.filter_date, plan.subtitles, plan.duration_max, plan.languages, plan.genres, req.movie_id
+  )
+  query = f"""
+    WITH {nearby_cte}
+    SELECT {NEARBY_SELECT}
+    FROM nearby n
+    JOIN showtime_listing sl ON sl.cinema_id = n.cinema_id
+    WHERE {' AND '.join(where_clauses)}
+  """
+  generation = data_generation
+  rows: List[tuple] = []
+  await stream_rows(query, params, "movies_nearby", lambda row: rows.append(tuple(row)))
+  response_cache.put(key, rows, generation)
+  return rows
 
-  for row in rows:
-    film_id = row["film_id"]
-    movie = movies.get(film_id)
-    if not movie:
-      genres_list = split_to_list(row.get("genre"))
-      languages_list = split_to_list(row.get("languages"))
-      movie = {
-        "id": film_id,
-        "title": row["title"],
-        "original_title": row.get("original_title") or None,
-        "poster": row.get("poster_url"),
-        "duration": row.get("duration"),
-        "release_date": row.get("release_date"),
-        "synopsis": row.get("synopsis"),
-        "genre": row.get("genre"),
-        "genres": genres_list,
-        "languages": languages_list,
-        "language": languages_list[0] if languages_list else None,
-        "cinemas": [],
-      }
-      movies[film_id] = movie
 
-    cinemas_list = movie["cinemas"]
-    cinema = next((c for c in cinemas_list if c["id"] == row["cinema_id"]), None)
-    if not cinema:
-      cinema = {
-        "id": row["cinema_id"],
-        "name": row["cinema_name"],
-        "address": row.get("address"),
-        "lat": float(row["lat"]) if row.get("lat") is not None else None,
-        "lon": float(row["lon"]) if row.get("lon") is not None else None,
-        "distance_km": float(row["distance_km"]) if row.get("distance_km") is not None else None,
-        "showtimes": [],
-      }
-      cinemas_list.append(cinema)
+async def nearby_cell_rows(plan: NearbyPlan, req: MoviesNearbyRequest) -> List[tuple]:
+  """movies_nearby rows for the exact center, cut from the cached rows of its grid cell.
 
-    cinema["showtimes"].append({
-      "start_date": row["start_date"].isoformat() if isinstance(row["start_date"], date) else row["start_date"],
-      "start_time": row["start_time"].isoformat() if hasattr(row["start_time"], "isoformat") else row["start_time"],
-      "diffusion_version": row.get("diffusion_version"),
-      "format": row.get("format"),
-      "reservation_url": row.get("reservation_url"),
-    })
+  The cell entry holds every matching showtime within radius + half a cell diagonal of
+  the grid node, a superset for any center in the cell. Distances are recomputed from
+  the exact center, then the radius (or `nearest`) cut is applied, so the answer is the
+  same as the uncached query's.
+  """
+  key = nearby_cell_key(plan, req)
+  rows = response_cache.get(key)
+  if rows is None:
+    rows = await flights.do(key, lambda: _fetch_cell_rows(plan, req, key))
 
-  subtitle_set = set(subtitles_filter)
-  languages_filter_set = set(languages_filter)
-  genres_filter_set = set(genres_filter)
-  processed_movies: List[dict] = []
+  lat, lon = plan.center_lat, plan.center_lon
+  if req.cinema_id is not None:
+    distances = None
+  elif spatial_index is not None:
+    distances = spatial_index.within(lat, lon, plan.radius, nearest=req.nearest)
+  else:
+    distances = {}
+    for row in rows:
+      cinema_id = row[CINEMA_ID]
+      if cinema_id not in distances:
+        distances[cinema_id] = haversine_km(lat, lon, float(row[LAT]), float(row[LON]))
+    distances = {cinema_id: distance for cinema_id, distance in distances.items() if distance <= plan.radius}
+
+  exact_rows = []
+  for row in rows:
+    if distances is None:
+      distance = haversine_km(lat, lon, float(row[LAT]), float(row[LON]))
+    else:
+      distance = distances.get(row[CINEMA_ID])
+      if distance is None:
+        continue
+    exact_rows.append(row[:DISTANCE_KM] + (distance,) + row[DISTANCE_KM + 1:])
+  return exact_rows
+
+
+def ranked_page(rows: List[tuple], plan: NearbyPlan, req: MoviesNearbyRequest) -> Tuple[List[dict], Optional[str]]:
+  """Aggregate NEARBY_COLUMNS rows into movies, then sort and page them like the SQL query."""
+  processed_movies = aggregate_movies(rows, vectorized=VECTORIZED_AGGREGATION, **plan.filters)
+  keyed = sorted(((movie_sort_key(movie, plan.sort_by), movie) for movie in processed_movies), key=lambda item: item[0])
+  if plan.after_key is not None:
+    keyed = [item for item in keyed if item[0] > plan.after_key]
+  next_cursor = None
+  if req.limit is not None and len(keyed) > req.limit:
+    keyed = keyed[:req.limit]
+    next_cursor = encode_cursor(plan.sort_by, keyed[-1][0])
+  return [movie for _, movie in keyed], next_cursor
+
+
+async def _movies_nearby(req: MoviesNearbyRequest, plan: Optional[NearbyPlan] = None) -> dict:
+  plan = plan or nearby_plan(req)
+
+  next_cursor = None
+  snapshot = snapshot_engine.current if snapshot_engine is not None else None
+  if snapshot is not None:
+    rows = snapshot.nearby_rows(
+      plan.center_lat,
+      plan.center_lon,
+      plan.radius,
+      today=date.today(),
+      filter_date=plan.filter_date,
+      cinema_id=req.cinema_id,
+      movie_id=req.movie_id,
+      subtitles=plan.subtitles,
+      duration_max=plan.duration_max,
+      languages=plan.languages,
+      genres=plan.genres,
+      nearest=req.nearest,
+    )
+    processed_movies, next_cursor = ranked_page(rows, plan, req)
+  elif response_cache is not None and (req.nearest is None or req.cinema_id is not None or spatial_index is not None):
+    # `nearest` picks among all cinemas, not only those in the cached rows: it needs
+    # the spatial index, or the query below.
+    processed_movies, next_cursor = ranked_page(await nearby_cell_rows(plan, req), plan, req)
+  else:
+    # Every filter already ran in SQL: the aggregator only groups.
+    if VECTORIZED_AGGREGATION and NUMPY_AVAILABLE:
+      rows = []
+      await stream_rows(plan.query, plan.params, "movies_nearby", rows.append)
+      processed_movies = aggregate_movies_numpy(rows)
+      last_row = rows[-1] if rows else None
+    else:
+      aggregator = MovieAggregator()
+      await stream_rows(plan.query, plan.params, "movies_nearby", aggregator.add)
+      processed_movies = aggregator.result()
+      last_row = aggregator.last_row
+    page_films_column = len(NEARBY_COLUMNS)
+    if req.limit is not None and last_row is not None and last_row[page_films_column] > req.limit:
+      next_cursor = encode_cursor(plan.sort_by, tuple(last_row[page_films_column + 1:]) + (last_row[FILM_ID],))
 
-  for movie in movies.values():
-    movie_duration = movie.get("duration")
-    if duration_max is not None and isinstance(movie_duration, int) and movie_duration > duration_max:
-      continue
+  for movie in processed_movies:
+    movie.pop("_meta", None)
 
-    if languages_filter_set:
-      movie_languages = [lang.lower() for lang in (movie.get("languages") or [])]
-      if movie_languages and not languages_filter_set.intersection(movie_languages):
-        continue
+  response_payload = {
+    "success": True,
+    # Always the requested center: the frontend stores it as the user's location.
+    "center_lat": plan.center_lat,
+    "center_lon": plan.center_lon,
+    "radius_km": plan.radius,
+    "next_cursor": next_cursor,
+  }
+  if req.format == "compact":
+    response_payload["format"] = "compact"
+    response_payload.update(compact_movies(processed_movies, plan.film_fields if plan.film_fields is not None else COMPACT_DEFAULT_FIELDS))
+  else:
+    response_payload["data"] = select_film_fields(processed_movies, plan.film_fields) if plan.film_fields is not None else processed_movies
+  return response_payload
 
-    if genres_filter_set:
-      movie_genres = [genre.lower() for genre in (movie.get("genres") or [])]
-      if movie_genres and not genres_filter_set.intersection(movie_genres):
-        continue
 
-    new_cinemas = []
-    min_distance = None
-    earliest_ts = None
+@app.get("/api/movie/{movie_id}")
+async def movie_details_get(
+  movie_id: int,
+  req: Annotated[MovieDetailsRequest, Query()],
+  if_none_match: Optional[str] = Header(None),
+):
+  """Cacheable twin of POST /api/movie/{movie_id}; answers 304 before any DB work when the ETag matches."""
+  etag = response_etag("movie_details", movie_id, req.model_dump())
+  if etag_matches(if_none_match, etag):
+    return Response(status_code=304, headers=cache_headers(etag))
+  payload = await movie_details_payload(movie_id, req)
+  return FastJSONResponse(payload, headers=cache_headers(etag))
 
-    for cinema in movie.get("cinemas", []):
-      showtimes = []
-      for show in cinema.get("showtimes", []):
-        if filter_date and show.get("start_date") != filter_date.isoformat():
-          continue
-        if subtitle_set:
-          subtitle_value = (show.get("diffusion_version") or "").strip().upper()
-          if subtitle_value not in subtitle_set:
-            continue
-        timestamp = showtime_timestamp(show.get("start_date"), show.get("start_time"))
-        if timestamp is not None:
-          if earliest_ts is None or timestamp < earliest_ts:
-            earliest_ts = timestamp
-        showtimes.append(show)
-
-      if not showtimes:
-        continue
 
-      distance_val = cinema.get("distance_km")
-      if isinstance(distance_val, (int, float)):
-        if min_distance is None or distance_val < min_distance:
-          min_distance = distance_val
+@app.post("/api/movie/{movie_id}")
+async def movie_details(movie_id: int, req: MovieDetailsRequest = Body(...)):
+  return FastJSONResponse(await movie_details_payload(movie_id, req))
 
-      cinema_copy = {**cinema, "showtimes": showtimes}
-      new_cinemas.append(cinema_copy)
 
-    if not new_cinemas:
-      continue
+async def movie_details_payload(movie_id: int, req: MovieDetailsRequest) -> dict:
+  req = normalized_details_request(req)
+  return await flights.do(request_key("movie_details", movie_id, req.model_dump()), lambda: _movie_details(movie_id, req))
 
-    movie_copy = {**movie, "cinemas": new_cinemas, "_meta": {"min_distance": min_distance, "earliest_ts": earliest_ts}}
-    processed_movies.append(movie_copy)
 
-  if sort_by == "distance":
-    processed_movies.sort(key=lambda m: m["_meta"]["min_distance"] if m["_meta"]["min_distance"] is not None else float("inf"))
-  elif sort_by == "earliest_showtime":
-    processed_movies.sort(key=lambda m: m["_meta"]["earliest_ts"] if m["_meta"]["earliest_ts"] is not None else float("inf"))
-  elif sort_by == "title_asc":
-    processed_movies.sort(key=lambda m: (m.get("title") or "").lower())
-  elif sort_by == "duration_asc":
-    processed_movies.sort(key=lambda m: m.get("duration") if isinstance(m.get("duration"), int) else float("inf"))
+def normalized_details_request(req: MovieDetailsRequest) -> MovieDetailsRequest:
+  """The same request in canonical form (defaulted radius and sort, deduplicated and
+  sorted filters), so equivalent requests share a single-flight key.
 
-  for movie in processed_movies:
-    movie.pop("_meta", None)
+  Only normalizations _movie_details applies anyway: the center stays exact, so
+  coalescing never changes the answer.
+  """
 
-  response_payload = {
-    "success": True,
-    "center_lat": center_lat,
-    "center_lon": center_lon,
-    "radius_km": radius,
-    "data": processed_movies,
-  }
+  def canonical(values: Optional[List[str]], case) -> Optional[List[str]]:
+    cleaned = sorted({case(value.strip()) for value in values or [] if isinstance(value, str) and value.strip()})
+    return cleaned or None
 
-  return response_payload
+  sort_by = (req.sort_by or "relevance").lower()
+  return req.model_copy(update={
+    "radius_km": req.radius_km if req.radius_km and req.radius_km > 0 else 5,
+    "sort_by": sort_by if sort_by in MOVIE_DETAILS_SORTS else "relevance",
+    "genres": canonical(req.genres, str.lower),
+    "languages": canonical(req.languages, str.lower),
+    "subtitles": canonical(req.subtitles, str.upper),
+  })
 
 
-@app.post("/api/movie/{movie_id}")
-def movie_details(movie_id: int, req: MovieDetailsRequest = Body(...)):
+async def _movie_details(movie_id: int, req: MovieDetailsRequest) -> dict:
   radius = req.radius_km if req.radius_km and req.radius_km > 0 else 5
-  cinema_lat_expr = "COALESCE(c.lat, c.latitude)"
-  cinema_lon_expr = "COALESCE(c.lon, c.longitude)"
-  dist_expr = distance_sql(cinema_lat_expr, cinema_lon_expr)
-  sort_options = {"relevance", "distance", "earliest_showtime", "title_asc", "duration_asc"}
   sort_by = (req.sort_by or "relevance").lower()
-  if sort_by not in sort_options:
+  if sort_by not in MOVIE_DETAILS_SORTS:
     sort_by = "relevance"
 
   filter_date = None
@@ -733,65 +1442,61 @@ def movie_details(movie_id: int, req: MovieDetailsRequest = Body(...)):
     start_date = date.today()
     end_date = start_date + timedelta(days=6)
 
-  try:
-    conn = get_connection()
-  except Exception as exc:
-    logging.error("Database connection error during movie_details: %s", exc)
-    raise HTTPException(status_code=500, detail="Database connection error")
+  snapshot = snapshot_engine.current if snapshot_engine is not None else None
+  film = snapshot.film(movie_id) if snapshot is not None else None
+  if film is None:
+    film = await fetch_one(
+      "SELECT id, title, poster_url, duration, release_date, synopsis, director, genre, languages FROM films WHERE id = %(movie_id)s",
+      {"movie_id": movie_id},
+      "movie_details",
+    )
+  if not film:
+    raise HTTPException(status_code=404, detail="Film not found")
 
-  try:
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-      cur.execute(
-        "SELECT id, title, poster_url, duration, release_date, synopsis, director, genre, languages FROM films WHERE id = %(movie_id)s",
-        {"movie_id": movie_id},
-      )
-      film = cur.fetchone()
-      if not film:
-        raise HTTPException(status_code=404, detail="Film not found")
-
-      extra_showtime_filters = ""
-      if subtitles_filter:
-        extra_showtime_filters += " AND UPPER(COALESCE(s.diffusion_version, '')) = ANY(%(subtitles)s)"
-
-      query = f"""
-        SELECT
-          c.id AS cinema_id,
-          c.name,
-          c.address,
-          {cinema_lat_expr} AS lat,
-          {cinema_lon_expr} AS lon,
-          {dist_expr} AS distance_km,
-          s.start_date,
-          s.start_time,
-          s.diffusion_version,
-          s.format,
-          s.reservation_url
-        FROM showtimes s
-        JOIN cinemas c ON c.id = s.cinema_id
-        WHERE s.movie_id = %(movie_id)s
-          AND {cinema_lat_expr} IS NOT NULL
-          AND {cinema_lon_expr} IS NOT NULL
-          AND s.start_date BETWEEN %(start_date)s AND %(end_date)s
-          AND {dist_expr} <= %(radius_km)s
-          {extra_showtime_filters}
-        ORDER BY distance_km ASC, s.start_date ASC, s.start_time ASC;
-        """
-
-      params = {
-        "movie_id": movie_id,
-        "center_lat": req.lat,
-        "center_lon": req.lon,
-        "radius_km": radius,
-        "start_date": start_date,
-        "end_date": end_date,
-      }
-      if subtitles_filter:
-        params["subtitles"] = subtitles_filter
+  extra_showtime_filters = ""
+  if subtitles_filter:
+    extra_showtime_filters += " AND UPPER(COALESCE(sl.diffusion_version, '')) = ANY(%(subtitles)s)"
 
-      cur.execute(query, params)
-      rows = cur.fetchall()
-  finally:
-    conn.close()
+  params = {
+    "movie_id": movie_id,
+    "center_lat": req.lat,
+    "center_lon": req.lon,
+    "radius_km": radius,
+    "start_date": start_date,
+    "end_date": end_date,
+  }
+  nearby_cte = nearby_cinemas_cte(params, radius, nearest=req.nearest)
+
+  query = f"""
+    WITH {nearby_cte}
+    SELECT
+      sl.cinema_id,
+      sl.cinema_name AS name,
+      sl.address,
+      sl.lat,
+      sl.lon,
+      n.distance_km,
+      sl.start_date,
+      sl.start_time,
+      sl.diffusion_version,
+      sl.format,
+      sl.reservation_url
+    FROM nearby n
+    JOIN showtime_listing sl ON sl.cinema_id = n.cinema_id
+    WHERE sl.film_id = %(movie_id)s
+      AND sl.start_date BETWEEN %(start_date)s AND %(end_date)s
+      {extra_showtime_filters}
+    ORDER BY n.distance_km ASC, sl.start_date ASC, sl.start_time ASC;
+    """
+  if subtitles_filter:
+    params["subtitles"] = subtitles_filter
+
+  if snapshot is not None:
+    rows = snapshot.film_rows(
+      movie_id, req.lat, req.lon, radius, start_date, end_date, subtitles=subtitles_filter, nearest=req.nearest
+    )
+  else:
+    rows = await fetch_all(query, params, "movie_details")
 
   cinemas = {}
   for row in rows:
@@ -823,8 +1528,8 @@ def movie_details(movie_id: int, req: MovieDetailsRequest = Body(...)):
       cinemas[cinema_id] = cinema
 
     cinema["showtimes"].append({
-      "start_date": row["start_date"].isoformat() if isinstance(row["start_date"], date) else row["start_date"],
-      "start_time": row["start_time"].isoformat() if hasattr(row["start_time"], "isoformat") else row["start_time"],
+      "start_date": row["start_date"],
+      "start_time": row["start_time"],
       "diffusion_version": row.get("diffusion_version"),
       "format": row.get("format"),
       "reservation_url": row.get("reservation_url"),
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+migrate.py
+Versioned schema migrations: applies backend/migrations/NNNN_name.sql in order and
+records each version in the `schema_version` table.
+
+    python migrate.py status
+    python migrate.py upgrade [--to VERSION]
+
+A file whose first line is `-- migrate:no-transaction` runs statement by statement in
+autocommit mode, which `CREATE INDEX CONCURRENTLY` requires. Other files run in a
+single transaction together with their schema_version row.
+
+A failed `CREATE INDEX CONCURRENTLY` leaves an INVALID index behind, which `IF NOT
+EXISTS` would then silently keep. Before such a statement runs, an invalid index of
+the same name is dropped; after it, an index that is still invalid fails the upgrade.
+"""
+
+import argparse
+import logging
+import os
+import re
+import sys
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import psycopg2
+from psycopg2 import sql
+from dotenv import load_dotenv
+
+MIGRATIONS_DIR = Path(__file__).resolve().with_name("migrations")
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+
+# Arbitrary key for pg_advisory_lock so two upgrades never run concurrently.
+MIGRATION_LOCK_KEY = 73_540_001
+
+_FILENAME_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+_DOLLAR_TAG_RE = re.compile(r"\$[A-Za-z_]*\$")
+_CONCURRENT_INDEX_RE = re.compile(
+  r"^CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)",
+  re.IGNORECASE,
+)
+
+logger = logging.getLogger("migrate")
+
+
+class Migration(NamedTuple):
+  version: int
+  name: str
+  path: Path
+  transactional: bool
+
+
+def discover_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+  migrations: List[Migration] = []
+  for path in sorted(directory.glob("*.sql")):
+    match = _FILENAME_RE.match(path.name)
+    if not match:
+      logger.warning("Ignoring migration file with unexpected name: %s", path.name)
+      continue
+    with path.open(encoding="utf-8") as handle:
+      first_line = handle.readline().strip()
+    migrations.append(Migration(int(match.group(1)), match.group(2), path, first_line != NO_TRANSACTION_MARKER))
+
+  versions = [m.version for m in migrations]
+  if len(versions) != len(set(versions)):
+    raise RuntimeError("Duplicate migration version in %s" % directory)
+  return migrations
+
+
+def latest_version(directory: Path = MIGRATIONS_DIR) -> int:
+  migrations = discover_migrations(directory)
+  return migrations[-1].version if migrations else 0
+
+
+def split_statements(sql_text: str) -> List[str]:
+  """Split a SQL script on top-level `;`, ignoring `--` comments, quotes and $$ bodies."""
+  statements: List[str] = []
+  buf: List[str] = []
+  i, n = 0, len(sql_text)
+  dollar_tag: Optional[str] = None
+  in_quote = False
+
+  while i < n:
+    ch = sql_text[i]
+    if dollar_tag is not None:
+      if sql_text.startswith(dollar_tag, i):
+        buf.append(dollar_tag)
+        i += len(dollar_tag)
+        dollar_tag = None
+      else:
+        buf.append(ch)
+        i += 1
+      continue
+    if in_quote:
+      buf.append(ch)
+      i += 1
+      if ch == "'":
+        in_quote = False
+      continue
+    if sql_text.startswith("--", i):
+      end = sql_text.find("\n", i)
+      i = n if end == -1 else end
+      continue
+    if ch == "'":
+      in_quote = True
+    elif ch == "$":
+      match = _DOLLAR_TAG_RE.match(sql_text, i)
+      if match:
+        dollar_tag = match.group(0)
+        buf.append(dollar_tag)
+        i = match.end()
+        continue
+    elif ch == ";":
+      statement = "".join(buf).strip()
+      if statement:
+        statements.append(statement)
+      buf = []
+      i += 1
+      continue
+    buf.append(ch)
+    i += 1
+
+  statement = "".join(buf).strip()
+  if statement:
+    statements.append(statement)
+  return statements
+
+
+def ensure_version_table(conn) -> None:
+  with conn.cursor() as cur:
+    cur.execute(
+      """
+      CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+      );
+      """
+    )
+  conn.commit()
+
+
+def current_version(conn) -> Optional[int]:
+  """Highest applied version, 0 for an empty table, None when schema_version does not exist."""
+  with conn.cursor() as cur:
+    cur.execute("SELECT to_regclass('schema_version') IS NOT NULL;")
+    if not cur.fetchone()[0]:
+      conn.rollback()
+      return None
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version;")
+    version = cur.fetchone()[0]
+  conn.rollback()
+  return version
+
+
+def applied_versions(conn) -> List[int]:
+  with conn.cursor() as cur:
+    cur.execute("SELECT version FROM schema_version ORDER BY version;")
+    versions = [row[0] for row in cur.fetchall()]
+  conn.rollback()
+  return versions
+
+
+def _index_is_valid(cur, name: str) -> Optional[bool]:
+  """pg_index.indisvalid of the index `name` on the search_path, None when it does not exist."""
+  cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s);", (name,))
+  row = cur.fetchone()
+  return row[0] if row is not None else None
+
+
+def _execute_concurrent_index(cur, statement: str, name: str) -> None:
+  if _index_is_valid(cur, name) is False:
+    logger.warning("Dropping invalid index %s left by an interrupted build", name)
+    cur.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {};").format(sql.Identifier(name)))
+  cur.execute(statement)
+  if _index_is_valid(cur, name) is not True:
+    raise RuntimeError(f"Index {name} is missing or invalid after CREATE INDEX CONCURRENTLY")
+
+
+def _apply(conn, migration: Migration) -> None:
+  statements = split_statements(migration.path.read_text(encoding="utf-8"))
+  if migration.transactional:
+    with conn.cursor() as cur:
+      for statement in statements:
+        cur.execute(statement)
+      cur.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s);", (migration.version, migration.name))
+    conn.commit()
+    return
+
+  conn.autocommit = True
+  try:
+    with conn.cursor() as cur:
+      for statement in statements:
+        index = _CONCURRENT_INDEX_RE.match(statement)
+        if index is not None:
+          _execute_concurrent_index(cur, statement, index.group(1))
+        else:
+          cur.execute(statement)
+      cur.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s);", (migration.version, migration.name))
+  finally:
+    conn.autocommit = False
+
+
+def upgrade(conn, target: Optional[int] = None, directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+  """Apply every pending migration up to `target` (inclusive) and return them."""
+  ensure_version_table(conn)
+  conn.autocommit = True
+  with conn.cursor() as cur:
+    cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_KEY,))
+  conn.autocommit = False
+
+  applied: List[Migration] = []
+  try:
+    done = set(applied_versions(conn))
+    for migration in discover_migrations(directory):
+      if migration.version in done:
+        continue
+      if target is not None and migration.version > target:
+        break
+      logger.info("Applying migration %04d_%s", migration.version, migration.name)
+      try:
+        _apply(conn, migration)
+      except Exception:
+        if not conn.autocommit:
+          conn.rollback()
+        logger.error("Migration %04d_%s failed", migration.version, migration.name)
+        raise
+      applied.append(migration)
+  finally:
+    conn.autocommit = True
+    with conn.cursor() as cur:
+      cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_KEY,))
+    conn.autocommit = False
+  return applied
+
+
+def check_schema(conn, directory: Path = MIGRATIONS_DIR) -> bool:
+  """Return True when the database is at the latest migration, logging a warning otherwise."""
+  expected = latest_version(directory)
+  version = current_version(conn)
+  if version is None or version < expected:
+    logger.warning(
+      "Database schema is at version %s, expected %s: run `python migrate.py upgrade`",
+      version if version is not None else "none",
+      expected,
+    )
+    return False
+  return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+  subcommands = parser.add_subparsers(dest="command", required=True)
+  subcommands.add_parser("status", help="show applied and pending migrations")
+  upgrade_parser = subcommands.add_parser("upgrade", help="apply pending migrations")
+  upgrade_parser.add_argument("--to", type=int, default=None, help="stop after this version")
+  args = parser.parse_args(argv)
+
+  logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+  load_dotenv()
+  database_url = os.getenv("DATABASE_URL")
+  if not database_url:
+    raise RuntimeError("DATABASE_URL is not configured")
+
+  conn = psycopg2.connect(database_url)
+  try:
+    if args.command == "status":
+      version = current_version(conn)
+      done = set(applied_versions(conn)) if version is not None else set()
+      for migration in discover_migrations():
+        state = "applied" if migration.version in done else "pending"
+        mode = "" if migration.transactional else " (no transaction)"
+        print(f"{migration.version:04d}  {state:<8} {migration.name}{mode}")
+      return 0
+
+    applied = upgrade(conn, target=args.to)
+    if applied:
+      logger.info("Applied %d migration(s), schema now at version %d", len(applied), applied[-1].version)
+    else:
+      logger.info("Schema already up to date")
+    return 0
+  finally:
+    conn.close()
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,11 @@
+-- Extensions and tables used by /api/search_suggest.
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE TABLE IF NOT EXISTS geo_cities (
+  id SERIAL PRIMARY KEY,
+  name TEXT NOT NULL,
+  zipcode TEXT,
+  lat DOUBLE PRECISION NOT NULL,
+  lon DOUBLE PRECISION NOT NULL
+);
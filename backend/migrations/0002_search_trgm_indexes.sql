@@ -0,0 +1,7 @@
+-- migrate:no-transaction
+-- Trigram indexes for search_suggest, built without blocking writes.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_films_title_trgm ON films USING gin (title gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_films_original_title_trgm ON films USING gin (original_title gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cinemas_name_trgm ON cinemas USING gin (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cities_name_trgm ON geo_cities USING gin (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cities_zipcode_trgm ON geo_cities USING gin (zipcode gin_trgm_ops);
@@ -0,0 +1,5 @@
+-- Columns filled by scrap_movies (previously added by ensure_movie_columns).
+ALTER TABLE films
+  ADD COLUMN IF NOT EXISTS is_premiere BOOLEAN DEFAULT FALSE,
+  ADD COLUMN IF NOT EXISTS director TEXT,
+  ADD COLUMN IF NOT EXISTS original_title TEXT;
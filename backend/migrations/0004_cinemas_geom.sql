@@ -0,0 +1,13 @@
+-- Point geometry + GiST index for radius queries. Skipped when PostGIS is not
+-- installed: the API then falls back to a bounding-box scan.
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'postgis') THEN
+    ALTER TABLE cinemas ADD COLUMN IF NOT EXISTS geom geometry(Point, 4326);
+    UPDATE cinemas
+    SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
+    WHERE geom IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS idx_cinemas_geog_gist ON cinemas USING gist ((geom::geography));
+  END IF;
+END
+$$;
@@ -0,0 +1,11 @@
+-- Keep the most recently updated row for each showtime natural key.
+DELETE FROM showtimes s
+USING (
+  SELECT id,
+         ROW_NUMBER() OVER (
+           PARTITION BY cinema_id, movie_id, start_date, start_time, COALESCE(diffusion_version, '')
+           ORDER BY last_update DESC NULLS LAST, id DESC
+         ) AS rn
+  FROM showtimes
+) ranked
+WHERE s.id = ranked.id AND ranked.rn > 1;
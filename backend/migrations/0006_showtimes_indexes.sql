@@ -0,0 +1,6 @@
+-- migrate:no-transaction
+-- Natural key used by upsert_showtime's ON CONFLICT, plus the movies_nearby lookups.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_showtimes_natural_key
+  ON showtimes (cinema_id, movie_id, start_date, start_time, (COALESCE(diffusion_version, '')));
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_showtimes_date_cinema ON showtimes (start_date, cinema_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_showtimes_movie_date ON showtimes (movie_id, start_date);
@@ -0,0 +1,46 @@
+-- One row per showtime with everything movies_nearby / movie_details return, so the
+-- hot endpoints no longer join films, cinemas and the genre/language tables per request.
+-- Refreshed (CONCURRENTLY, thanks to the unique index) at the end of the showtime scrape.
+CREATE MATERIALIZED VIEW IF NOT EXISTS showtime_listing AS
+SELECT
+  s.id AS showtime_id,
+  s.movie_id AS film_id,
+  m.title,
+  COALESCE(m.original_title, '') AS original_title,
+  m.poster_url,
+  m.duration,
+  m.release_date,
+  m.synopsis,
+  m.genre,
+  m.languages,
+  COALESCE(fg.names, '{}') AS genre_names,
+  COALESCE(fl.names, '{}') AS language_names,
+  s.cinema_id,
+  c.name AS cinema_name,
+  c.address,
+  c.latitude AS lat,
+  c.longitude AS lon,
+  s.start_date,
+  s.start_time,
+  s.diffusion_version,
+  s.format,
+  s.reservation_url
+FROM showtimes s
+JOIN cinemas c ON c.id = s.cinema_id
+JOIN films m ON m.id = s.movie_id
+LEFT JOIN LATERAL (
+  SELECT ARRAY_AGG(DISTINCT g.name) AS names
+  FROM film_genre x
+  JOIN genre g ON g.id = x.genre_id
+  WHERE x.film_id = m.id_allocine
+) fg ON TRUE
+LEFT JOIN LATERAL (
+  SELECT ARRAY_AGG(DISTINCT l.name) AS names
+  FROM film_language x
+  JOIN language l ON l.id = x.language_id
+  WHERE x.film_id = m.id_allocine
+) fl ON TRUE;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_showtime_listing_id ON showtime_listing (showtime_id);
+CREATE INDEX IF NOT EXISTS idx_showtime_listing_cinema_date ON showtime_listing (cinema_id, start_date);
+CREATE INDEX IF NOT EXISTS idx_showtime_listing_film_date ON showtime_listing (film_id, start_date);
@@ -0,0 +1,10 @@
+-- Single-row counter bumped by the scrapers each time they publish new data.
+-- The API polls it and drops every response derived from an older generation.
+CREATE TABLE IF NOT EXISTS data_generation (
+  id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  generation BIGINT NOT NULL DEFAULT 1,
+  source TEXT,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO data_generation (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,12 @@
+-- Immutable accent/case folding for search_suggest. unaccent() itself is only STABLE
+-- (it depends on search_path), so it cannot back an expression index; pinning the
+-- dictionary and the schema makes the wrapper safe to declare IMMUTABLE.
+CREATE OR REPLACE FUNCTION immutable_unaccent(text)
+  RETURNS text
+  LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
+CREATE OR REPLACE FUNCTION search_normalize(text)
+  RETURNS text
+  LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$ SELECT lower(public.immutable_unaccent($1)) $$;
@@ -0,0 +1,12 @@
+-- migrate:no-transaction
+-- Trigram indexes on the search_normalize() expressions search_suggest filters and
+-- ranks on. They replace the raw-column indexes of 0002, which those expressions
+-- could not use (the zipcode one is kept: zipcodes are matched as typed).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_films_title_norm_trgm ON films USING gin (search_normalize(title) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_films_original_title_norm_trgm ON films USING gin (search_normalize(original_title) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cinemas_name_norm_trgm ON cinemas USING gin (search_normalize(name) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cities_name_norm_trgm ON geo_cities USING gin (search_normalize(name) gin_trgm_ops);
+DROP INDEX CONCURRENTLY IF EXISTS idx_films_title_trgm;
+DROP INDEX CONCURRENTLY IF EXISTS idx_films_original_title_trgm;
+DROP INDEX CONCURRENTLY IF EXISTS idx_cinemas_name_trgm;
+DROP INDEX CONCURRENTLY IF EXISTS idx_cities_name_trgm;
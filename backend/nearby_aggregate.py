@@ -0,0 +1,532 @@
+"""Post-processing of movies_nearby rows: film -> cinema -> showtime groups, the
+per-showtime filters and the min-distance / earliest-showtime reductions used to sort.
+
+Rows are tuples in NEARBY_COLUMNS order. `MovieAggregator` groups them one by one as
+they stream from the cursor. `aggregate_movies_numpy` keeps the candidate showtimes
+as column arrays (epoch seconds, film index, cinema index, version code) and runs the
+filters and reductions as array operations. Both return the same list of movies,
+each with a `_meta` dict for main.py's sort.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+  import numpy as np
+except ImportError:  # optional: main.py falls back to the per-row loop
+  np = None
+
+NUMPY_AVAILABLE = np is not None
+
+# Select list of the movies_nearby query, and the tuple layout of its rows.
+NEARBY_COLUMNS = (
+  "film_id",
+  "title",
+  "original_title",
+  "poster_url",
+  "duration",
+  "release_date",
+  "synopsis",
+  "genres",
+  "languages",
+  "cinema_id",
+  "cinema_name",
+  "address",
+  "lat",
+  "lon",
+  "distance_km",
+  "start_date",
+  "start_time",
+  "diffusion_version",
+  "format",
+  "reservation_url",
+)
+(
+  FILM_ID,
+  TITLE,
+  ORIGINAL_TITLE,
+  POSTER_URL,
+  DURATION,
+  RELEASE_DATE,
+  SYNOPSIS,
+  GENRES,
+  LANGUAGES,
+  CINEMA_ID,
+  CINEMA_NAME,
+  ADDRESS,
+  LAT,
+  LON,
+  DISTANCE_KM,
+  START_DATE,
+  START_TIME,
+  DIFFUSION_VERSION,
+  FORMAT,
+  RESERVATION_URL,
+) = range(len(NEARBY_COLUMNS))
+
+# Film ordering per sort_by: (SQL expression over the per-film aggregates, value kind).
+# Every key ends with the film id so the order is total and usable as a keyset.
+# Text compares under COLLATE "C" (code point order, like Python's str comparison in
+# movie_sort_key), so a cursor issued by the SQL path pages the same way on the
+# snapshot/cache path and back.
+_TITLE = 'title COLLATE "C"'
+NEARBY_SORT_KEYS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+  "relevance": ((_TITLE, "text"),),
+  "title_asc": (('LOWER(title) COLLATE "C"', "text"), (_TITLE, "text")),
+  "distance": (("min_distance", "float"), (_TITLE, "text")),
+  "earliest_showtime": (("earliest_at", "timestamp"), (_TITLE, "text")),
+  "duration_asc": (("COALESCE(duration, 2147483647)", "int"), (_TITLE, "text")),
+}
+_NO_DURATION = 2147483647
+
+# date.toordinal() of 1970-01-01, to turn (ordinal day, seconds) into epoch seconds.
+_EPOCH_ORDINAL = 719163
+
+
+def split_to_list(value) -> List[str]:
+  if value is None:
+    return []
+  if isinstance(value, list):
+    result: List[str] = []
+    for item in value:
+      if item is None:
+        continue
+      text = str(item).strip()
+      if text:
+        result.append(text)
+    return result
+  if isinstance(value, str):
+    return [segment.strip() for segment in value.split(",") if segment.strip()]
+  return []
+
+
+def showtime_timestamp(start_date_value, start_time_value) -> Optional[float]:
+  try:
+    if isinstance(start_date_value, date):
+      day = start_date_value
+    elif isinstance(start_date_value, str):
+      day = date.fromisoformat(start_date_value)
+    else:
+      return None
+
+    if hasattr(start_time_value, "hour") and hasattr(start_time_value, "minute"):
+      hour = int(start_time_value.hour)
+      minute = int(start_time_value.minute)
+      second = int(getattr(start_time_value, "second", 0))
+    elif isinstance(start_time_value, str):
+      parts = start_time_value.split(":")
+      if len(parts) < 2:
+        return None
+      hour = int(parts[0])
+      minute = int(parts[1])
+      second = int(parts[2]) if len(parts) > 2 else 0
+    else:
+      return None
+
+    dt_value = datetime(day.year, day.month, day.day, hour, minute, second)
+    return dt_value.timestamp()
+  except Exception:
+    return None
+
+
+def _day_and_seconds(start_date_value, start_time_value) -> Tuple[int, int]:
+  """(ordinal day, seconds since midnight) of a showtime, (-1, -1) when unparseable."""
+  try:
+    if isinstance(start_date_value, date):
+      day = start_date_value.toordinal()
+    elif isinstance(start_date_value, str):
+      day = date.fromisoformat(start_date_value).toordinal()
+    else:
+      return -1, -1
+
+    if hasattr(start_time_value, "hour") and hasattr(start_time_value, "minute"):
+      seconds = int(start_time_value.hour) * 3600 + int(start_time_value.minute) * 60 + int(getattr(start_time_value, "second", 0))
+    elif isinstance(start_time_value, str):
+      parts = start_time_value.split(":")
+      if len(parts) < 2:
+        return -1, -1
+      seconds = int(parts[0]) * 3600 + int(parts[1]) * 60 + (int(parts[2]) if len(parts) > 2 else 0)
+    else:
+      return -1, -1
+    return day, seconds
+  except Exception:
+    return -1, -1
+
+
+def _new_movie(row: tuple) -> dict:
+  # The payload was always built from a `genre` key the query never selected, so
+  # `genre` is None and `genres` empty; kept as-is for API compatibility.
+  genres_list: List[str] = []
+  languages_list = split_to_list(row[LANGUAGES])
+  return {
+    "id": row[FILM_ID],
+    "title": row[TITLE],
+    "original_title": row[ORIGINAL_TITLE] or None,
+    "poster": row[POSTER_URL],
+    "duration": row[DURATION],
+    "release_date": row[RELEASE_DATE],
+    "synopsis": row[SYNOPSIS],
+    "genre": None,
+    "genres": genres_list,
+    "languages": languages_list,
+    "language": languages_list[0] if languages_list else None,
+    "cinemas": [],
+  }
+
+
+def _new_cinema(row: tuple) -> dict:
+  return {
+    "id": row[CINEMA_ID],
+    "name": row[CINEMA_NAME],
+    "address": row[ADDRESS],
+    "lat": float(row[LAT]) if row[LAT] is not None else None,
+    "lon": float(row[LON]) if row[LON] is not None else None,
+    "distance_km": float(row[DISTANCE_KM]) if row[DISTANCE_KM] is not None else None,
+    "showtimes": [],
+  }
+
+
+def _showtime(row: tuple) -> dict:
+  # date/time values are kept as-is: FastJSONResponse serializes them to ISO strings.
+  return {
+    "start_date": row[START_DATE],
+    "start_time": row[START_TIME],
+    "diffusion_version": row[DIFFUSION_VERSION],
+    "format": row[FORMAT],
+    "reservation_url": row[RESERVATION_URL],
+  }
+
+
+def _movie_passes(movie: dict, duration_max: Optional[int], languages_filter_set: set, genres_filter_set: set) -> bool:
+  movie_duration = movie.get("duration")
+  if duration_max is not None and isinstance(movie_duration, int) and movie_duration > duration_max:
+    return False
+
+  if languages_filter_set:
+    movie_languages = [lang.lower() for lang in (movie.get("languages") or [])]
+    if movie_languages and not languages_filter_set.intersection(movie_languages):
+      return False
+
+  if genres_filter_set:
+    movie_genres = [genre.lower() for genre in (movie.get("genres") or [])]
+    if movie_genres and not genres_filter_set.intersection(movie_genres):
+      return False
+  return True
+
+
+class MovieAggregator:
+  """Incremental film -> cinema -> showtime grouping of movies_nearby rows.
+
+  Rows are fed one at a time (typically straight from a server-side cursor) and the
+  per-showtime filters run on arrival, so only accepted showtimes are kept: memory is
+  bounded by the response rather than by the number of candidate rows. Films and
+  their cinemas are found through dicts instead of scanning each film's cinema list.
+  """
+
+  def __init__(
+    self,
+    filter_date: Optional[date] = None,
+    subtitles: Sequence[str] = (),
+    duration_max: Optional[int] = None,
+    languages: Sequence[str] = (),
+    genres: Sequence[str] = (),
+    max_distance_km: Optional[float] = None,
+  ) -> None:
+    self.filter_day = filter_date.toordinal() if filter_date else None
+    self.subtitle_set = set(subtitles)
+    self.duration_max = duration_max
+    self.languages_filter_set = set(languages)
+    self.genres_filter_set = set(genres)
+    self.max_distance_km = max_distance_km
+    self.rows_seen = 0
+    self.last_row: Optional[tuple] = None
+    # film id -> movie dict, or None when the film failed the film-level filters
+    self._movies: Dict[int, Optional[dict]] = {}
+    self._cinemas: Dict[Tuple[int, int], Optional[dict]] = {}
+    self._earliest: Dict[int, float] = {}
+    self._versions: Dict[Optional[str], bool] = {}
+
+  def _version_ok(self, version: Optional[str]) -> bool:
+    accepted = self._versions.get(version)
+    if accepted is None:
+      accepted = self._versions[version] = (version or "").strip().upper() in self.subtitle_set
+    return accepted
+
+  def add(self, row: tuple) -> None:
+    self.rows_seen += 1
+    self.last_row = row
+    film_id = row[FILM_ID]
+    movie = self._movies.get(film_id, False)
+    if movie is False:
+      movie = _new_movie(row)
+      if not _movie_passes(movie, self.duration_max, self.languages_filter_set, self.genres_filter_set):
+        movie = None
+      self._movies[film_id] = movie
+    if movie is None:
+      return
+
+    key = (film_id, row[CINEMA_ID])
+    cinema = self._cinemas.get(key, False)
+    if cinema is False:
+      cinema = _new_cinema(row)
+      distance = cinema["distance_km"]
+      if self.max_distance_km is not None and distance is not None and distance > self.max_distance_km:
+        cinema = None
+      else:
+        # Registered on first sight so cinemas keep the row order even if their first rows are filtered out.
+        movie["cinemas"].append(cinema)
+      self._cinemas[key] = cinema
+    if cinema is None:
+      return
+
+    day, seconds = _day_and_seconds(row[START_DATE], row[START_TIME])
+    if self.filter_day is not None and day != self.filter_day:
+      return
+    if self.subtitle_set and not self._version_ok(row[DIFFUSION_VERSION]):
+      return
+
+    cinema["showtimes"].append(_showtime(row))
+    if day >= 0:
+      timestamp = float((day - _EPOCH_ORDINAL) * 86400 + seconds)
+      if timestamp < self._earliest.get(film_id, float("inf")):
+        self._earliest[film_id] = timestamp
+
+  def extend(self, rows: Iterable[tuple]) -> "MovieAggregator":
+    for row in rows:
+      self.add(row)
+    return self
+
+  def result(self) -> List[dict]:
+    processed_movies: List[dict] = []
+    for film_id, movie in self._movies.items():
+      if movie is None:
+        continue
+      cinemas = [cinema for cinema in movie["cinemas"] if cinema["showtimes"]]
+      if not cinemas:
+        continue
+      distances = [cinema["distance_km"] for cinema in cinemas if cinema["distance_km"] is not None]
+      movie["cinemas"] = cinemas
+      movie["_meta"] = {
+        "min_distance": min(distances) if distances else None,
+        "earliest_ts": self._earliest.get(film_id),
+      }
+      processed_movies.append(movie)
+    return processed_movies
+
+  def take(self) -> List[dict]:
+    """Return the films aggregated so far, as `result` does, and forget them.
+
+    For rows grouped by film, calling it whenever the film id changes hands out each
+    film as soon as its last row was read and keeps memory bounded by one film.
+    """
+    movies = self.result()
+    self._movies.clear()
+    self._cinemas.clear()
+    self._earliest.clear()
+    return movies
+
+
+def aggregate_movies_loop(
+  rows: Iterable[tuple],
+  filter_date: Optional[date] = None,
+  subtitles: Sequence[str] = (),
+  duration_max: Optional[int] = None,
+  languages: Sequence[str] = (),
+  genres: Sequence[str] = (),
+  max_distance_km: Optional[float] = None,
+) -> List[dict]:
+  aggregator = MovieAggregator(
+    filter_date=filter_date,
+    subtitles=subtitles,
+    duration_max=duration_max,
+    languages=languages,
+    genres=genres,
+    max_distance_km=max_distance_km,
+  )
+  return aggregator.extend(rows).result()
+
+
+def aggregate_movies_numpy(
+  rows: Iterable[tuple],
+  filter_date: Optional[date] = None,
+  subtitles: Sequence[str] = (),
+  duration_max: Optional[int] = None,
+  languages: Sequence[str] = (),
+  genres: Sequence[str] = (),
+  max_distance_km: Optional[float] = None,
+) -> List[dict]:
+  """Vectorized twin of `MovieAggregator`.
+
+  A single pass over the rows interns films, (film, cinema) groups and diffusion
+  versions and records each showtime's columns; every filter then becomes a boolean
+  mask and the per-film reductions use `np.minimum.at`. `earliest_ts` is a naive epoch
+  (UTC arithmetic on local dates) rather than `datetime.timestamp()`: it is only used
+  to order films, and both give the same order outside DST transitions.
+  """
+  movies: List[dict] = []
+  film_slots: Dict[int, int] = {}
+  groups: List[dict] = []
+  group_slots: Dict[Tuple[int, int], int] = {}
+  group_film: List[int] = []  # film slot of each (film, cinema) group
+  versions: Dict[Optional[str], int] = {}
+  source_rows: List[tuple] = []
+
+  show_group: List[int] = []
+  show_day: List[int] = []
+  show_seconds: List[int] = []
+  show_version: List[int] = []
+
+  for row in rows:
+    film_id = row[FILM_ID]
+    film_slot = film_slots.get(film_id)
+    if film_slot is None:
+      film_slot = film_slots[film_id] = len(movies)
+      movies.append(_new_movie(row))
+
+    key = (film_id, row[CINEMA_ID])
+    group_slot = group_slots.get(key)
+    if group_slot is None:
+      group_slot = group_slots[key] = len(groups)
+      groups.append(_new_cinema(row))
+      group_film.append(film_slot)
+
+    version = row[DIFFUSION_VERSION]
+    version_code = versions.get(version)
+    if version_code is None:
+      version_code = versions[version] = len(versions)
+
+    day, seconds = _day_and_seconds(row[START_DATE], row[START_TIME])
+    show_group.append(group_slot)
+    show_day.append(day)
+    show_seconds.append(seconds)
+    show_version.append(version_code)
+    source_rows.append(row)
+
+  if not source_rows:
+    return []
+
+  st_group = np.asarray(show_group, dtype=np.int64)
+  st_day = np.asarray(show_day, dtype=np.int64)
+  st_seconds = np.asarray(show_seconds, dtype=np.int64)
+  st_version = np.asarray(show_version, dtype=np.int64)
+  st_valid = st_day >= 0
+  st_epoch = (st_day - _EPOCH_ORDINAL) * 86400 + st_seconds
+
+  group_film_arr = np.asarray(group_film, dtype=np.int64)
+  group_distance = np.array(
+    [g["distance_km"] if g["distance_km"] is not None else np.nan for g in groups], dtype=np.float64
+  )
+  st_film = group_film_arr[st_group]
+
+  # Film-level filters (duration, languages, genres) are evaluated once per film.
+  languages_filter_set = set(languages)
+  genres_filter_set = set(genres)
+  film_ok = np.fromiter(
+    (_movie_passes(movie, duration_max, languages_filter_set, genres_filter_set) for movie in movies),
+    dtype=bool,
+    count=len(movies),
+  )
+
+  mask = film_ok[st_film]
+  if max_distance_km is not None:
+    group_in_range = ~(group_distance > max_distance_km)  # NaN distances are kept
+    mask &= group_in_range[st_group]
+  if filter_date:
+    mask &= st_day == filter_date.toordinal()
+  if subtitles:
+    wanted = set(subtitles)
+    accepted = [code for version, code in versions.items() if (version or "").strip().upper() in wanted]
+    mask &= np.isin(st_version, accepted)
+
+  kept = np.flatnonzero(mask)
+  if kept.size == 0:
+    return []
+
+  earliest = np.full(len(movies), np.inf)
+  timed = kept[st_valid[kept]]
+  np.minimum.at(earliest, st_film[timed], st_epoch[timed])
+
+  group_count = np.bincount(st_group[kept], minlength=len(groups))
+  group_kept = group_count > 0
+  min_distance = np.full(len(movies), np.inf)
+  measured = np.flatnonzero(group_kept & ~np.isnan(group_distance))
+  np.minimum.at(min_distance, group_film_arr[measured], group_distance[measured])
+
+  # Kept showtimes regrouped by (film, cinema) group, preserving row order within each.
+  ordered = kept[np.argsort(st_group[kept], kind="stable")]
+  bounds = np.concatenate(([0], np.cumsum(group_count)))
+
+  new_cinemas: List[List[dict]] = [[] for _ in movies]
+  for group_slot in np.flatnonzero(group_kept).tolist():
+    positions = ordered[bounds[group_slot]:bounds[group_slot + 1]].tolist()
+    cinema = groups[group_slot]
+    # Showtime dicts are only built for the rows that survived the masks.
+    new_cinemas[group_film[group_slot]].append({**cinema, "showtimes": [_showtime(source_rows[p]) for p in positions]})
+
+  processed_movies: List[dict] = []
+  for film_slot, movie in enumerate(movies):
+    cinemas = new_cinemas[film_slot]
+    if not cinemas:
+      continue
+    earliest_ts = float(earliest[film_slot]) if np.isfinite(earliest[film_slot]) else None
+    distance = float(min_distance[film_slot]) if np.isfinite(min_distance[film_slot]) else None
+    movie["cinemas"] = cinemas
+    movie["_meta"] = {"min_distance": distance, "earliest_ts": earliest_ts}
+    processed_movies.append(movie)
+  return processed_movies
+
+
+def aggregate_movies(rows: Iterable[tuple], vectorized: bool = True, **filters) -> List[dict]:
+  if vectorized and NUMPY_AVAILABLE:
+    return aggregate_movies_numpy(rows, **filters)
+  return aggregate_movies_loop(rows, **filters)
+
+
+def movie_sort_key(movie: dict, sort_by: str) -> tuple:
+  """Python twin of NEARBY_SORT_KEYS for aggregated movies (snapshot path)."""
+  title = movie.get("title") or ""
+  meta = movie["_meta"]
+  if sort_by == "title_asc":
+    key: tuple = (title.lower(), title)
+  elif sort_by == "distance":
+    key = (meta["min_distance"] if meta["min_distance"] is not None else float("inf"), title)
+  elif sort_by == "earliest_showtime":
+    earliest = meta["earliest_ts"]
+    key = (datetime(1970, 1, 1) + timedelta(seconds=earliest) if earliest is not None else datetime.max, title)
+  elif sort_by == "duration_asc":
+    duration = movie.get("duration")
+    key = (duration if isinstance(duration, int) else _NO_DURATION, title)
+  else:
+    key = (title,)
+  return key + (movie["id"],)
+
+
+def encode_cursor(sort_by: str, key: Sequence[Any]) -> str:
+  """Opaque keyset cursor: the sort key of the last film returned."""
+  values = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+  payload = json.dumps({"sort": sort_by, "after": values}, separators=(",", ":"), ensure_ascii=False)
+  return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> tuple:
+  """Decode a cursor for `sort_by`; raises ValueError when it is malformed or for another sort."""
+  try:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    values = payload["after"]
+    if payload["sort"] != sort_by:
+      raise ValueError("cursor was issued for another sort order")
+  except (KeyError, TypeError, UnicodeError, json.JSONDecodeError, binascii.Error) as exc:
+    raise ValueError("malformed cursor") from exc
+
+  kinds = [kind for _, kind in NEARBY_SORT_KEYS[sort_by]] + ["int"]
+  if not isinstance(values, list) or len(values) != len(kinds):
+    raise ValueError("malformed cursor")
+  converters = {"text": str, "float": float, "int": int, "timestamp": datetime.fromisoformat}
+  try:
+    return tuple(converters[kind](value) for kind, value in zip(kinds, values))
+  except (TypeError, ValueError) as exc:
+    raise ValueError("malformed cursor") from exc
@@ -0,0 +1,76 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Film attributes of the movies_nearby payload that `fields` can select (id is always sent).
+FILM_FIELDS = (
+  "title",
+  "original_title",
+  "poster",
+  "duration",
+  "release_date",
+  "synopsis",
+  "genre",
+  "genres",
+  "languages",
+  "language",
+)
+# List views do not show the synopsis: compact responses leave it out unless asked for.
+COMPACT_DEFAULT_FIELDS = tuple(field for field in FILM_FIELDS if field != "synopsis")
+
+CINEMA_FIELDS = ("id", "name", "address", "lat", "lon", "distance_km")
+SHOWTIME_COLUMNS = ("film", "cinema", "start_date", "start_time", "diffusion_version", "format", "reservation_url")
+
+
+def parse_fields(values: Optional[Sequence[str]]) -> Optional[List[str]]:
+  """Known film fields from `fields=a,b` or repeated `fields=a&fields=b`; None when not given."""
+  if not values:
+    return None
+  requested = {part.strip().lower() for value in values for part in str(value).split(",") if part.strip()}
+  return [field for field in FILM_FIELDS if field in requested]
+
+
+def select_film_fields(movies: Iterable[dict], fields: Sequence[str]) -> List[dict]:
+  """Full-format movies restricted to `fields` (plus id and cinemas)."""
+  keep = {"id", "cinemas", *fields}
+  return [{key: value for key, value in movie.items() if key in keep} for movie in movies]
+
+
+def compact_movies(movies: Iterable[dict], fields: Sequence[str] = COMPACT_DEFAULT_FIELDS) -> Dict[str, object]:
+  """Deduplicated movies_nearby body: films and cinemas once, showtimes by index.
+
+  `films` and `cinemas` are lookup tables; each showtime row follows SHOWTIME_COLUMNS
+  and points into them, so a cinema showing many films is sent once. Rows keep the
+  full format's order (films in result order, then cinemas, then time).
+  """
+  films: List[dict] = []
+  cinemas: List[dict] = []
+  cinema_slots: Dict[int, int] = {}
+  rows: List[list] = []
+
+  for movie in movies:
+    film_slot = len(films)
+    film = {"id": movie["id"]}
+    for field in fields:
+      film[field] = movie.get(field)
+    films.append(film)
+
+    for cinema in movie.get("cinemas", []):
+      cinema_slot = cinema_slots.get(cinema["id"])
+      if cinema_slot is None:
+        cinema_slot = cinema_slots[cinema["id"]] = len(cinemas)
+        cinemas.append({field: cinema.get(field) for field in CINEMA_FIELDS})
+      for show in cinema.get("showtimes", []):
+        rows.append([
+          film_slot,
+          cinema_slot,
+          show.get("start_date"),
+          show.get("start_time"),
+          show.get("diffusion_version"),
+          show.get("format"),
+          show.get("reservation_url"),
+        ])
+
+  return {
+    "films": films,
+    "cinemas": cinemas,
+    "showtimes": {"columns": list(SHOWTIME_COLUMNS), "rows": rows},
+  }
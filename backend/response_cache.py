@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from fast_json import dumps
+
+
+def quantize(value: float, grid: float) -> float:
+  """Snap a coordinate to the cache grid (e.g. 0.005° ≈ 550 m of latitude)."""
+  if grid <= 0:
+    return value
+  return round(round(value / grid) * grid, 6)
+
+
+def _estimate_size(value: Any) -> int:
+  return len(dumps(value))
+
+
+class ResponseCache:
+  """Thread-safe LRU cache of endpoint responses, bounded by entries, bytes and age.
+
+  Every entry is tagged with the data generation it was computed from; `set_generation`
+  drops the whole cache when the scrapers publish a new one, and `get` ignores entries
+  from another generation.
+  """
+
+  def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024, ttl: float = 600.0) -> None:
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+    self.ttl = ttl
+    self.generation: Optional[int] = None
+    self._entries: "OrderedDict[Hashable, Tuple[float, Optional[int], int, Any]]" = OrderedDict()
+    self._bytes = 0
+    self._lock = threading.Lock()
+    self._hits = 0
+    self._misses = 0
+    self._evictions = 0
+    self._expirations = 0
+    self._invalidations = 0
+
+  def get(self, key: Hashable) -> Optional[Any]:
+    now = time.monotonic()
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        self._misses += 1
+        return None
+      stored_at, generation, size, value = entry
+      if now - stored_at > self.ttl or generation != self.generation:
+        self._drop(key, size)
+        self._expirations += 1
+        self._misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self._hits += 1
+      return value
+
+  def put(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+    """Store `value`; skipped when it was computed from an outdated generation."""
+    size = _estimate_size(value)
+    if size > self.max_bytes:
+      return
+    with self._lock:
+      if generation != self.generation:
+        return
+      previous = self._entries.pop(key, None)
+      if previous is not None:
+        self._bytes -= previous[2]
+      self._entries[key] = (time.monotonic(), generation, size, value)
+      self._bytes += size
+      while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+        _, (_, _, evicted_size, _) = self._entries.popitem(last=False)
+        self._bytes -= evicted_size
+        self._evictions += 1
+
+  def set_generation(self, generation: Optional[int]) -> bool:
+    """Record the current data generation, clearing the cache when it changed."""
+    with self._lock:
+      if generation == self.generation:
+        return False
+      self.generation = generation
+      self._entries.clear()
+      self._bytes = 0
+      self._invalidations += 1
+      return True
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+      self._bytes = 0
+
+  def _drop(self, key: Hashable, size: int) -> None:
+    del self._entries[key]
+    self._bytes -= size
+
+  def stats(self) -> dict:
+    with self._lock:
+      lookups = self._hits + self._misses
+      return {
+        "generation": self.generation,
+        "entries": len(self._entries),
+        "max_entries": self.max_entries,
+        "bytes": self._bytes,
+        "max_bytes": self.max_bytes,
+        "ttl_seconds": self.ttl,
+        "hits": self._hits,
+        "misses": self._misses,
+        "hit_ratio": round(self._hits / lookups, 3) if lookups else 0.0,
+        "evictions": self._evictions,
+        "expirations": self._expirations,
+        "invalidations": self._invalidations,
+      }
+
+
+def response_cache_from_env(env) -> ResponseCache:
+  return ResponseCache(
+    max_entries=int(env.get("RESPONSE_CACHE_MAX_ENTRIES", 512)),
+    max_bytes=int(env.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    ttl=float(env.get("RESPONSE_CACHE_TTL_SECONDS", 600)),
+  )
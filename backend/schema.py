@@ -0,0 +1,37 @@
+from typing import Optional
+
+# Unique index expression on showtimes (see migrations/0006_showtimes_indexes.sql),
+# used as the ON CONFLICT target of the scrapers' upserts.
+SHOWTIMES_NATURAL_KEY = "cinema_id, movie_id, start_date, start_time, (COALESCE(diffusion_version, ''))"
+
+
+def refresh_showtime_listing(conn) -> None:
+  """Rebuild the showtime_listing materialized view without blocking API reads."""
+  with conn.cursor() as cur:
+    cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY showtime_listing;")
+  conn.commit()
+
+
+def publish_data_generation(conn, source: str) -> int:
+  """Bump the data generation so API caches built on older data are dropped."""
+  with conn.cursor() as cur:
+    cur.execute(
+      "UPDATE data_generation SET generation = generation + 1, source = %s, updated_at = now() RETURNING generation;",
+      (source,),
+    )
+    row = cur.fetchone()
+  conn.commit()
+  return row[0] if row else 0
+
+
+def current_data_generation(conn) -> Optional[int]:
+  """Current generation, None while migration 0008 has not been applied."""
+  with conn.cursor() as cur:
+    cur.execute("SELECT to_regclass('data_generation') IS NOT NULL;")
+    if not cur.fetchone()[0]:
+      conn.rollback()
+      return None
+    cur.execute("SELECT generation FROM data_generation WHERE id = 1;")
+    row = cur.fetchone()
+  conn.rollback()
+  return row[0] if row else None
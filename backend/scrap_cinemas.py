@@ -10,6 +10,8 @@ import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 
+from schema import publish_data_generation
+
 geolocator = Nominatim(user_agent="cinema_app")
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
@@ -84,21 +86,47 @@ def geocode_address(cinema_name, raw_address):
 
   return None, None, "failed"
 
-def insert_cinema(cursor, conn, cinema_id, name, address, latitude, longitude, precision):
-  query = """
-  INSERT INTO cinemas (id_allocine, name, address, latitude, longitude, geocode_precision)
-  VALUES (%s, %s, %s, %s, %s, %s)
-  ON CONFLICT (id_allocine) DO UPDATE
-  SET name = EXCLUDED.name,
-      address = EXCLUDED.address,
-      latitude = EXCLUDED.latitude,
-      longitude = EXCLUDED.longitude,
-      geocode_precision = EXCLUDED.geocode_precision;
-  """
-  cursor.execute(query, (cinema_id, name, address, latitude, longitude, precision))
+def has_postgis(conn_params):
+  """Vrai si l'extension PostGIS est installée (la colonne geom est alors maintenue)."""
+  conn = psycopg2.connect(**conn_params)
+  try:
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")
+    return cursor.fetchone() is not None
+  finally:
+    conn.close()
+
+def insert_cinema(cursor, conn, cinema_id, name, address, latitude, longitude, precision, with_geom=False):
+  if with_geom:
+    query = """
+    INSERT INTO cinemas (id_allocine, name, address, latitude, longitude, geocode_precision, geom)
+    VALUES (%s, %s, %s, %s, %s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326))
+    ON CONFLICT (id_allocine) DO UPDATE
+    SET name = EXCLUDED.name,
+        address = EXCLUDED.address,
+        latitude = EXCLUDED.latitude,
+        longitude = EXCLUDED.longitude,
+        geocode_precision = EXCLUDED.geocode_precision,
+        geom = EXCLUDED.geom,
+        last_update = now();
+    """
+    cursor.execute(query, (cinema_id, name, address, latitude, longitude, precision, longitude, latitude))
+  else:
+    query = """
+    INSERT INTO cinemas (id_allocine, name, address, latitude, longitude, geocode_precision)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (id_allocine) DO UPDATE
+    SET name = EXCLUDED.name,
+        address = EXCLUDED.address,
+        latitude = EXCLUDED.latitude,
+        longitude = EXCLUDED.longitude,
+        geocode_precision = EXCLUDED.geocode_precision,
+        last_update = now();
+    """
+    cursor.execute(query, (cinema_id, name, address, latitude, longitude, precision))
   conn.commit()
 
-def process_cinema(cinema, conn_lock, conn_params):
+def process_cinema(cinema, conn_lock, conn_params, with_geom=False):
     # Each thread creates its own connection and cursor
     conn = psycopg2.connect(**conn_params)
     cursor = conn.cursor()
@@ -106,7 +134,7 @@ def process_cinema(cinema, conn_lock, conn_params):
     if lat and lon:
         logger.info(f"✅ {cinema['name']} -> {lat}, {lon} ({precision})")
         with conn_lock:
-            insert_cinema(cursor, conn, cinema["id"], cinema["name"], cinema["address"], lat, lon, precision)
+            insert_cinema(cursor, conn, cinema["id"], cinema["name"], cinema["address"], lat, lon, precision, with_geom)
             logger.info(f"➡️ {cinema['name']} inséré en BDD avec : {precision}")
     else:
         logger.error(f"⚠️ Échec géocodage pour {cinema['name']}")
@@ -121,18 +149,27 @@ def main():
     conn_params = {"dsn": database_url} if database_url else {}
     departements = api.get_departements()
     conn_lock = threading.Lock()
+    with_geom = has_postgis(conn_params)
+    if not with_geom:
+        logger.warning("PostGIS absent : la colonne geom ne sera pas renseignée")
 
     with ThreadPoolExecutor(max_workers=5) as executor:
         futures = []
         for dept in departements:
             cinemas_list = api.get_cinema(dept["id"])
             for c in cinemas_list:
-                futures.append(executor.submit(process_cinema, c, conn_lock, conn_params))
+                futures.append(executor.submit(process_cinema, c, conn_lock, conn_params, with_geom))
         for future in as_completed(futures):
             try:
                 future.result()
             except Exception as e:
                 logger.error(f"Erreur dans le thread: {e}")
 
+    conn = psycopg2.connect(**conn_params)
+    try:
+        publish_data_generation(conn, "scrap_cinemas")
+    finally:
+        conn.close()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -21,7 +21,9 @@ import psycopg2
 from bs4 import BeautifulSoup
 
 # ta fonction existante
-from allocine_wrapper import get_movies_with_showtimes
+from allocine_wrapper import get_movies_with_showtimes, log_http_stats
+from migrate import check_schema
+from schema import publish_data_generation, refresh_showtime_listing
 
 # --- config logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -138,17 +140,6 @@ def get_or_create_language(conn, language_name):
 def get_conn():
     return psycopg2.connect(DATABASE_URL)
 
-def ensure_movie_columns(conn):
-    """Ajoute les colonnes manquantes si nécessaire (is_premiere, director, original_title)."""
-    cur = conn.cursor()
-    cur.execute("""
-    ALTER TABLE films
-    ADD COLUMN IF NOT EXISTS is_premiere BOOLEAN DEFAULT FALSE,
-    ADD COLUMN IF NOT EXISTS director TEXT,
-    ADD COLUMN IF NOT EXISTS original_title TEXT;
-    """)
-    conn.commit()
-    cur.close()
 
 def upsert_movie(conn, movie):
     """
@@ -313,7 +304,8 @@ def main():
     logger.info("Démarrage scrap films -> BDD")
 
     conn = get_conn()
-    ensure_movie_columns(conn)
+    if not check_schema(conn):
+        raise RuntimeError("Schéma BDD pas à jour : lancer `python migrate.py upgrade`")
 
     # récupérer la liste des cinémas en BDD
     cur = conn.cursor()
@@ -492,8 +484,14 @@ def main():
         # But here we do it after batch, so also add small sleep here
         time.sleep(random.uniform(0.3, 0.8))
 
+    # Les caches de l'API sont reconstruits depuis la vue : la rafraîchir avant de publier.
+    refresh_showtime_listing(conn)
+    logger.info("🔄 Vue showtime_listing rafraîchie")
+    generation = publish_data_generation(conn, "scrap_movies_daily")
+    logger.info("Génération de données publiée : %d", generation)
     conn.close()
     logger.info("Terminé. Insérés/maj: %d, échoués: %d", inserted, failed)
+    log_http_stats()
 
 
 if __name__ == "__main__":
@@ -10,7 +10,9 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import psycopg2
 from psycopg2.pool import SimpleConnectionPool
-from allocine_wrapper import get_movies_with_showtimes
+from allocine_wrapper import get_movies_with_showtimes, log_http_stats
+from migrate import check_schema
+from schema import SHOWTIMES_NATURAL_KEY, publish_data_generation, refresh_showtime_listing
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # --- config logging
@@ -33,11 +35,14 @@ def release_conn(conn):
 
 def upsert_showtime(conn, cinema_id, movie_id, start_date, start_time, diffusion_version, fmt, reservation_url):
     cur = conn.cursor()
-    query = """
+    query = f"""
     INSERT INTO showtimes
       (cinema_id, movie_id, start_date, start_time, diffusion_version, format, reservation_url, last_update)
     VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
-    ON CONFLICT DO NOTHING;  -- éviter doublons
+    ON CONFLICT ({SHOWTIMES_NATURAL_KEY}) DO UPDATE  -- clé naturelle : pas de doublons
+    SET format = EXCLUDED.format,
+        reservation_url = COALESCE(EXCLUDED.reservation_url, showtimes.reservation_url),
+        last_update = NOW();
     """
     cur.execute(query, (
         cinema_id,
@@ -112,6 +117,9 @@ def scrape_cinema(cinema, target_date, idx, total):
 
 def main():
     conn = get_conn()
+    if not check_schema(conn):
+        release_conn(conn)
+        raise RuntimeError("Schéma BDD pas à jour : lancer `python migrate.py upgrade`")
 
     # récupérer tous les cinémas
     cur = conn.cursor()
@@ -133,6 +141,16 @@ def main():
             for f in as_completed(futures):
                 pass
 
+    conn = get_conn()
+    try:
+        refresh_showtime_listing(conn)
+        logger.info("🔄 Vue showtime_listing rafraîchie")
+        generation = publish_data_generation(conn, "scrap_showtimes")
+        logger.info("📣 Génération de données publiée : %d", generation)
+        log_http_stats()
+    finally:
+        release_conn(conn)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
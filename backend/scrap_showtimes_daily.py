@@ -10,7 +10,9 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import psycopg2
 from psycopg2.pool import SimpleConnectionPool
-from allocine_wrapper import get_movies_with_showtimes
+from allocine_wrapper import fetch_movies_with_showtimes, get_movies_with_showtimes, log_http_stats
+from migrate import check_schema
+from schema import SHOWTIMES_NATURAL_KEY, publish_data_generation, refresh_showtime_listing
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # --- config logging
@@ -24,6 +26,10 @@ if not DATABASE_URL:
 
 pool = SimpleConnectionPool(1, 10, DATABASE_URL)
 
+# 1 : toutes les pages de séances sont récupérées sur un seul thread asyncio
+# (ALLOCINE_CONCURRENCY, ALLOCINE_RATE_LIMIT) ; seule l'écriture en BDD utilise les threads.
+ALLOCINE_ASYNC = os.getenv("ALLOCINE_ASYNC", "0").strip().lower() in ("1", "true", "yes")
+
 # --- DB helpers
 def get_conn():
     return pool.getconn()
@@ -33,11 +39,14 @@ def release_conn(conn):
 
 def upsert_showtime(conn, cinema_id, movie_id, start_date, start_time, diffusion_version, fmt, reservation_url):
     cur = conn.cursor()
-    query = """
+    query = f"""
     INSERT INTO showtimes
       (cinema_id, movie_id, start_date, start_time, diffusion_version, format, reservation_url, last_update)
     VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
-    ON CONFLICT DO NOTHING;  -- éviter doublons
+    ON CONFLICT ({SHOWTIMES_NATURAL_KEY}) DO UPDATE  -- clé naturelle : pas de doublons
+    SET format = EXCLUDED.format,
+        reservation_url = COALESCE(EXCLUDED.reservation_url, showtimes.reservation_url),
+        last_update = NOW();
     """
     cur.execute(query, (
         cinema_id,
@@ -55,17 +64,21 @@ def upsert_showtime(conn, cinema_id, movie_id, start_date, start_time, diffusion
 MAX_WORKERS = 5
 
 def scrape_cinema(cinema, target_date, idx, total):
-    conn = get_conn()
+    cinema_db_id, cinema_allocine, cinema_name = cinema
+    logger.info("👉 [%d/%d] Scraping séances pour %s (%s)", idx, total, cinema_name, cinema_allocine)
     try:
-        cinema_db_id, cinema_allocine, cinema_name = cinema
-        logger.info("👉 [%d/%d] Scraping séances pour %s (%s)", idx, total, cinema_name, cinema_allocine)
-        try:
-            movies = get_movies_with_showtimes(cinema_allocine, target_date)
-            logger.info("Retrieved %d movies for cinema %s (%s) on %s", len(movies), cinema_name, cinema_allocine, target_date)
-        except Exception as e:
-            logger.error("❌ Erreur scrap %s: %s", cinema_name, e)
-            return
+        movies = get_movies_with_showtimes(cinema_allocine, target_date)
+    except Exception as e:
+        logger.error("❌ Erreur scrap %s: %s", cinema_name, e)
+        return
+    save_movies(cinema, target_date, movies)
+
 
+def save_movies(cinema, target_date, movies):
+    cinema_db_id, cinema_allocine, cinema_name = cinema
+    logger.info("Retrieved %d movies for cinema %s (%s) on %s", len(movies), cinema_name, cinema_allocine, target_date)
+    conn = get_conn()
+    try:
         cur = conn.cursor()
         for movie in movies:
             movie_allocine = movie.get("id_allocine") or movie.get("internalId")
@@ -110,8 +123,25 @@ def scrape_cinema(cinema, target_date, idx, total):
         release_conn(conn)
 
 
+def scrape_cinemas_async(cinemas, target_date):
+    by_allocine_id = {cinema[1]: cinema for cinema in cinemas}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        def on_result(cinema_allocine, date, movies, error):
+            cinema = by_allocine_id[cinema_allocine]
+            if error is not None:
+                logger.error("❌ Erreur scrap %s: %s", cinema[2], error)
+                return
+            # Appelé dans la boucle asyncio : l'écriture en BDD part dans un thread.
+            executor.submit(save_movies, cinema, date, movies)
+
+        fetch_movies_with_showtimes([(cinema[1], target_date) for cinema in cinemas], on_result=on_result)
+
+
 def main():
     conn = get_conn()
+    if not check_schema(conn):
+        release_conn(conn)
+        raise RuntimeError("Schéma BDD pas à jour : lancer `python migrate.py upgrade`")
 
     # récupérer tous les cinémas
     cur = conn.cursor()
@@ -124,13 +154,17 @@ def main():
     logger.info("🗓️ Scraping séances pour la date %s", target_date)
 
     total = len(cinemas)
-    # Use ThreadPoolExecutor to scrape cinemas concurrently
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = []
-        for idx, cinema in enumerate(cinemas, start=1):
-            futures.append(executor.submit(scrape_cinema, cinema, target_date, idx, total))
-        for f in as_completed(futures):
-            pass
+    if ALLOCINE_ASYNC:
+        logger.info("⚡ Récupération asyncio de %d cinémas", total)
+        scrape_cinemas_async(cinemas, target_date)
+    else:
+        # Use ThreadPoolExecutor to scrape cinemas concurrently
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = []
+            for idx, cinema in enumerate(cinemas, start=1):
+                futures.append(executor.submit(scrape_cinema, cinema, target_date, idx, total))
+            for f in as_completed(futures):
+                pass
 
     yesterday = (datetime.today() - timedelta(days=1)).date()
     conn = get_conn()
@@ -141,6 +175,14 @@ def main():
         conn.commit()
         cur.close()
         logger.info("🗑️ Deleted %d showtimes older than %s", deleted_rows, yesterday)
+
+        refresh_showtime_listing(conn)
+        logger.info("🔄 Vue showtime_listing rafraîchie")
+        generation = publish_data_generation(conn, "scrap_showtimes_daily")
+        logger.info("📣 Génération de données publiée : %d", generation)
+        if not ALLOCINE_ASYNC:
+            # fetch_movies_with_showtimes journalise déjà les compteurs du client asyncio.
+            log_http_stats()
     finally:
         release_conn(conn)
 
@@ -0,0 +1,61 @@
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def request_key(endpoint: str, *parts: Any) -> Tuple[Hashable, ...]:
+  """Hashable, order-insensitive key for a request: lists become sorted tuples."""
+
+  def _normalize(value: Any) -> Hashable:
+    if isinstance(value, dict):
+      return tuple(sorted((k, _normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+      return tuple(sorted((_normalize(v) for v in value), key=repr))
+    if isinstance(value, str):
+      return value.strip()
+    return value
+
+  return (endpoint,) + tuple(_normalize(part) for part in parts)
+
+
+class SingleFlight:
+  """Coalesce concurrent identical calls into one in-flight computation.
+
+  The first caller for a key starts the computation as a task; callers arriving
+  while it runs await the same task and get its result (or exception). The task is
+  shielded, so a disconnecting caller does not cancel the work for the others.
+  Keys start with the endpoint name, which is used to break down the counters.
+  """
+
+  def __init__(self) -> None:
+    self._in_flight: Dict[Hashable, "asyncio.Task[Any]"] = {}
+    self._leaders: Counter = Counter()
+    self._coalesced: Counter = Counter()
+
+  async def do(self, key: Tuple[Hashable, ...], factory: Callable[[], Awaitable[T]]) -> T:
+    task = self._in_flight.get(key)
+    if task is None:
+      task = asyncio.ensure_future(factory())
+      self._in_flight[key] = task
+      self._leaders[key[0]] += 1
+      task.add_done_callback(lambda done: self._forget(key, done))
+    else:
+      self._coalesced[key[0]] += 1
+    return await asyncio.shield(task)
+
+  def _forget(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+    if self._in_flight.get(key) is task:
+      del self._in_flight[key]
+    if not task.cancelled():
+      # Mark the exception as retrieved when every waiter went away.
+      task.exception()
+
+  def stats(self) -> dict:
+    return {
+      "in_flight": len(self._in_flight),
+      "executed": dict(self._leaders),
+      "coalesced": dict(self._coalesced),
+      "coalesced_total": sum(self._coalesced.values()),
+    }
@@ -0,0 +1,402 @@
+import logging
+import threading
+import time
+from array import array
+from operator import itemgetter
+from datetime import date, time as dt_time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from nearby_aggregate import CINEMA_NAME, START_DATE, START_TIME, TITLE
+from schema import current_data_generation
+from spatial_index import CinemaSpatialIndex, cinemas_signature, haversine_km
+
+
+def _like_any(text: Optional[str], needles: Sequence[str]) -> bool:
+  """Python twin of `col IS NULL OR LOWER(col) LIKE ANY('%needle%')`."""
+  if text is None:
+    return True
+  lowered = text.lower()
+  return any(needle in lowered for needle in needles)
+
+
+class ShowtimeSnapshot:
+  """Immutable, array-backed copy of cinemas, films on show and upcoming showtimes.
+
+  Showtimes are stored column-wise and sorted by (cinema, date, time); `cinema_offsets`
+  gives each cinema's slice and `film_positions`/`film_offsets` index the same rows by
+  film. Queries return rows shaped exactly like the SQL ones, so main.py post-processes
+  both sources with the same code.
+  """
+
+  def __init__(self) -> None:
+    self.loaded_at = 0.0
+    self.load_seconds = 0.0
+
+    self.cinema_ids = array("i")
+    self.cinema_lat = array("d")
+    self.cinema_lon = array("d")
+    self.cinema_names: List[str] = []
+    self.cinema_addresses: List[Optional[str]] = []
+    self.cinema_index: Dict[int, int] = {}
+    self.spatial: Optional[CinemaSpatialIndex] = None
+
+    self.films: List[dict] = []
+    self.film_index: Dict[int, int] = {}
+
+    self.st_cinema = array("i")
+    self.st_film = array("i")
+    self.st_day = array("i")
+    self.st_seconds = array("i")
+    self.st_version = array("H")
+    self.st_format = array("H")
+    self.st_url: List[Optional[str]] = []
+    self.versions: List[Optional[str]] = []
+    self.formats: List[Optional[str]] = []
+
+    self.cinema_offsets = array("i")
+    self.film_offsets = array("i")
+    self.film_positions = array("i")
+
+  @classmethod
+  def load(cls, conn, today: Optional[date] = None) -> "ShowtimeSnapshot":
+    started = time.monotonic()
+    today = today or date.today()
+    snap = cls()
+    signature = cinemas_signature(conn)
+
+    with conn.cursor() as cur:
+      cur.execute(
+        """
+        SELECT id, name, address, latitude, longitude
+        FROM cinemas
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ORDER BY id
+        """
+      )
+      for cinema_id, name, address, lat, lon in cur.fetchall():
+        snap.cinema_index[cinema_id] = len(snap.cinema_ids)
+        snap.cinema_ids.append(cinema_id)
+        snap.cinema_lat.append(float(lat))
+        snap.cinema_lon.append(float(lon))
+        snap.cinema_names.append(name)
+        snap.cinema_addresses.append(address)
+
+      cur.execute(
+        """
+        SELECT m.id, m.title, COALESCE(m.original_title, '') AS original_title, m.poster_url,
+               m.duration, m.release_date, m.synopsis, m.director, m.genre, m.languages,
+               sl.genre_names, sl.language_names
+        FROM films m
+        JOIN (
+          SELECT DISTINCT ON (film_id) film_id, genre_names, language_names
+          FROM showtime_listing
+          WHERE start_date >= %(today)s
+          ORDER BY film_id
+        ) sl ON sl.film_id = m.id
+        """,
+        {"today": today},
+      )
+      columns = [col[0] for col in cur.description]
+      for values in cur.fetchall():
+        film = dict(zip(columns, values))
+        snap.film_index[film["id"]] = len(snap.films)
+        snap.films.append(film)
+
+      cur.execute(
+        """
+        SELECT cinema_id, film_id, start_date, start_time, diffusion_version, format, reservation_url
+        FROM showtime_listing
+        WHERE start_date >= %(today)s
+        ORDER BY cinema_id, start_date, start_time
+        """,
+        {"today": today},
+      )
+      snap._add_showtimes(cur.fetchall())
+    conn.rollback()
+
+    snap._build_offsets()
+    # Positions in the spatial index are the snapshot's cinema indexes.
+    snap.spatial = CinemaSpatialIndex(zip(snap.cinema_ids, snap.cinema_lat, snap.cinema_lon), signature=signature)
+    snap.loaded_at = time.time()
+    snap.load_seconds = time.monotonic() - started
+    return snap
+
+  def _add_showtimes(self, rows: Iterable[tuple]) -> None:
+    version_codes: Dict[Optional[str], int] = {}
+    format_codes: Dict[Optional[str], int] = {}
+    for cinema_id, film_id, start_date, start_time, version, fmt, url in rows:
+      cinema_idx = self.cinema_index.get(cinema_id)
+      film_idx = self.film_index.get(film_id)
+      if cinema_idx is None or film_idx is None:
+        continue
+      if version not in version_codes:
+        version_codes[version] = len(self.versions)
+        self.versions.append(version)
+      if fmt not in format_codes:
+        format_codes[fmt] = len(self.formats)
+        self.formats.append(fmt)
+      self.st_cinema.append(cinema_idx)
+      self.st_film.append(film_idx)
+      self.st_day.append(start_date.toordinal())
+      self.st_seconds.append(start_time.hour * 3600 + start_time.minute * 60 + start_time.second)
+      self.st_version.append(version_codes[version])
+      self.st_format.append(format_codes[fmt])
+      self.st_url.append(url)
+
+  def _build_offsets(self) -> None:
+    # Rows arrive ordered by cinema id and cinema indexes follow id order, so a
+    # single pass yields CSR-style offsets per cinema.
+    counts = [0] * (len(self.cinema_ids) + 1)
+    for cinema_idx in self.st_cinema:
+      counts[cinema_idx + 1] += 1
+    for i in range(1, len(counts)):
+      counts[i] += counts[i - 1]
+    self.cinema_offsets = array("i", counts)
+
+    per_film: List[List[int]] = [[] for _ in self.films]
+    for position, film_idx in enumerate(self.st_film):
+      per_film[film_idx].append(position)
+    offsets = [0]
+    for positions in per_film:
+      self.film_positions.extend(positions)
+      offsets.append(len(self.film_positions))
+    self.film_offsets = array("i", offsets)
+
+  def stats(self) -> dict:
+    return {
+      "loaded_at": self.loaded_at,
+      "load_seconds": round(self.load_seconds, 3),
+      "cinemas": len(self.cinema_ids),
+      "films": len(self.films),
+      "showtimes": len(self.st_film),
+    }
+
+  def film(self, film_id: int) -> Optional[dict]:
+    film_idx = self.film_index.get(film_id)
+    return self.films[film_idx] if film_idx is not None else None
+
+  def _cinemas_within(self, center_lat: float, center_lon: float, radius_km: float, nearest: Optional[int] = None) -> Dict[int, float]:
+    if nearest is not None:
+      found = self.spatial.nearest_positions(center_lat, center_lon, nearest, max_radius_km=radius_km)
+    else:
+      found = self.spatial.within_positions(center_lat, center_lon, radius_km)
+    return dict(found)
+
+  def _accepted_versions(self, subtitles: Sequence[str]) -> Optional[set]:
+    if not subtitles:
+      return None
+    wanted = set(subtitles)
+    return {code for code, version in enumerate(self.versions) if (version or "").upper() in wanted}
+
+  def _showtime_row(self, position: int) -> dict:
+    seconds = self.st_seconds[position]
+    return {
+      "start_date": date.fromordinal(self.st_day[position]),
+      "start_time": dt_time(seconds // 3600, (seconds // 60) % 60, seconds % 60),
+      "diffusion_version": self.versions[self.st_version[position]],
+      "format": self.formats[self.st_format[position]],
+      "reservation_url": self.st_url[position],
+    }
+
+  def nearby_rows(
+    self,
+    center_lat: float,
+    center_lon: float,
+    radius_km: float,
+    today: date,
+    filter_date: Optional[date] = None,
+    cinema_id: Optional[int] = None,
+    movie_id: Optional[int] = None,
+    subtitles: Sequence[str] = (),
+    duration_max: Optional[int] = None,
+    languages: Sequence[str] = (),
+    genres: Sequence[str] = (),
+    nearest: Optional[int] = None,
+  ) -> List[tuple]:
+    """Rows of the movies_nearby query (NEARBY_COLUMNS tuples), with the same filters and ordering."""
+    if cinema_id is not None:
+      cinema_idx = self.cinema_index.get(cinema_id)
+      if cinema_idx is None:
+        return []
+      cinemas = {
+        cinema_idx: haversine_km(center_lat, center_lon, self.cinema_lat[cinema_idx], self.cinema_lon[cinema_idx])
+      }
+    else:
+      cinemas = self._cinemas_within(center_lat, center_lon, radius_km, nearest)
+
+    film_ok = []
+    for film in self.films:
+      duration = film.get("duration")
+      film_ok.append(
+        (movie_id is None or film["id"] == movie_id)
+        and (duration_max is None or duration is None or duration <= duration_max)
+        and (not languages or not film.get("languages") or _like_any(film.get("languages"), languages))
+        and (not genres or _like_any(film.get("genre"), genres))
+      )
+    versions = self._accepted_versions(subtitles)
+    day_exact = filter_date.toordinal() if filter_date else None
+    day_min = today.toordinal()
+
+    rows: List[tuple] = []
+    for cinema_idx, distance in cinemas.items():
+      for position in range(self.cinema_offsets[cinema_idx], self.cinema_offsets[cinema_idx + 1]):
+        film_idx = self.st_film[position]
+        if not film_ok[film_idx]:
+          continue
+        day = self.st_day[position]
+        if (day != day_exact) if day_exact is not None else (day < day_min):
+          continue
+        if versions is not None and self.st_version[position] not in versions:
+          continue
+        film = self.films[film_idx]
+        seconds = self.st_seconds[position]
+        rows.append((
+          film["id"],
+          film["title"],
+          film["original_title"],
+          film["poster_url"],
+          film["duration"],
+          film["release_date"],
+          film["synopsis"],
+          film["genre_names"],
+          film["language_names"],
+          self.cinema_ids[cinema_idx],
+          self.cinema_names[cinema_idx],
+          self.cinema_addresses[cinema_idx],
+          self.cinema_lat[cinema_idx],
+          self.cinema_lon[cinema_idx],
+          distance,
+          date.fromordinal(day),
+          dt_time(seconds // 3600, (seconds // 60) % 60, seconds % 60),
+          self.versions[self.st_version[position]],
+          self.formats[self.st_format[position]],
+          self.st_url[position],
+        ))
+
+    rows.sort(key=itemgetter(TITLE, CINEMA_NAME, START_DATE, START_TIME))
+    return rows
+
+  def film_rows(
+    self,
+    film_id: int,
+    center_lat: float,
+    center_lon: float,
+    radius_km: float,
+    start_date: date,
+    end_date: date,
+    subtitles: Sequence[str] = (),
+    nearest: Optional[int] = None,
+  ) -> List[dict]:
+    """Rows of the movie_details showtime query, ordered by distance then time."""
+    film_idx = self.film_index.get(film_id)
+    if film_idx is None:
+      return []
+    versions = self._accepted_versions(subtitles)
+    first_day, last_day = start_date.toordinal(), end_date.toordinal()
+    # Resolve the cinema set first: the film's showtimes are then only matched against it.
+    distances = self._cinemas_within(center_lat, center_lon, radius_km, nearest)
+
+    rows: List[dict] = []
+    for offset in range(self.film_offsets[film_idx], self.film_offsets[film_idx + 1]):
+      position = self.film_positions[offset]
+      day = self.st_day[position]
+      if day < first_day or day > last_day:
+        continue
+      if versions is not None and self.st_version[position] not in versions:
+        continue
+      cinema_idx = self.st_cinema[position]
+      distance = distances.get(cinema_idx)
+      if distance is None:
+        continue
+      row = {
+        "cinema_id": self.cinema_ids[cinema_idx],
+        "name": self.cinema_names[cinema_idx],
+        "address": self.cinema_addresses[cinema_idx],
+        "lat": self.cinema_lat[cinema_idx],
+        "lon": self.cinema_lon[cinema_idx],
+        "distance_km": distance,
+      }
+      row.update(self._showtime_row(position))
+      rows.append(row)
+
+    rows.sort(key=lambda r: (r["distance_km"], r["start_date"], r["start_time"]))
+    return rows
+
+
+class SnapshotEngine:
+  """Holds the current snapshot and swaps in a freshly loaded one on reload().
+
+  The snapshot is tagged with the data generation read just before loading it, so
+  the API can tell when a scrape has made it stale.
+  """
+
+  def __init__(self, connection_factory, release) -> None:
+    self._connection_factory = connection_factory
+    self._release = release
+    self._reload_lock = threading.Lock()
+    self.current: Optional[ShowtimeSnapshot] = None
+    self.generation: Optional[int] = None
+    self.reloads = 0
+    self.last_error: Optional[str] = None
+
+  @property
+  def ready(self) -> bool:
+    return self.current is not None
+
+  def reload(self) -> bool:
+    if not self._reload_lock.acquire(blocking=False):
+      logging.info("Snapshot reload already in progress, skipping")
+      return False
+    try:
+      return self._load()
+    finally:
+      self._reload_lock.release()
+
+  def _load(self) -> bool:
+    try:
+      conn = self._connection_factory()
+      try:
+        generation = current_data_generation(conn)
+        snapshot = ShowtimeSnapshot.load(conn)
+      finally:
+        self._release(conn)
+      self.current = snapshot
+      self.generation = generation
+      self.reloads += 1
+      self.last_error = None
+      logging.info("Loaded showtime snapshot: %s", snapshot.stats())
+      return True
+    except Exception as exc:
+      self.last_error = str(exc)
+      logging.error("Unable to load showtime snapshot: %s", exc)
+      return False
+
+  def ensure_generation(self, generation: Optional[int]) -> bool:
+    """Reload when the snapshot predates `generation`.
+
+    A reload already in flight (SIGHUP, startup) is waited for rather than skipped,
+    and is enough when it installed `generation`. Only when no snapshot of that
+    generation could be loaded is the old one dropped, so requests fall back to the
+    database instead of serving stale showtimes.
+    """
+    if self.current is not None and self.generation == generation:
+      return True
+    with self._reload_lock:
+      if self.current is not None and self.generation == generation:
+        return True
+      if self._load() and self.generation == generation:
+        return True
+      if self.current is not None:
+        logging.warning("Snapshot is older than data generation %s, serving from the database until it reloads", generation)
+      self.current = None
+      self.generation = None
+      return False
+
+  def stats(self) -> dict:
+    return {
+      "ready": self.ready,
+      "generation": self.generation,
+      "reloads": self.reloads,
+      "last_error": self.last_error,
+      **(self.current.stats() if self.current is not None else {}),
+    }
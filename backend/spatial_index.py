@@ -0,0 +1,128 @@
+import math
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE_LAT = 111.195
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+  """Same formula as main.distance_sql(), so every path returns identical distances."""
+  a = (
+    math.sin(math.radians(lat2 - lat1) / 2) ** 2
+    + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+  )
+  return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def cinemas_signature(conn) -> tuple:
+  """Fingerprint of the indexed cinema coordinates, used to decide when to rebuild the index.
+
+  Hashes (id, latitude, longitude) rather than trusting last_update, so moved or
+  re-geocoded cinemas are picked up whatever wrote them (a few thousand rows).
+  """
+  with conn.cursor() as cur:
+    cur.execute(
+      """
+      SELECT COUNT(*), MAX(id), md5(string_agg(id || ':' || latitude || ':' || longitude, ',' ORDER BY id))
+      FROM cinemas
+      WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+      """
+    )
+    signature = tuple(cur.fetchone())
+  conn.rollback()
+  return signature
+
+
+class CinemaSpatialIndex:
+  """Uniform lat/lon grid over cinema coordinates.
+
+  A radius query only visits the grid cells overlapping the search circle's bounding
+  box, then applies the exact haversine check to the cinemas they hold. Positions
+  returned by `within_positions` follow the insertion order, which lets the snapshot
+  engine reuse its own cinema indexes.
+  """
+
+  def __init__(self, cinemas: Iterable[Tuple[int, float, float]], cell_deg: float = 0.05, signature: tuple = ()) -> None:
+    self.cell_deg = cell_deg
+    self.signature = signature
+    self.ids = array("i")
+    self.lat = array("d")
+    self.lon = array("d")
+    self.cells: Dict[Tuple[int, int], List[int]] = {}
+    for cinema_id, lat, lon in cinemas:
+      position = len(self.ids)
+      self.ids.append(cinema_id)
+      self.lat.append(float(lat))
+      self.lon.append(float(lon))
+      self.cells.setdefault(self._cell(lat, lon), []).append(position)
+
+  @classmethod
+  def load(cls, conn, cell_deg: float = 0.05) -> "CinemaSpatialIndex":
+    signature = cinemas_signature(conn)
+    with conn.cursor() as cur:
+      cur.execute(
+        """
+        SELECT id, latitude, longitude
+        FROM cinemas
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ORDER BY id;
+        """
+      )
+      rows = cur.fetchall()
+    conn.rollback()
+    return cls(rows, cell_deg=cell_deg, signature=signature)
+
+  def __len__(self) -> int:
+    return len(self.ids)
+
+  def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+    return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+  def within_positions(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    max_abs_lat = min(abs(lat) + lat_delta, 90.0)
+    cos_lat = math.cos(math.radians(max_abs_lat))
+    lon_delta = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+
+    min_row, min_col = self._cell(lat - lat_delta, lon - lon_delta)
+    max_row, max_col = self._cell(lat + lat_delta, lon + lon_delta)
+    found: List[Tuple[int, float]] = []
+    if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self.cells):
+      # Huge radius: walking the occupied cells is cheaper than the empty grid.
+      candidates = (p for cell in self.cells.values() for p in cell)
+    else:
+      candidates = (
+        p
+        for row in range(min_row, max_row + 1)
+        for col in range(min_col, max_col + 1)
+        for p in self.cells.get((row, col), ())
+      )
+    for position in candidates:
+      distance = haversine_km(lat, lon, self.lat[position], self.lon[position])
+      if distance <= radius_km:
+        found.append((position, distance))
+    return found
+
+  def nearest_positions(self, lat: float, lon: float, count: int, max_radius_km: Optional[float] = None) -> List[Tuple[int, float]]:
+    """The `count` closest cinemas (optionally capped at max_radius_km), closest first."""
+    if count <= 0 or not self.ids:
+      return []
+    radius = self.cell_deg * KM_PER_DEGREE_LAT
+    limit = max_radius_km if max_radius_km is not None else math.pi * EARTH_RADIUS_KM
+    while True:
+      radius = min(radius, limit)
+      found = self.within_positions(lat, lon, radius)
+      if len(found) >= count or radius >= limit:
+        break
+      radius *= 2
+    found.sort(key=lambda item: item[1])
+    return found[:count]
+
+  def within(self, lat: float, lon: float, radius_km: float, nearest: Optional[int] = None) -> Dict[int, float]:
+    """Map cinema id -> exact haversine distance for cinemas within radius_km."""
+    if nearest is not None:
+      found = self.nearest_positions(lat, lon, nearest, max_radius_km=radius_km)
+    else:
+      found = self.within_positions(lat, lon, radius_km)
+    return {self.ids[position]: distance for position, distance in found}
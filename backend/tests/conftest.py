@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+# Tests run against the vendored allocineAPI package and the backend modules, whether
+# or not `pip install -r requirements.txt` (which installs both) was run.
+BACKEND = Path(__file__).resolve().parents[1]
+for path in (BACKEND / "allocineAPI" / "src", BACKEND):
+  if str(path) not in sys.path:
+    sys.path.insert(0, str(path))
@@ -0,0 +1,147 @@
+"""
+Threaded allocineAPI against the local stand-in of benchmarks/bench_allocine_client.py:
+429/5xx retries through the pooled session, the pool_size bound on connections and
+requests in flight, and get_movies_with_showtimes against get_movies + get_showtime.
+
+    python -m pytest tests
+"""
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from allocineAPI.allocineAPI import MoviesShowtimes, allocineAPI
+from benchmarks.bench_allocine_client import showtime_page, start_server
+
+DATE = "2025-09-10"
+FILMS_PER_PAGE = 4
+
+
+def pages_for(cinema: str) -> int:
+  return 1 + int(cinema[1:]) % 3
+
+
+def expected_movies(cinema: str) -> list:
+  movies = MoviesShowtimes()
+  pages = pages_for(cinema)
+  for page in range(1, pages + 1):
+    movies.add_page(showtime_page(cinema, DATE, page, pages, FILMS_PER_PAGE)["results"])
+  return movies.result()
+
+
+def merged(movies: list, showtimes: list) -> list:
+  """get_movies + get_showtime joined on the Allocine id, a showtime repeated on a later page listed once."""
+  by_film = {}
+  for entry in showtimes:
+    film_showtimes = by_film.setdefault(entry["id_allocine"], [])
+    film_showtimes.extend(show for show in entry["showtimes"] if show not in film_showtimes)
+  return [dict(movie, showtimes=by_film.get(movie["id_allocine"], [])) for movie in movies]
+
+
+@pytest.fixture
+def serve():
+  servers = []
+
+  def _serve(status_for=None, film_count=400):
+    server = start_server(0.0, pages_for, FILMS_PER_PAGE, status_for, film_count)
+    servers.append(server)
+    return server, f"http://127.0.0.1:{server.server_port}/"
+
+  yield _serve
+  for server in servers:
+    server.shutdown()
+    server.server_close()
+
+
+def test_retries_429_and_5xx(serve):
+  calls = Counter()
+  lock = threading.Lock()
+
+  def status_for(cinema, date, page):
+    # Page 1 is throttled once, page 2 fails once, page 3 is served at once.
+    with lock:
+      calls[page] += 1
+      first = calls[page] == 1
+    return {1: 429, 2: 502}.get(page, 200) if first else 200
+
+  _, base_url = serve(status_for)
+  with allocineAPI(pool_size=2, retries=2, backoff_factor=0.01, base_url=base_url) as api:
+    assert api.get_movies_with_showtimes("P0002", DATE) == expected_movies("P0002")
+    stats = api.stats()
+  assert stats["requests"] == 3
+  assert stats["retries"] == 2
+  assert stats["errors"] == 0
+
+
+def test_errors(serve):
+  def status_for(cinema, date, page):
+    return {"P0001": 404, "P0002": 503}.get(cinema, 200)
+
+  _, base_url = serve(status_for)
+  with allocineAPI(pool_size=2, retries=2, backoff_factor=0.01, base_url=base_url) as api:
+    with pytest.raises(Exception, match="Error 404"):
+      api.get_movies_with_showtimes("P0001", DATE)
+    with pytest.raises(Exception, match="Error 503"):
+      api.get_movies_with_showtimes("P0002", DATE)
+    stats = api.stats()
+  # 404 fails at once, 503 after its retries.
+  assert stats["retries"] == 2
+  assert stats["errors"] == 2
+
+
+def test_pool_size_bounds_connections_and_requests(serve):
+  active = 0
+  peak = 0
+  lock = threading.Lock()
+
+  def status_for(cinema, date, page):
+    nonlocal active, peak
+    with lock:
+      active += 1
+      peak = max(peak, active)
+    time.sleep(0.02)
+    with lock:
+      active -= 1
+    return 200
+
+  server, base_url = serve(status_for)
+  connections = []
+  process_request = server.process_request
+
+  def counting_process_request(request, client_address):
+    connections.append(client_address)
+    process_request(request, client_address)
+
+  server.process_request = counting_process_request
+
+  cinemas = [f"P{index:04d}" for index in range(24)]
+  with allocineAPI(pool_size=3, backoff_factor=0.01, base_url=base_url) as api:
+    # More scraper threads than pooled connections, each fetching pages 2..N in parallel.
+    with ThreadPoolExecutor(max_workers=8) as executor:
+      results = list(executor.map(lambda cinema: api.get_movies_with_showtimes(cinema, DATE), cinemas))
+    stats = api.stats()
+
+  assert results == [expected_movies(cinema) for cinema in cinemas]
+  assert stats["requests"] == sum(pages_for(cinema) for cinema in cinemas)
+  assert peak <= 3
+  # Keep-alive: the requests share the pooled connections instead of one each.
+  assert len(connections) <= 3
+
+
+@pytest.mark.parametrize("film_count", [400, 6, FILMS_PER_PAGE])
+def test_one_pass_matches_movies_and_showtimes(serve, film_count):
+  # 400: every page has new films; 6: films come back on later pages; FILMS_PER_PAGE:
+  # every page repeats the same films and showtimes.
+  _, base_url = serve(film_count=film_count)
+  cinemas = ("P0000", "P0001", "P0002")
+  with allocineAPI(pool_size=4, base_url=base_url) as api:
+    for cinema in cinemas:
+      showtimes = api.get_showtime(cinema, DATE)
+      expected = merged(api.get_movies(cinema, DATE), showtimes)
+      assert api.get_movies_with_showtimes(cinema, DATE) == expected
+  if film_count == FILMS_PER_PAGE:
+    # The repeated showtimes were really deduplicated.
+    assert sum(len(entry["showtimes"]) for entry in showtimes) > sum(len(movie["showtimes"]) for movie in expected)
@@ -0,0 +1,114 @@
+"""
+AsyncAllocineAPI against the local stand-in of benchmarks/bench_allocine_client.py:
+multi-page cinema-days, 429 retries and errors, and get_movies_with_showtimes against
+get_movies + get_showtime, without touching allocine.fr.
+
+    python -m pytest tests
+"""
+
+import asyncio
+import threading
+from collections import Counter
+
+import pytest
+
+from allocineAPI.allocineAPI import MoviesShowtimes
+from allocineAPI.async_allocineAPI import AsyncAllocineAPI
+from benchmarks.bench_allocine_client import showtime_page, start_server
+from test_allocine_client import merged
+
+DATE = "2025-09-10"
+FILMS_PER_PAGE = 4
+
+
+def pages_for(cinema: str) -> int:
+  return 1 + int(cinema[1:]) % 3
+
+
+def expected_movies(cinema: str) -> list:
+  movies = MoviesShowtimes()
+  pages = pages_for(cinema)
+  for page in range(1, pages + 1):
+    movies.add_page(showtime_page(cinema, DATE, page, pages, FILMS_PER_PAGE)["results"])
+  return movies.result()
+
+
+@pytest.fixture
+def serve():
+  servers = []
+
+  def _serve(status_for=None, film_count=400) -> str:
+    server = start_server(0.0, pages_for, FILMS_PER_PAGE, status_for, film_count)
+    servers.append(server)
+    return f"http://127.0.0.1:{server.server_port}/"
+
+  yield _serve
+  for server in servers:
+    server.shutdown()
+    server.server_close()
+
+
+def run(base_url: str, *cinemas: str, retries: int = 2):
+  async def _run():
+    async with AsyncAllocineAPI(concurrency=8, retries=retries, backoff_factor=0.01, base_url=base_url) as api:
+      movies = await asyncio.gather(*(api.get_movies_with_showtimes(cinema, DATE) for cinema in cinemas), return_exceptions=True)
+      return movies, api.stats()
+
+  return asyncio.run(_run())
+
+
+def test_multi_page_cinema_days(serve):
+  base_url = serve()
+  cinemas = ("P0000", "P0001", "P0002")
+  movies, stats = run(base_url, *cinemas)
+  assert [len(m) for m in movies] == [FILMS_PER_PAGE, 2 * FILMS_PER_PAGE, 3 * FILMS_PER_PAGE]
+  assert movies == [expected_movies(cinema) for cinema in cinemas]
+  assert stats["requests"] == sum(pages_for(cinema) for cinema in cinemas)
+  assert stats["retries"] == stats["errors"] == 0
+
+
+def test_retries_429(serve):
+  calls = Counter()
+  lock = threading.Lock()
+
+  def status_for(cinema, date, page):
+    # Every page is throttled once before it is served.
+    with lock:
+      calls[page] += 1
+      return 429 if calls[page] == 1 else 200
+
+  movies, stats = run(serve(status_for), "P0002")
+  assert movies == [expected_movies("P0002")]
+  assert stats["retries"] == 3
+  assert stats["errors"] == 0
+
+
+def test_errors(serve):
+  def status_for(cinema, date, page):
+    return {"P0001": 404, "P0002": 503}.get(cinema, 200) if page == 1 else 200
+
+  (ok, not_found, unavailable), stats = run(serve(status_for), "P0000", "P0001", "P0002", retries=2)
+  assert ok == expected_movies("P0000")
+  assert str(not_found) == "Error 404"
+  assert str(unavailable) == "Error 503"
+  # 404 fails at once, 503 after its retries.
+  assert stats["retries"] == 2
+  assert stats["errors"] == 2
+
+
+@pytest.mark.parametrize("film_count", [400, FILMS_PER_PAGE])
+def test_one_pass_matches_movies_and_showtimes(serve, film_count):
+  base_url = serve(film_count=film_count)
+  cinemas = ("P0000", "P0001", "P0002")
+
+  async def _run():
+    async with AsyncAllocineAPI(base_url=base_url) as api:
+      return [
+        await asyncio.gather(
+          api.get_movies_with_showtimes(cinema, DATE), api.get_movies(cinema, DATE), api.get_showtime(cinema, DATE)
+        )
+        for cinema in cinemas
+      ]
+
+  for one_pass, movies, showtimes in asyncio.run(_run()):
+    assert one_pass == merged(movies, showtimes)
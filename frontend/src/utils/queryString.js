@@ -0,0 +1,18 @@
+// Canonical query string for the cacheable GET endpoints: keys sorted, arrays as
+// repeated keys (sorted too), empty values dropped. Identical requests therefore map
+// to identical URLs, which is what browser and proxy caches key on.
+export const toQueryString = (params) => {
+  const search = new URLSearchParams();
+  for (const key of Object.keys(params).sort()) {
+    const value = params[key];
+    if (value === undefined || value === null || value === "") continue;
+    if (Array.isArray(value)) {
+      for (const item of [...value].map(String).sort()) {
+        search.append(key, item);
+      }
+    } else {
+      search.append(key, String(value));
+    }
+  }
+  return search.toString();
+};